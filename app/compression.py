@@ -0,0 +1,111 @@
+"""
+Response compression.
+
+`GZipMiddleware` compresses every large response on the fly, which for the quiz payload
+means compressing the same bytes again for every student. Payloads that are cached
+(services/quiz_payload.py) are `CompressedBody`s instead: each encoding is compressed
+once, on first use, and kept with the cached body. Responses built from them carry
+their own `Content-Encoding`, and `PrecompressedAwareGZipMiddleware` passes those
+through untouched while still gzipping everything else.
+
+Encodings are picked from `Accept-Encoding` (q-values respected), preferring brotli
+over gzip when the client accepts both.
+"""
+
+import gzip
+from typing import Dict, Optional
+
+import brotli
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+COMPRESS_MIN_THRESHOLD = 1000  # if more than 1000 bytes (~1KB), compress
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+# in order of preference
+ENCODINGS = ("br", "gzip")
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        # mtime=0 so that the same body always compresses to the same bytes
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    raise ValueError(f"unsupported encoding {encoding}")
+
+
+def _accepted_qualities(accept_encoding: str) -> Dict[str, float]:
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """The preferred encoding the client accepts, or None to send the body as is."""
+    if not accept_encoding:
+        return None
+    qualities = _accepted_qualities(accept_encoding)
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressedBody:
+    """A response body and its compressed variants, each made on first use."""
+
+    __slots__ = ("body", "_encoded")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: str) -> bytes:
+        if encoding not in self._encoded:
+            self._encoded[encoding] = compress(self.body, encoding)
+        return self._encoded[encoding]
+
+
+class _PassEncodedResponder(GZipResponder):
+    """Gzips like `GZipResponder`, unless the response is already encoded."""
+
+    passthrough = False
+
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.passthrough = "content-encoding" in Headers(raw=message["headers"])
+        if self.passthrough:
+            await self.send(message)
+        else:
+            await super().send_with_gzip(message)
+
+
+class PrecompressedAwareGZipMiddleware(GZipMiddleware):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            headers = Headers(scope=scope)
+            if "gzip" in headers.get("Accept-Encoding", ""):
+                responder = _PassEncodedResponder(
+                    self.app, self.minimum_size, compresslevel=self.compresslevel
+                )
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
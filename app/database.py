@@ -1,5 +1,14 @@
+import asyncio
+import itertools
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Deque, Dict, List, Optional
+
 from pymongo import MongoClient
+from pymongo.collection import Collection
+from pymongo.database import Database
 
 # this is required for loading environment variables when
 # running the app locally as the environment variable should
@@ -9,19 +18,173 @@ if "MONGO_AUTH_CREDENTIALS" not in os.environ:
 
     load_dotenv("../.env")
 
+from settings import Settings  # noqa: E402
+
+settings = Settings()
+
 # Connection pool configuration for ECS
 # These settings ensure efficient connection reuse while remaining
 # compatible with Lambda (which will just use fewer connections)
 client = MongoClient(
     os.getenv("MONGO_AUTH_CREDENTIALS"),
     # Connection Pool Settings
-    maxPoolSize=20,  # Max connections this container will use
-    minPoolSize=5,  # Keep 5 connections always open
+    maxPoolSize=settings.mongo_max_pool_size,  # Max connections this container will use
+    minPoolSize=settings.mongo_min_pool_size,  # Connections always kept open
     # Timeout Settings
-    maxIdleTimeMS=30000,  # Close idle connections after 30 seconds
-    connectTimeoutMS=5000,  # Fail fast if can't connect in 5 seconds
-    serverSelectionTimeoutMS=5000,
+    maxIdleTimeMS=settings.mongo_max_idle_time_ms,  # Close idle connections after this
+    connectTimeoutMS=settings.mongo_connect_timeout_ms,  # Fail fast if can't connect
+    serverSelectionTimeoutMS=settings.mongo_server_selection_timeout_ms,
     # Reliability Settings
     retryWrites=True,  # Retry failed writes automatically
     retryReads=True,  # Retry failed reads automatically
 )
+
+# pymongo is blocking, so route handlers must not call `client` directly: every call
+# would stall the event loop for a full Mongo round trip. The async layer below hands
+# each call to this executor instead. It has one thread per pooled connection, so
+# requests beyond the pool size wait here (as awaiting coroutines, not blocked threads)
+# while the event loop keeps serving everything else.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.mongo_max_pool_size, thread_name_prefix="mongo"
+)
+
+
+async def run_in_executor(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking pymongo callable on the Mongo executor and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+class AsyncCursor:
+    """Awaitable wrapper around a pymongo cursor (from `find` or `aggregate`).
+
+    The cursor is opened lazily on the executor, since `aggregate` talks to the server
+    as soon as it is called. Use `await cursor.to_list()` to materialize the results, or
+    `async for` to stream them; streaming pulls `batch_size` documents per executor hop
+    so large result sets are never held in memory all at once.
+    """
+
+    def __init__(self, open_cursor: Callable[[], Any], batch_size: int = 100):
+        self._open_cursor = open_cursor
+        self._cursor = None
+        self._batch_size = batch_size
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._exhausted = False
+
+    def _ensure_open(self):
+        if self._cursor is None:
+            self._cursor = self._open_cursor()
+        return self._cursor
+
+    def _read(self, length: Optional[int]) -> List[Dict[str, Any]]:
+        cursor = self._ensure_open()
+        if length is None:
+            return list(cursor)
+        return list(itertools.islice(cursor, length))
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        documents = list(self._buffer)
+        self._buffer.clear()
+        if length is not None:
+            length = max(0, length - len(documents))
+        if not self._exhausted and length != 0:
+            read = await run_in_executor(self._read, length)
+            if length is None or len(read) < length:
+                self._exhausted = True
+            documents.extend(read)
+        return documents
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        if not self._buffer:
+            if self._exhausted:
+                raise StopAsyncIteration
+            batch = await run_in_executor(self._read, self._batch_size)
+            if len(batch) < self._batch_size:
+                self._exhausted = True
+            if not batch:
+                raise StopAsyncIteration
+            self._buffer.extend(batch)
+        return self._buffer.popleft()
+
+    async def close(self) -> None:
+        self._exhausted = True
+        self._buffer.clear()
+        if self._cursor is not None:
+            await run_in_executor(self._cursor.close)
+
+
+class AsyncCollection:
+    """Awaitable facade over a pymongo `Collection`.
+
+    Methods mirror pymongo's signatures; the blocking call runs on the Mongo executor.
+    `delegate` is the underlying sync collection for the rare caller that needs it
+    (e.g. scripts sharing code with the routers).
+    """
+
+    def __init__(self, delegate: Collection):
+        self.delegate = delegate
+
+    @property
+    def name(self) -> str:
+        return self.delegate.name
+
+    def find(self, *args, **kwargs) -> AsyncCursor:
+        return AsyncCursor(partial(self.delegate.find, *args, **kwargs))
+
+    def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs) -> AsyncCursor:
+        return AsyncCursor(partial(self.delegate.aggregate, pipeline, **kwargs))
+
+    async def find_one(self, *args, **kwargs):
+        return await run_in_executor(self.delegate.find_one, *args, **kwargs)
+
+    async def find_one_and_update(self, *args, **kwargs):
+        return await run_in_executor(self.delegate.find_one_and_update, *args, **kwargs)
+
+    async def insert_one(self, *args, **kwargs):
+        return await run_in_executor(self.delegate.insert_one, *args, **kwargs)
+
+    async def insert_many(self, *args, **kwargs):
+        return await run_in_executor(self.delegate.insert_many, *args, **kwargs)
+
+    async def update_one(self, *args, **kwargs):
+        return await run_in_executor(self.delegate.update_one, *args, **kwargs)
+
+    async def update_many(self, *args, **kwargs):
+        return await run_in_executor(self.delegate.update_many, *args, **kwargs)
+
+    async def delete_one(self, *args, **kwargs):
+        return await run_in_executor(self.delegate.delete_one, *args, **kwargs)
+
+    async def delete_many(self, *args, **kwargs):
+        return await run_in_executor(self.delegate.delete_many, *args, **kwargs)
+
+    async def bulk_write(self, *args, **kwargs):
+        return await run_in_executor(self.delegate.bulk_write, *args, **kwargs)
+
+    async def count_documents(self, *args, **kwargs):
+        return await run_in_executor(self.delegate.count_documents, *args, **kwargs)
+
+
+class AsyncDatabase:
+    """Awaitable facade over a pymongo `Database`; attribute access yields collections."""
+
+    def __init__(self, delegate: Database):
+        self.delegate = delegate
+        self._collections: Dict[str, AsyncCollection] = {}
+
+    def __getattr__(self, name: str) -> AsyncCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name: str) -> AsyncCollection:
+        if name not in self._collections:
+            self._collections[name] = AsyncCollection(self.delegate[name])
+        return self._collections[name]
+
+
+# the quiz database, for use from async route handlers (`await db.quizzes.find_one(...)`)
+db = AsyncDatabase(client.quiz)
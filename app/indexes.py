@@ -0,0 +1,316 @@
+"""
+Indexes the app's queries rely on, declared in one place.
+
+`REQUIRED_INDEXES` lists, per collection, the indexes needed by the hot queries in
+`HOT_QUERIES`. Nothing creates them automatically:
+- on startup, `log_missing_indexes` warns about any that are missing;
+- `scripts/manage_indexes.py` diffs the declared indexes against a database, creates
+  the missing ones and runs `explain` on every hot query;
+- `tests/test_indexes.py` fails if any hot query needs a collection scan or an
+  in-memory sort (it needs a real mongod).
+
+When adding a query on a new field, add its index and the query here.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.database import Database
+
+from logger_config import get_logger
+
+logger = get_logger()
+
+IndexKeys = Tuple[Tuple[str, int], ...]
+
+
+class IndexSpec:
+    """An index a collection needs, and the queries that use it."""
+
+    def __init__(
+        self, keys: Sequence[Tuple[str, int]], used_by: str, unique: bool = False
+    ):
+        self.keys: IndexKeys = tuple(keys)
+        self.used_by = used_by
+        self.unique = unique
+
+    @property
+    def name(self) -> str:
+        # same as the name Mongo generates
+        return "_".join(f"{field}_{direction}" for field, direction in self.keys)
+
+    def __repr__(self) -> str:
+        return f"IndexSpec({self.name}, unique={self.unique})"
+
+
+REQUIRED_INDEXES: Dict[str, List[IndexSpec]] = {
+    "sessions": [
+        IndexSpec(
+            [("quiz_id", ASCENDING), ("user_id", ASCENDING), ("_id", DESCENDING)],
+            "latest sessions of a user+quiz: POST /sessions, GET /sessions/preflight",
+        ),
+        IndexSpec(
+            [("user_id", ASCENDING), ("_id", DESCENDING)],
+            "GET /sessions/user/{user_id}/quiz-attempts",
+        ),
+        IndexSpec(
+            [("quiz_id", ASCENDING), ("_id", ASCENDING)],
+            "streaming a quiz's sessions in _id order: regrade",
+        ),
+        IndexSpec(
+            [("updated_at", ASCENDING), ("_id", ASCENDING)],
+            "incremental session export: GET /export/sessions",
+        ),
+    ],
+    "quizzes": [
+        IndexSpec(
+            [
+                ("metadata.source", ASCENDING),
+                ("metadata.source_id", ASCENDING),
+                ("_id", DESCENDING),
+            ],
+            "latest quiz ingested from a CMS test: CMS re-sync",
+        ),
+    ],
+    "questions": [
+        IndexSpec(
+            [("question_set_id", ASCENDING), ("_id", ASCENDING)],
+            "questions of a question set in order: quiz/form rendering, "
+            "GET /questions, single page mode and form submission (with $in)",
+        ),
+    ],
+    "organization": [
+        IndexSpec([("key", ASCENDING)], "API key authentication"),
+    ],
+    "session_results": [
+        IndexSpec(
+            [("quiz_id", ASCENDING), ("user_id", ASCENDING)],
+            "results of a quiz (and of a user in it): dashboards, ETL",
+        ),
+    ],
+}
+
+
+class HotQuery:
+    """A query shape the app runs on the request path, for `explain` checks."""
+
+    def __init__(
+        self,
+        description: str,
+        collection: str,
+        filter: Optional[Dict[str, Any]] = None,
+        sort: Optional[List[Tuple[str, int]]] = None,
+        pipeline: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.description = description
+        self.collection = collection
+        self.filter = filter
+        self.sort = sort
+        self.pipeline = pipeline
+
+    def explain(self, database: Database) -> Dict[str, Any]:
+        if self.pipeline is not None:
+            return database.command(
+                "aggregate", self.collection, pipeline=self.pipeline, explain=True
+            )
+        cursor = database[self.collection].find(self.filter)
+        if self.sort:
+            cursor = cursor.sort(self.sort)
+        return cursor.explain()
+
+
+HOT_QUERIES: List[HotQuery] = [
+    HotQuery(
+        "previous sessions of a user+quiz",
+        "sessions",
+        filter={"quiz_id": "quiz", "user_id": "user"},
+        sort=[("_id", DESCENDING)],
+    ),
+    HotQuery(
+        "latest session end state of each quiz of a user",
+        "sessions",
+        pipeline=[
+            {"$match": {"user_id": "user"}},
+            {"$sort": {"_id": -1}},
+            {
+                "$group": {
+                    "_id": "$quiz_id",
+                    "has_quiz_ended": {"$first": "$has_quiz_ended"},
+                }
+            },
+        ],
+    ),
+    HotQuery(
+        "ended sessions of a quiz after a checkpoint",
+        "sessions",
+        filter={"quiz_id": "quiz", "has_quiz_ended": True, "_id": {"$gt": "session"}},
+        sort=[("_id", ASCENDING)],
+    ),
+    HotQuery(
+        "sessions updated since the last export",
+        "sessions",
+        filter={"updated_at": {"$gte": "2024-01-01T00:00:00"}},
+        sort=[("updated_at", ASCENDING), ("_id", ASCENDING)],
+    ),
+    HotQuery(
+        "questions of a question set",
+        "questions",
+        filter={"question_set_id": "question_set"},
+        sort=[("_id", ASCENDING)],
+    ),
+    HotQuery(
+        "next page of the questions of a question set (keyset)",
+        "questions",
+        pipeline=[
+            {"$match": {"question_set_id": "question_set", "_id": {"$gt": "question"}}},
+            {"$sort": {"_id": 1}},
+            {"$limit": 10},
+        ],
+    ),
+    HotQuery(
+        "all questions of a quiz's question sets",
+        "questions",
+        filter={"question_set_id": {"$in": ["question_set_1", "question_set_2"]}},
+        sort=[("question_set_id", ASCENDING), ("_id", ASCENDING)],
+    ),
+    HotQuery(
+        "questions listed by id (POST /questions/batch)",
+        "questions",
+        filter={"_id": {"$in": ["question_1", "question_2"]}},
+    ),
+    HotQuery(
+        "pages of several question sets (POST /questions/batch)",
+        "questions",
+        filter={
+            "$or": [
+                {"question_set_id": "question_set_1"},
+                {"question_set_id": "question_set_2", "_id": {"$gt": "question"}},
+            ]
+        },
+        sort=[("question_set_id", ASCENDING), ("_id", ASCENDING)],
+    ),
+    HotQuery(
+        "first subset of the questions of a question set",
+        "questions",
+        pipeline=[
+            {"$match": {"question_set_id": "question_set"}},
+            {"$sort": {"_id": 1}},
+            {"$limit": 10},
+        ],
+    ),
+    HotQuery(
+        "latest quiz ingested from a CMS test",
+        "quizzes",
+        filter={"metadata.source": "source", "metadata.source_id": "source_id"},
+        sort=[("_id", DESCENDING)],
+    ),
+    HotQuery("organization by API key", "organization", filter={"key": "key"}),
+    HotQuery(
+        "results of a quiz",
+        "session_results",
+        filter={"quiz_id": "quiz"},
+        sort=[("user_id", ASCENDING)],
+    ),
+]
+
+# plan stages that mean a query is not (fully) served by an index
+UNINDEXED_STAGES = {"COLLSCAN", "SORT", "$sort"}
+
+
+def _plan_stages(plan: Any) -> List[str]:
+    """All `stage` names in a (winning) plan tree."""
+    stages = []
+    if isinstance(plan, dict):
+        for key, value in plan.items():
+            if key == "stage" and isinstance(value, str):
+                stages.append(value)
+            else:
+                stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+def _winning_stages(explain_output: Any) -> List[str]:
+    """Stages of the winning query plans and aggregation stages in an explain output,
+    ignoring rejected plans."""
+    stages = []
+    if isinstance(explain_output, dict):
+        for key, value in explain_output.items():
+            if key == "winningPlan":
+                stages.extend(_plan_stages(value))
+            elif key == "stages" and isinstance(value, list):
+                # aggregation stages not pushed down into the query plan
+                for stage in value:
+                    stages.extend(name for name in stage if name != "$cursor")
+                    stages.extend(_winning_stages(stage.get("$cursor")))
+            elif key not in ("rejectedPlans", "executionStats"):
+                stages.extend(_winning_stages(value))
+    elif isinstance(explain_output, list):
+        for item in explain_output:
+            stages.extend(_winning_stages(item))
+    return stages
+
+
+def unindexed_stages(explain_output: Dict[str, Any]) -> List[str]:
+    """Collection scans and blocking sorts in the winning plan of an explain."""
+    return sorted(set(_winning_stages(explain_output)) & UNINDEXED_STAGES)
+
+
+def _existing_index_keys(database: Database, collection: str) -> Dict[IndexKeys, str]:
+    return {
+        tuple((field, int(direction)) for field, direction in info["key"]): name
+        for name, info in database[collection].index_information().items()
+    }
+
+
+def diff_indexes(database: Database) -> Dict[str, List[IndexSpec]]:
+    """Declared indexes missing from `database`, per collection (matched by keys)."""
+    missing = {}
+    for collection, specs in REQUIRED_INDEXES.items():
+        existing = _existing_index_keys(database, collection)
+        absent = [spec for spec in specs if spec.keys not in existing]
+        if absent:
+            missing[collection] = absent
+    return missing
+
+
+def undeclared_indexes(database: Database) -> Dict[str, List[str]]:
+    """Names of indexes on the declared collections that `REQUIRED_INDEXES` doesn't
+    list (other than `_id_`), e.g. left over from removed queries."""
+    extra = {}
+    for collection, specs in REQUIRED_INDEXES.items():
+        declared = {spec.keys for spec in specs}
+        names = [
+            name
+            for keys, name in _existing_index_keys(database, collection).items()
+            if name != "_id_" and keys not in declared
+        ]
+        if names:
+            extra[collection] = names
+    return extra
+
+
+def create_missing_indexes(database: Database) -> Dict[str, List[str]]:
+    """Creates the declared indexes that are missing; returns their names."""
+    created = {}
+    for collection, specs in diff_indexes(database).items():
+        created[collection] = [
+            database[collection].create_index(
+                list(spec.keys), name=spec.name, unique=spec.unique
+            )
+            for spec in specs
+        ]
+        logger.info(f"Created indexes on {collection}: {created[collection]}")
+    return created
+
+
+def log_missing_indexes(database: Database) -> None:
+    """Warns about declared indexes that are missing (does not create them)."""
+    for collection, specs in diff_indexes(database).items():
+        for spec in specs:
+            logger.warning(
+                f"Missing index {spec.name} on {collection} (used by: {spec.used_by}); "
+                "run scripts/manage_indexes.py create"
+            )
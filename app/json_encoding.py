@@ -0,0 +1,75 @@
+"""
+Fast JSON encoding of large responses with orjson.
+
+FastAPI encodes a response by walking it with `jsonable_encoder` (which rebuilds every
+nested dict and turns datetimes into strings in Python) and then running the standard
+`json` encoder over the copy. For a quiz with hundreds of questions, or a session with
+hundreds of answers, that walk costs more than everything else in the request.
+
+orjson encodes dicts, lists, datetimes and Enums natively in one pass, so these
+helpers skip `jsonable_encoder`, producing the same JSON:
+- `dumps` encodes plain content (ObjectIds as strings, like `json_encoders` in
+  models.py; datetimes with `isoformat()`; Enums by value);
+- `dump_model` first validates the content against a response model and drops
+  undeclared fields, like `response_model` does;
+- `FastJSONResponse` / `model_response` wrap them in responses. Returning a Response
+  makes FastAPI skip its own `response_model` handling, so keep `response_model` on the
+  route for the OpenAPI docs and pass the same model to `model_response`.
+
+Use `scripts/benchmark_json_encoding.py` to compare both paths.
+"""
+
+import hashlib
+from typing import Any, Type
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    """Types orjson doesn't encode natively."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.dict(by_alias=True)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+def content_digest(content: Any) -> str:
+    """Hash of the JSON encoding of `content`, independent of the order of dict keys."""
+    encoded = orjson.dumps(
+        content, default=_default, option=_OPTIONS | orjson.OPT_SORT_KEYS
+    )
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def dump_model(model: Type[BaseModel], content: Any) -> bytes:
+    """Encodes `content` as `response_model=model` would."""
+    if not isinstance(content, model):
+        content = model.parse_obj(content)
+    return dumps(content.dict(by_alias=True))
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def model_response(
+    model: Type[BaseModel], content: Any, status_code: int = 200
+) -> Response:
+    return Response(
+        dump_model(model, content),
+        status_code=status_code,
+        media_type="application/json",
+    )
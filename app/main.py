@@ -1,17 +1,27 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-from routers import questions, quizzes, session_answers, sessions, organizations, forms
+from routers import (
+    questions,
+    quizzes,
+    session_answers,
+    sessions,
+    organizations,
+    forms,
+    admin,
+    export,
+)
 from mangum import Mangum
 import random
 import string
 import time
 from logger_config import setup_logger
+from services.heartbeat_buffer import heartbeat_buffer
+from database import db, run_in_executor
+from indexes import log_missing_indexes
+from compression import COMPRESS_MIN_THRESHOLD, PrecompressedAwareGZipMiddleware
 
 logger = setup_logger()
 
-COMPRESS_MIN_THRESHOLD = 1000  # if more than 1000 bytes (~1KB), compress
-
 app = FastAPI()
 
 
@@ -55,10 +65,12 @@ app.add_middleware(
     allow_origins=origins,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[questions.NEXT_CURSOR_HEADER],
 )
 
+# responses that are already compressed (cached quiz payloads) are passed through
 app.add_middleware(
-    GZipMiddleware,
+    PrecompressedAwareGZipMiddleware,
     minimum_size=COMPRESS_MIN_THRESHOLD,
 )
 
@@ -68,6 +80,26 @@ app.include_router(forms.router)
 app.include_router(sessions.router)
 app.include_router(session_answers.router)
 app.include_router(organizations.router)
+app.include_router(admin.router)
+app.include_router(export.router)
+
+
+@app.on_event("startup")
+async def start_heartbeat_buffer():
+    heartbeat_buffer.start()
+
+
+@app.on_event("startup")
+async def verify_indexes():
+    try:
+        await run_in_executor(log_missing_indexes, db.delegate)
+    except Exception as exc:
+        logger.error(f"Could not verify indexes: {exc}")
+
+
+@app.on_event("shutdown")
+async def flush_heartbeat_buffer():
+    await heartbeat_buffer.stop()
 
 
 @app.get("/health", tags=["Health"])
@@ -1,4 +1,4 @@
-from typing import Optional, List, Union
+from typing import Optional, List, Tuple, Union
 from bson import ObjectId
 from pydantic import BaseModel, Field
 from schemas import (
@@ -213,6 +213,38 @@ class QuestionResponse(Question):
         }
 
 
+class QuestionRange(BaseModel):
+    """A page of the questions of a question set, in `_id` order: after `after_id`
+    (or from the start), skipping `skip` and returning at most `limit` questions"""
+
+    question_set_id: str
+    after_id: Optional[str] = None
+    skip: int = Field(0, ge=0)
+    limit: Optional[int] = Field(None, gt=0)
+
+
+class QuestionBatchRequest(BaseModel):
+    """Model for the body of the request that fetches several questions at once"""
+
+    question_ids: List[str] = Field([], max_items=500)
+    ranges: List[QuestionRange] = Field([], max_items=50)
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "question_ids": ["6437ad4a2e1c4d6f0a1b2c3d"],
+                "ranges": [
+                    {"question_set_id": "6437ad4a2e1c4d6f0a1b2c00", "limit": 10},
+                    {
+                        "question_set_id": "6437ad4a2e1c4d6f0a1b2c01",
+                        "after_id": "6437ad4a2e1c4d6f0a1b2c3f",
+                        "limit": 10,
+                    },
+                ],
+            }
+        }
+
+
 class QuestionSet(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     questions: List[Question]
@@ -497,6 +529,18 @@ class UpdateSession(BaseModel):
         schema_extra = {"example": {"event": "start-quiz"}}
 
 
+class SyncSession(BaseModel):
+    """Model for the body of the request that syncs answers and an event of a session"""
+
+    answers: List[Tuple[int, UpdateSessionAnswer]] = []
+    event: Optional[EventType]
+
+    class Config:
+        schema_extra = {
+            "example": {"answers": [[0, {"answer": [0, 2]}]], "event": "dummy-event"}
+        }
+
+
 class SessionResponse(Session):
     """Model for the response of any request that returns a session"""
 
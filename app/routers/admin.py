@@ -0,0 +1,82 @@
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import JSONResponse
+
+from logger_config import get_logger
+from services.batch_scoring import DEFAULT_CHUNK_SIZE
+from services.regrade import (
+    DEFAULT_MAX_DIFFS,
+    QuizNotFoundError,
+    regrade_quiz_sessions,
+)
+from settings import Settings
+
+settings = Settings()
+logger = get_logger()
+
+# keep each call well inside load balancer / gateway request timeouts; the regrade
+# checkpoint lets the caller continue with another call
+DEFAULT_REGRADE_TIME_BUDGET_SECONDS = 20
+
+
+def require_admin_key(x_admin_key: Optional[str] = Header(None)):
+    """Admin routes are disabled unless ADMIN_API_KEY is set, and then require it in
+    the X-Admin-Key header."""
+    if not settings.admin_api_key:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="admin endpoints are disabled",
+        )
+    if x_admin_key is None or not secrets.compare_digest(
+        x_admin_key, settings.admin_api_key
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="invalid admin key",
+        )
+
+
+router = APIRouter(
+    prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin_key)]
+)
+
+
+@router.post("/quiz/{quiz_id}/regrade")
+async def regrade_quiz(
+    quiz_id: str,
+    dry_run: bool = False,
+    restart: bool = False,
+    after_session_id: Optional[str] = None,
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=10000),
+    time_budget_seconds: float = Query(DEFAULT_REGRADE_TIME_BUDGET_SECONDS, gt=0),
+    max_diffs: int = Query(DEFAULT_MAX_DIFFS, ge=0),
+):
+    """
+    Recompute and store metrics for every ended session of a quiz (see
+    services/regrade.py). Runs for at most `time_budget_seconds`; while the response
+    has `completed: false`, call again to continue from the checkpoint.
+
+    Query Params:
+    dry_run - only report what would change (with a sample of diffs); writes nothing
+    restart - ignore the checkpoint of an unfinished run and start from the beginning
+    after_session_id - for dry runs, continue after this session id
+    """
+    try:
+        report = await regrade_quiz_sessions(
+            quiz_id,
+            dry_run=dry_run,
+            restart=restart,
+            after_session_id=after_session_id,
+            chunk_size=chunk_size,
+            time_budget_seconds=time_budget_seconds,
+            max_diffs=max_diffs,
+        )
+    except QuizNotFoundError:
+        logger.error(f"Cannot regrade quiz {quiz_id}: quiz not found")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"quiz {quiz_id} not found",
+        )
+    return JSONResponse(status_code=status.HTTP_200_OK, content=report)
@@ -0,0 +1,64 @@
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+
+from logger_config import get_logger
+from routers.admin import require_admin_key
+from services.session_export import (
+    InvalidCursorError,
+    export_filter,
+    iter_session_lines,
+)
+
+logger = get_logger()
+
+router = APIRouter(
+    prefix="/export", tags=["Export"], dependencies=[Depends(require_admin_key)]
+)
+
+
+@router.get("/sessions")
+async def export_sessions(
+    updated_since: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    overlap_seconds: float = Query(0, ge=0),
+    fields: Optional[List[str]] = Query(None),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """
+    Stream the sessions updated since `updated_since` (or after `cursor`) as NDJSON, in
+    `(updated_at, _id)` order, followed by a `{"next_cursor": ...}` line (see
+    services/session_export.py).
+
+    Query Params:
+    updated_since - only sessions whose `updated_at` is at or after this time
+    cursor - continue after the last session of a previous export: its `next_cursor`
+    overlap_seconds - also re-export the sessions updated within this many seconds
+        before `updated_since` / the cursor, to catch writes that became visible late
+        (not for the cursor of a page cut off by `limit`, which continues the run)
+    fields - only export these fields (plus `_id` and `updated_at`); repeat for each
+    limit - export at most this many sessions
+    """
+    if cursor is not None and updated_since is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="pass either updated_since or cursor, not both",
+        )
+    try:
+        session_filter = export_filter(updated_since, cursor, overlap_seconds)
+    except InvalidCursorError as exc:
+        logger.error(str(exc))
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="invalid cursor",
+        )
+    logger.info(
+        f"Exporting sessions updated since {updated_since} after cursor {cursor} "
+        f"(overlap: {overlap_seconds}s, fields: {fields}, limit: {limit})"
+    )
+    return StreamingResponse(
+        iter_session_lines(session_filter, fields, limit, cursor),
+        media_type="application/x-ndjson",
+    )
@@ -1,11 +1,25 @@
-from fastapi import APIRouter, status, HTTPException, Query
-from database import client
-from models import QuestionResponse
+import asyncio
+from collections import defaultdict
+
+from fastapi import APIRouter, status, HTTPException, Query, Request
+from database import db
+from json_encoding import FastJSONResponse, dump_model, dumps
+from models import QuestionBatchRequest, QuestionResponse
+from services.question_store import resolve_questions
+from services.http_caching import (
+    conditional_response,
+    etag_cache,
+    etag_matches,
+    not_modified,
+)
 from logger_config import get_logger
 
 router = APIRouter(prefix="/questions", tags=["Questions"])
 logger = get_logger()
 
+# `_id` of the last question of a full page, see get_questions
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 
 def _hide_answers_in_place(question: dict) -> None:
     """
@@ -16,13 +30,21 @@ def _hide_answers_in_place(question: dict) -> None:
 
 
 @router.get("/{question_id}", response_model=QuestionResponse)
-async def get_question(question_id: str, include_answers: bool = Query(False)):
+async def get_question(
+    request: Request, question_id: str, include_answers: bool = Query(False)
+):
     logger.info(f"Fetching question with ID: {question_id}")
-    if (question := client.quiz.questions.find_one({"_id": question_id})) is not None:
+    cache_key = ("question", question_id, include_answers)
+    if (etag := etag_cache.get(cache_key)) is not None and etag_matches(request, etag):
+        return not_modified(etag)
+
+    if (question := await db.questions.find_one({"_id": question_id})) is not None:
         logger.info(f"Found question with ID: {question_id}")
+        await resolve_questions([question])
         if not include_answers:
             _hide_answers_in_place(question)
-        return question
+        body = dump_model(QuestionResponse, question)
+        return conditional_response(request, body, etag_cache.put(cache_key, body))
 
     logger.error(f"Question {question_id} not found")
     raise HTTPException(
@@ -33,16 +55,32 @@ async def get_question(question_id: str, include_answers: bool = Query(False)):
 
 @router.get("/")
 async def get_questions(
+    request: Request,
     question_set_id: str,
     skip: int = None,
     limit: int = None,
+    after_id: str = None,
     include_answers: bool = Query(False),
 ):
+    """
+    Questions of a question set, in `_id` order. Pages can be fetched by offset
+    (`skip`/`limit`) or, without the cost of skipping, by cursor: a request with a
+    `limit` that returns a full page sends the `_id` to continue after in the
+    `X-Next-Cursor` header, to be passed back as `after_id`.
+    """
     logger.info(
-        f"Fetching questions with question_set_id: {question_set_id} with skip: {skip} and limit: {limit}"
+        f"Fetching questions with question_set_id: {question_set_id} with skip: {skip}, limit: {limit} and after_id: {after_id}"
     )
+    cache_key = ("questions", question_set_id, skip, limit, after_id, include_answers)
+    if (etag := etag_cache.get(cache_key)) is not None and etag_matches(request, etag):
+        return not_modified(etag)
+
+    match = {"question_set_id": question_set_id}
+    if after_id is not None:
+        match["_id"] = {"$gt": after_id}
+
     pipeline = [
-        {"$match": {"question_set_id": question_set_id}},
+        {"$match": match},
         {"$sort": {"_id": 1}},
     ]
 
@@ -52,14 +90,19 @@ async def get_questions(
     if limit:
         pipeline.append({"$limit": limit})
 
-    if (questions := list(client.quiz.questions.aggregate(pipeline))) is not None:
+    if (questions := await db.questions.aggregate(pipeline).to_list()) is not None:
         logger.info(
             f"Found {len(questions)} questions with question_set_id: {question_set_id}"
         )
+        await resolve_questions(questions)
         if not include_answers:
             for q in questions:
                 _hide_answers_in_place(q)
-        return questions
+        body = dumps(questions)
+        response = conditional_response(request, body, etag_cache.put(cache_key, body))
+        if limit and len(questions) == limit:
+            response.headers[NEXT_CURSOR_HEADER] = questions[-1]["_id"]
+        return response
 
     error_message = (
         f"No questions found belonging to question_set_id: {question_set_id}"
@@ -69,3 +112,107 @@ async def get_questions(
         status_code=status.HTTP_404_NOT_FOUND,
         detail=error_message,
     )
+
+
+def _ranges_filter(batch: QuestionBatchRequest) -> dict:
+    """One `$or` branch per range."""
+    branches = []
+    for question_range in batch.ranges:
+        branch = {"question_set_id": question_range.question_set_id}
+        if question_range.after_id is not None:
+            branch["_id"] = {"$gt": question_range.after_id}
+        branches.append(branch)
+    return {"$or": branches}
+
+
+async def _find_listed_questions(question_ids: list) -> dict:
+    """The questions with these ids, by id; a plain `_id` lookup, not sorted."""
+    if not question_ids:
+        return {}
+    questions = await db.questions.find({"_id": {"$in": question_ids}}).to_list()
+    return {question["_id"]: question for question in questions}
+
+
+async def _find_question_ranges(batch: QuestionBatchRequest) -> list:
+    """A page of questions for each range of the batch."""
+    question_sets = [
+        {
+            "question_set_id": question_range.question_set_id,
+            "questions": [],
+            "next_cursor": None,
+        }
+        for question_range in batch.ranges
+    ]
+    if not batch.ranges:
+        return question_sets
+
+    ranges_by_set = defaultdict(list)
+    for index, question_range in enumerate(batch.ranges):
+        ranges_by_set[question_range.question_set_id].append(index)
+    to_skip = [question_range.skip for question_range in batch.ranges]
+    open_ranges = set(range(len(batch.ranges)))
+
+    # sorted like the index, so each range is read in `_id` order and the scan can
+    # stop once every range is full
+    cursor = db.questions.find(
+        _ranges_filter(batch), sort=[("question_set_id", 1), ("_id", 1)]
+    )
+    try:
+        async for question in cursor:
+            for index in ranges_by_set.get(question["question_set_id"], ()):
+                question_range = batch.ranges[index]
+                if index not in open_ranges or (
+                    question_range.after_id is not None
+                    and question["_id"] <= question_range.after_id
+                ):
+                    continue
+                if to_skip[index]:
+                    to_skip[index] -= 1
+                    continue
+                page = question_sets[index]
+                page["questions"].append(question)
+                if len(page["questions"]) == question_range.limit:
+                    page["next_cursor"] = question["_id"]
+                    open_ranges.discard(index)
+            if not open_ranges:
+                break
+    finally:
+        await cursor.close()
+    return question_sets
+
+
+@router.post("/batch")
+async def get_question_batch(
+    batch: QuestionBatchRequest, include_answers: bool = Query(False)
+):
+    """
+    Several questions in one request: the questions listed in
+    `question_ids` (in the order requested, unknown ids left out) and a page of
+    questions for each range, which may span several question sets. Like
+    GET /questions/, a full page of a range has a `next_cursor` to continue after.
+    """
+    logger.info(
+        f"Fetching a batch of {len(batch.question_ids)} questions and {len(batch.ranges)} question ranges"
+    )
+    # the listed ids and the ranges are separate queries, each served by an index
+    found, question_sets = await asyncio.gather(
+        _find_listed_questions(batch.question_ids), _find_question_ranges(batch)
+    )
+
+    await resolve_questions(
+        list(found.values())
+        + [question for page in question_sets for question in page["questions"]]
+    )
+
+    if not include_answers:
+        for question in found.values():
+            _hide_answers_in_place(question)
+        for page in question_sets:
+            for question in page["questions"]:
+                _hide_answers_in_place(question)
+
+    questions = [found[_id] for _id in batch.question_ids if _id in found]
+    logger.info(
+        f"Found {len(questions)} listed questions and {sum(len(page['questions']) for page in question_sets)} questions in ranges"
+    )
+    return FastJSONResponse({"questions": questions, "question_sets": question_sets})
@@ -1,13 +1,37 @@
-from fastapi import APIRouter, status, HTTPException, Query
+import asyncio
+import time
+from collections import Counter
+from operator import itemgetter
+from typing import List
+
+from fastapi import APIRouter, status, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
-from pydantic import BaseModel
-from database import client
+from pydantic import BaseModel, Field, ValidationError
+from pymongo import ReplaceOne
+from pymongo.errors import PyMongoError
+
+from database import client, db, run_in_executor
 from models import Quiz, GetQuizResponse, CreateQuizResponse
 from settings import Settings
+from services.quiz_cache import quiz_cache
+from services.quiz_schema import upgrade_quiz
+from services.http_caching import etag_cache
+from services.question_hydration import hydrate_question_sets, load_questions_by_set
+from services.question_store import store_question_bodies
+from services.omr_options import add_omr_option_placeholders, add_options_counts
+from services.quiz_payload import (
+    get_cached_payload,
+    payload_key,
+    payload_response,
+    render_payload,
+)
 from schemas import QuizType
 from services.cms_ingest import (
+    CONTENT_HASH_FIELD,
+    add_content_hashes,
     fetch_assembled_test,
+    fetch_assembled_tests,
     map_cms_test_to_quiz,
     CmsIngestError,
 )
@@ -36,56 +60,125 @@ def _clear_solutions_in_place(quiz: dict) -> None:
             question["solution"] = []
 
 
-def update_quiz_for_backwards_compatibility(quiz_collection, quiz_id, quiz):
-    """
-    if given quiz contains question sets that do not have max_questions_allowed_to_attempt key,
-    update the question sets (in-place) with the key and value as len(questions) in that set.
-    Additionally, add a default title and marking scheme for the set.
-    Finally, add quiz to quiz_collection
-    (NOTE: this is a primitive form of versioning)
-    """
-    is_backwards_compatibile = True
-    for question_set_index, question_set in enumerate(quiz["question_sets"]):
-        if "max_questions_allowed_to_attempt" not in question_set:
-            is_backwards_compatibile = False
-            question_set["max_questions_allowed_to_attempt"] = len(
-                question_set["questions"]
-            )
-            question_set["title"] = "Section A"
+# fields of the questions past the first subset that are embedded in the quiz document
+# (enough to score them); the rest is fetched from the questions collection on demand
+SUBSET_WITHOUT_DETAILS_FIELDS = (
+    "_id",
+    "graded",
+    "force_correct",
+    "type",
+    "matrix_rows",
+    "correct_answer",
+    "question_set_id",
+    "marking_scheme",
+)
 
-        if (
-            "marking_scheme" not in question_set
-            or question_set["marking_scheme"] is None
-        ):
-            is_backwards_compatibile = False
-            question_marking_scheme = question_set["questions"][0]["marking_scheme"]
-            if question_marking_scheme is not None:
-                question_set["marking_scheme"] = question_marking_scheme
-            else:
-                question_set["marking_scheme"] = {
-                    "correct": 1,
-                    "wrong": 0,
-                    "skipped": 0,
-                }  # default
-
-    if is_backwards_compatibile:
-        logger.info("Quiz is already backwards compatible")
-        return
-
-    logger.info("Starting update for backwards compatibility")
-    update_result = quiz_collection.update_one({"_id": quiz_id}, {"$set": quiz})
-
-    if not update_result.acknowledged:
-        logger.error("Failed to update quiz for backwards compatibility")
+
+def _embed_question_subsets(quiz: dict) -> List[dict]:
+    """Tags each question with its set id and replaces the questions of every set of
+    `quiz` (in place) with the subset pattern: the first `subset_size` questions in
+    full, the rest reduced to SUBSET_WITHOUT_DETAILS_FIELDS. Returns all the questions,
+    in full, to be inserted into the questions collection."""
+    all_questions = []
+    for question_set in quiz["question_sets"]:
+        # `_id` order, as the questions are read back everywhere else
+        questions = sorted(question_set["questions"], key=itemgetter("_id"))
+        for question in questions:
+            question["question_set_id"] = question_set["_id"]
+        all_questions.extend(questions)
+
+        question_set["questions"] = questions[: settings.subset_size] + [
+            {
+                field: question[field]
+                for field in SUBSET_WITHOUT_DETAILS_FIELDS
+                if field in question
+            }
+            for question in questions[settings.subset_size :]
+        ]
+    return all_questions
+
+
+def _insert_in_transaction(questions: List[dict], quizzes: List[dict]):
+    """Inserts the questions and the quizzes atomically (needs a replica set)."""
+
+    def insert(session):
+        questions_result = (
+            db.questions.delegate.insert_many(questions, ordered=False, session=session)
+            if questions
+            else None
+        )
+        quizzes_result = db.quizzes.delegate.insert_many(
+            quizzes, ordered=False, session=session
+        )
+        return questions_result, quizzes_result
+
+    with client.start_session() as session:
+        return session.with_transaction(insert)
+
+
+def _raise_if_unacknowledged(result, error_message: str) -> None:
+    if result is not None and not result.acknowledged:
+        logger.error(error_message)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to update quiz for backwards compatibility",
+            detail=error_message,
+        )
+
+
+async def _insert_quizzes_with_questions(
+    quizzes: List[dict], log_suffix: str = ""
+) -> List[str]:
+    """Insert quizzes (already jsonable-encoded) and their questions into Mongo,
+    returning the new quiz ids in order.
+
+    The quiz documents are built in memory, so this takes one `insert_many` for the
+    questions of all the quizzes and one for the quizzes (in one transaction if
+    `quiz_creation_transaction` is set), however many quizzes and questions there are.
+    """
+    start = time.perf_counter()
+    questions = []
+    for quiz in quizzes:
+        upgrade_quiz(quiz)
+        add_options_counts(quiz)
+        questions.extend(_embed_question_subsets(quiz))
+    logger.info(
+        f"Prepared {len(quizzes)} quizzes with {len(questions)} questions in {time.perf_counter() - start:.3f}s"
+    )
+
+    questions_error = f"Failed to insert questions for quiz{log_suffix}"
+    quizzes_error = f"Failed to insert quiz{log_suffix}"
+    start = time.perf_counter()
+    # with question_dedup, bodies are stored (once) first and the questions become
+    # references to them
+    questions = await store_question_bodies(questions)
+    if settings.quiz_creation_transaction:
+        questions_result, quizzes_result = await run_in_executor(
+            _insert_in_transaction, questions, quizzes
+        )
+        _raise_if_unacknowledged(questions_result, questions_error)
+        logger.info(
+            f"Inserted {len(questions)} questions and {len(quizzes)} quizzes in one transaction in {time.perf_counter() - start:.3f}s"
+        )
+    else:
+        if questions:
+            result = await db.questions.insert_many(questions, ordered=False)
+            _raise_if_unacknowledged(result, questions_error)
+        logger.info(
+            f"Inserted {len(questions)} questions for quiz{log_suffix} in {time.perf_counter() - start:.3f}s"
+        )
+        start = time.perf_counter()
+        quizzes_result = await db.quizzes.insert_many(quizzes, ordered=False)
+        logger.info(
+            f"Inserted {len(quizzes)} quizzes in {time.perf_counter() - start:.3f}s"
         )
 
-    logger.info("Quiz updated for backwards compatibility")
+    for quiz_id in quizzes_result.inserted_ids:
+        quiz_cache.invalidate(quiz_id)
+    _raise_if_unacknowledged(quizzes_result, quizzes_error)
+    return quizzes_result.inserted_ids
 
 
-def _insert_quiz_with_questions(quiz: dict) -> str:
+async def _insert_quiz_with_questions(quiz: dict) -> str:
     """Insert a quiz (already jsonable-encoded) and its questions into Mongo, returning
     the new quiz id. Shared by the direct create endpoint and the CMS-ingest endpoint.
     """
@@ -100,65 +193,143 @@ def _insert_quiz_with_questions(quiz: dict) -> str:
             log_message += log_with_source_id
 
     logger.info(log_message)
-
-    for question_set_index, question_set in enumerate(quiz["question_sets"]):
-        questions = question_set["questions"]
-        for question_index, _ in enumerate(questions):
-            questions[question_index]["question_set_id"] = question_set["_id"]
-
-        result = client.quiz.questions.insert_many(questions)
-        if result.acknowledged:
-            logger.info(
-                f"Inserted {len(questions)} questions for quiz{log_with_source}{log_with_source_id}"
-            )
-        else:
-            error_message = f"Failed to insert questions for quiz{log_with_source}{log_with_source_id}"
-            logger.error(error_message)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=error_message,
-            )
-
-        subset_with_details = client.quiz.questions.aggregate(
-            [
-                {"$match": {"question_set_id": question_set["_id"]}},
-                {"$sort": {"_id": 1}},
-                {"$limit": settings.subset_size},
-            ]
+    (quiz_id,) = await _insert_quizzes_with_questions(
+        [quiz], log_with_source + log_with_source_id
+    )
+    logger.info("Finished creating quiz with id: " + str(quiz_id))
+    return quiz_id
+
+
+def _quiz_changes(stored: dict, quiz: dict) -> dict:
+    """Update document (`$set` and `$unset` paths) that turns the stored quiz document
+    into `quiz`, which has the same question sets with the same number of questions
+    (embedded entries compared one by one). Fields of the quiz or of its question sets
+    that the re-mapped quiz no longer has are unset."""
+    updates = {
+        field: value
+        for field, value in quiz.items()
+        if field not in ("_id", "question_sets") and stored.get(field) != value
+    }
+    removed = [field for field in stored if field not in quiz]
+    for question_set_index, (stored_set, question_set) in enumerate(
+        zip(stored["question_sets"], quiz["question_sets"])
+    ):
+        path = f"question_sets.{question_set_index}"
+        for field, value in question_set.items():
+            if field != "questions" and stored_set.get(field) != value:
+                updates[f"{path}.{field}"] = value
+        removed.extend(
+            f"{path}.{field}" for field in stored_set if field not in question_set
         )
+        for question_index, (stored_question, question) in enumerate(
+            zip(stored_set["questions"], question_set["questions"])
+        ):
+            if stored_question != question:
+                updates[f"{path}.questions.{question_index}"] = question
+
+    changes = {}
+    if updates:
+        changes["$set"] = updates
+    if removed:
+        changes["$unset"] = {path: "" for path in removed}
+    return changes
+
+
+async def _resync_quiz_from_cms(quiz: dict) -> dict:
+    """Store a quiz mapped from a CMS test (already jsonable-encoded and hashed with
+    `add_content_hashes`) by updating the quiz last ingested from the same test:
+
+    - same content hash: nothing is written;
+    - same questions (by CMS `source_id`, set by set): only the questions whose content
+      hash changed are replaced, and only the changed fields and embedded questions of
+      the quiz document are set (and the fields it no longer has unset), keeping all
+      ids;
+    - otherwise (or if the test was never ingested) a new quiz is created.
+
+    Replaced questions keep their ids, and the question ETags remembered by other
+    workers are keyed on those, so other workers can answer conditional GETs of them
+    with 304 for up to `etag_cache_ttl_seconds` after a re-sync (only this worker's
+    `etag_cache` is cleared).
+
+    Returns the quiz id, what was done (`sync`) and how many questions were replaced.
+    """
+    source_id = quiz["metadata"]["source_id"]
+    stored = await db.quizzes.find_one(
+        {
+            "metadata.source": quiz["metadata"]["source"],
+            "metadata.source_id": source_id,
+        },
+        sort=[("_id", -1)],
+    )
+    if (
+        stored is not None
+        and stored.get(CONTENT_HASH_FIELD) == quiz[CONTENT_HASH_FIELD]
+    ):
+        logger.info(f"CMS test {source_id} is unchanged since quiz {stored['_id']}")
+        return {"id": stored["_id"], "sync": "unchanged", "updated_questions": 0}
 
-        subset_without_details = client.quiz.questions.aggregate(
-            [
-                {"$match": {"question_set_id": question_set["_id"]}},
-                {"$sort": {"_id": 1}},
-                {"$skip": settings.subset_size},
-                {
-                    "$project": {
-                        "graded": 1,
-                        "force_correct": 1,
-                        "type": 1,
-                        "matrix_rows": 1,
-                        "correct_answer": 1,
-                        "question_set_id": 1,
-                        "marking_scheme": 1,
-                    }
-                },
-            ]
+    if stored is not None:
+        stored_questions_by_set = await load_questions_by_set(
+            [question_set["_id"] for question_set in stored["question_sets"]]
         )
-
-        aggregated_questions = list(subset_with_details) + list(subset_without_details)
-        quiz["question_sets"][question_set_index]["questions"] = aggregated_questions
-
-    new_quiz_result = client.quiz.quizzes.insert_one(quiz)
-    if not new_quiz_result.acknowledged:
-        error_message = f"Failed to insert quiz{log_with_source}{log_with_source_id}"
-        logger.error(error_message)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=error_message,
+        stored_questions = [
+            stored_questions_by_set[question_set["_id"]]
+            for question_set in stored["question_sets"]
+        ]
+        same_questions = [
+            [question.get("source_id") for question in questions]
+            for questions in stored_questions
+        ] == [
+            [question.get("source_id") for question in question_set["questions"]]
+            for question_set in quiz["question_sets"]
+        ]
+    if stored is None or not same_questions:
+        logger.info(
+            f"CMS test {source_id} has no quiz with the same questions, creating one"
         )
-    logger.info("Finished creating quiz with id: " + str(new_quiz_result.inserted_id))
-    return new_quiz_result.inserted_id
+        quiz_id = await _insert_quiz_with_questions(quiz)
+        return {"id": quiz_id, "sync": "created", "updated_questions": 0}
+
+    # take over the ids of the stored quiz, then replace what changed
+    quiz["_id"] = stored["_id"]
+    changed_questions = []
+    for question_set, stored_set, questions in zip(
+        quiz["question_sets"], stored["question_sets"], stored_questions
+    ):
+        question_set["_id"] = stored_set["_id"]
+        for question, stored_question in zip(question_set["questions"], questions):
+            question["_id"] = stored_question["_id"]
+            question["question_set_id"] = stored_set["_id"]
+            if stored_question.get(CONTENT_HASH_FIELD) != question[CONTENT_HASH_FIELD]:
+                changed_questions.append(question)
+
+    upgrade_quiz(quiz)
+    add_options_counts(quiz)
+    _embed_question_subsets(quiz)
+    quiz_updates = _quiz_changes(stored, quiz)
+
+    question_updates = [
+        ReplaceOne({"_id": question["_id"]}, question)
+        for question in await store_question_bodies(changed_questions)
+    ]
+    if question_updates:
+        await db.questions.bulk_write(question_updates, ordered=False)
+        # question ETags are only remembered per endpoint and query flags
+        etag_cache.clear()
+    if quiz_updates:
+        await db.quizzes.update_one({"_id": stored["_id"]}, quiz_updates)
+    quiz_cache.invalidate(stored["_id"])
+    logger.info(
+        f"Re-synced quiz {stored['_id']} from CMS test {source_id}: "
+        f"{len(question_updates)} questions updated, "
+        f"{len(quiz_updates.get('$set', {}))} quiz fields set and "
+        f"{len(quiz_updates.get('$unset', {}))} unset"
+    )
+    return {
+        "id": stored["_id"],
+        "sync": "updated",
+        "updated_questions": len(question_updates),
+    }
 
 
 class CmsQuizIngestRequest(BaseModel):
@@ -168,6 +339,8 @@ class CmsQuizIngestRequest(BaseModel):
     curriculum_id: int
     grade_id: int
     quiz_type: str = QuizType.assessment.value
+    # update the quiz last ingested from this test instead of creating a new one
+    resync: bool = False
 
     class Config:
         schema_extra = {
@@ -176,6 +349,7 @@ class CmsQuizIngestRequest(BaseModel):
                 "curriculum_id": 1,
                 "grade_id": 1,
                 "quiz_type": "assessment",
+                "resync": False,
             }
         }
 
@@ -183,7 +357,7 @@ class CmsQuizIngestRequest(BaseModel):
 @router.post("/", response_model=CreateQuizResponse)
 async def create_quiz(quiz: Quiz):
     quiz = jsonable_encoder(quiz)
-    quiz_id = _insert_quiz_with_questions(quiz)
+    quiz_id = await _insert_quiz_with_questions(quiz)
     return JSONResponse(status_code=status.HTTP_201_CREATED, content={"id": quiz_id})
 
 
@@ -196,8 +370,11 @@ async def create_quiz_from_cms(request: CmsQuizIngestRequest):
         f"grade {request.grade_id})"
     )
     try:
-        assembled = fetch_assembled_test(
-            request.test_id, request.curriculum_id, request.grade_id
+        assembled = await asyncio.to_thread(
+            fetch_assembled_test,
+            request.test_id,
+            request.curriculum_id,
+            request.grade_id,
         )
         quiz_dict, warnings = map_cms_test_to_quiz(
             assembled, quiz_type=request.quiz_type
@@ -208,55 +385,107 @@ async def create_quiz_from_cms(request: CmsQuizIngestRequest):
 
     # Validate + fill defaults (ids, etc.) through the same model the direct endpoint uses.
     quiz = jsonable_encoder(Quiz(**quiz_dict))
-    quiz_id = _insert_quiz_with_questions(quiz)
+    add_content_hashes(quiz)
+    if request.resync:
+        result = await _resync_quiz_from_cms(quiz)
+    else:
+        result = {"id": await _insert_quiz_with_questions(quiz), "sync": "created"}
 
     if warnings:
         logger.warning(
             f"CMS ingest for test {request.test_id} produced warnings: {warnings}"
         )
     return JSONResponse(
-        status_code=status.HTTP_201_CREATED,
+        status_code=status.HTTP_201_CREATED
+        if result["sync"] == "created"
+        else status.HTTP_200_OK,
         content={
-            "id": quiz_id,
+            **result,
             "source_id": str(request.test_id),
             "warnings": warnings,
         },
     )
 
 
-@router.get("/{quiz_id}", response_model=GetQuizResponse)
-async def get_quiz(
-    quiz_id: str,
-    omr_mode: bool = Query(False),
-    single_page_mode: bool = Query(False),
-    include_answers: bool = Query(False),
-):
-    logger.info(
-        f"Starting to get quiz: {quiz_id} with omr_mode={omr_mode}, single_page_mode={single_page_mode}, include_answers={include_answers}"
-    )
-    quiz_collection = client.quiz.quizzes
+class CmsBulkIngestRequest(BaseModel):
+    """Body for POST /quiz/from-cms/bulk — several chapter tests in the new CMS."""
 
-    if (quiz := quiz_collection.find_one({"_id": quiz_id})) is None:
-        logger.warning(f"Requested quiz {quiz_id} not found")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail=f"quiz {quiz_id} not found"
-        )
+    tests: List[CmsQuizIngestRequest] = Field(..., min_items=1, max_items=100)
 
-    # Validate that this is not a form (forms should use /form endpoint)
-    if (
-        "metadata" in quiz
-        and quiz["metadata"] is not None
-        and "quiz_type" in quiz["metadata"]
-        and quiz["metadata"]["quiz_type"] == QuizType.form.value
-    ):
-        logger.warning(
-            f"Item {quiz_id} is a form (quiz_type: {quiz['metadata']['quiz_type']}), should use /form endpoint"
-        )
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail=f"quiz {quiz_id} not found"
-        )
 
-    update_quiz_for_backwards_compatibility(quiz_collection, quiz_id, quiz)
+@router.post("/from-cms/bulk")
+async def create_quizzes_from_cms(request: CmsBulkIngestRequest):
+    """Ingest several CMS tests at once: the assembled tests are fetched concurrently
+    (see services/cms_ingest.py) and the quizzes mapped from them are inserted together,
+    except for tests with `resync` set, which are re-synced one by one. A test that
+    cannot be fetched, mapped or re-synced does not stop the others; the response reports, per
+    test, the quiz id and what was done, or the error."""
+    logger.info(f"CMS bulk ingest of {len(request.tests)} tests")
+    assembled_tests = await fetch_assembled_tests(
+        [(test.test_id, test.curriculum_id, test.grade_id) for test in request.tests]
+    )
+
+    results = []
+    mapped_results = []
+    quizzes = []
+    resyncs = []
+    for test, assembled in zip(request.tests, assembled_tests):
+        result = {
+            "test_id": test.test_id,
+            "curriculum_id": test.curriculum_id,
+            "grade_id": test.grade_id,
+            "id": None,
+            "sync": None,
+            "warnings": [],
+            "error": None,
+        }
+        results.append(result)
+        try:
+            if isinstance(assembled, CmsIngestError):
+                raise assembled
+            quiz_dict, result["warnings"] = map_cms_test_to_quiz(
+                assembled, quiz_type=test.quiz_type
+            )
+            quiz = jsonable_encoder(Quiz(**quiz_dict))
+        except (CmsIngestError, ValidationError) as exc:
+            logger.error(f"CMS ingest failed for test {test.test_id}: {exc}")
+            result["error"] = str(exc)
+            continue
+        add_content_hashes(quiz)
+        if test.resync:
+            resyncs.append((result, quiz))
+        else:
+            quizzes.append(quiz)
+            mapped_results.append(result)
+
+    if quizzes:
+        quiz_ids = await _insert_quizzes_with_questions(quizzes, " from CMS")
+        for result, quiz_id in zip(mapped_results, quiz_ids):
+            result.update(id=quiz_id, sync="created")
+    for result, quiz in resyncs:
+        try:
+            result.update(await _resync_quiz_from_cms(quiz))
+        except (HTTPException, PyMongoError) as exc:
+            error = exc.detail if isinstance(exc, HTTPException) else str(exc)
+            logger.error(f"CMS re-sync failed for test {result['test_id']}: {error}")
+            result["error"] = error
+
+    counts = Counter(result["sync"] for result in results)
+    logger.info(f"CMS bulk ingest of {len(request.tests)} tests: {dict(counts)}")
+    return {
+        "created": counts["created"],
+        "updated": counts["updated"],
+        "unchanged": counts["unchanged"],
+        "failed": counts[None],
+        "results": results,
+    }
+
+
+async def _render_quiz(
+    quiz: dict, omr_mode: bool, single_page_mode: bool, include_answers: bool
+) -> dict:
+    """Build the GET /quiz response for one render variant (mutates `quiz`)."""
+    quiz_id = quiz["_id"]
 
     # Handle single page mode with full text (non-OMR)
     if single_page_mode and not omr_mode:
@@ -264,13 +493,7 @@ async def get_quiz(
             f"Single page mode with full text enabled for quiz: {quiz_id}, fetching all questions"
         )
         # Fetch all questions with full details for each question set
-        for question_set_index, question_set in enumerate(quiz["question_sets"]):
-            all_questions = list(
-                client.quiz.questions.find(
-                    {"question_set_id": question_set["_id"]}
-                ).sort("_id", 1)
-            )
-            quiz["question_sets"][question_set_index]["questions"] = all_questions
+        await hydrate_question_sets(quiz)
         logger.info(f"Finished fetching all questions for single page mode: {quiz_id}")
         if quiz.get("display_solution", True) is False:
             _clear_solutions_in_place(quiz)
@@ -290,56 +513,9 @@ async def get_quiz(
 
     else:
         logger.info(
-            f"Quiz has to be rendered in OMR Mode, calculating options count for quiz: {quiz_id}"
-        )
-        question_set_ids = [
-            question_set["_id"] for question_set in quiz["question_sets"]
-        ]
-
-        # find questions with given question set ids
-        # count number of options for each question in a qset id
-        # group them together into an optionsArray
-        options_count_across_sets = list(
-            client.quiz.questions.aggregate(
-                [
-                    {"$match": {"question_set_id": {"$in": question_set_ids}}},
-                    {"$sort": {"_id": 1}},  # sort questions based on question_id
-                    {
-                        "$project": {
-                            "_id": 0,
-                            "question_set_id": "$question_set_id",
-                            "number_of_options": {"$size": "$options"},
-                        }
-                    },
-                    {
-                        "$group": {
-                            "_id": "$question_set_id",
-                            "options_count_per_set": {"$push": "$number_of_options"},
-                        }
-                    },
-                    {"$sort": {"_id": 1}},  # sort sets based on question_set_id
-                    {"$project": {"_id": 0, "options_count_per_set": 1}},
-                ]
-            )
+            f"Quiz has to be rendered in OMR Mode, adding option placeholders for quiz: {quiz_id}"
         )
-        for question_set_index, question_set in enumerate(quiz["question_sets"]):
-            updated_subset_without_details = []
-            options_count_per_set = options_count_across_sets[question_set_index][
-                "options_count_per_set"
-            ]
-            for question_index, question in enumerate(question_set["questions"]):
-                if question_index < settings.subset_size:
-                    continue
-
-                # options_count will be zero for subbjective/numerical questions
-                question["options"] = [
-                    {"text": "", "image": None}
-                ] * options_count_per_set[question_index]
-                updated_subset_without_details.append(question)
-
-            quiz["question_sets"][question_set_index]["questions"][
-                settings.subset_size :
-            ] = updated_subset_without_details
+        await add_omr_option_placeholders(quiz)
 
     if quiz.get("display_solution", True) is False:
         _clear_solutions_in_place(quiz)
@@ -349,5 +525,54 @@ async def get_quiz(
     if not include_answers:
         _hide_answers_in_quiz_in_place(quiz)
 
-    logger.info(f"Finished getting quiz: {quiz_id}")
     return quiz
+
+
+@router.get("/{quiz_id}", response_model=GetQuizResponse)
+async def get_quiz(
+    request: Request,
+    quiz_id: str,
+    omr_mode: bool = Query(False),
+    single_page_mode: bool = Query(False),
+    include_answers: bool = Query(False),
+):
+    logger.info(
+        f"Starting to get quiz: {quiz_id} with omr_mode={omr_mode}, single_page_mode={single_page_mode}, include_answers={include_answers}"
+    )
+    # the quiz's display_solution is part of the cached quiz, so not of the key
+    variant = payload_key(
+        "quiz",
+        omr_mode=omr_mode,
+        single_page_mode=single_page_mode,
+        include_answers=include_answers,
+    )
+    if (payload := get_cached_payload(quiz_id, variant)) is not None:
+        logger.info(f"Finished getting quiz: {quiz_id} (cached payload)")
+        return payload_response(request, payload)
+
+    if (quiz := await quiz_cache.get(quiz_id)) is None:
+        logger.warning(f"Requested quiz {quiz_id} not found")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"quiz {quiz_id} not found"
+        )
+
+    # Validate that this is not a form (forms should use /form endpoint)
+    if (
+        "metadata" in quiz
+        and quiz["metadata"] is not None
+        and "quiz_type" in quiz["metadata"]
+        and quiz["metadata"]["quiz_type"] == QuizType.form.value
+    ):
+        logger.warning(
+            f"Item {quiz_id} is a form (quiz_type: {quiz['metadata']['quiz_type']}), should use /form endpoint"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"quiz {quiz_id} not found"
+        )
+
+    async def render(quiz: dict) -> dict:
+        return await _render_quiz(quiz, omr_mode, single_page_mode, include_answers)
+
+    payload = await render_payload(quiz, variant, render)
+    logger.info(f"Finished getting quiz: {quiz_id}")
+    return payload_response(request, payload)
@@ -3,13 +3,16 @@ import random
 from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
 import pymongo
-from database import client
+from pymongo import ReturnDocument
+from database import db
+from json_encoding import FastJSONResponse, model_response
 from schemas import EventType, QuizType
 from models import (
     Event,
     Session,
     SessionAnswer,
     SessionResponse,
+    SyncSession,
     UpdateSession,
     UpdateSessionResponse,
 )
@@ -17,7 +20,27 @@ from datetime import datetime
 from logger_config import get_logger
 from typing import Any, Dict, List, Optional
 from settings import Settings
-from services.scoring import compute_session_metrics
+from services.scoring import compile_scoring_plan, score_session
+from services.quiz_cache import quiz_cache
+from services.question_hydration import get_questions_by_set
+from services.question_store import resolve_questions
+from services.heartbeat_buffer import heartbeat_buffer
+from services.answer_updates import (
+    AnswerUpdates,
+    PositionOutOfBoundsError,
+    SessionAnswersNotFoundError,
+    SessionNotFoundError,
+    answers_filter,
+    answers_set_query,
+    apply_answer_updates,
+    encode_answer_updates,
+    merge_answers_expression,
+    raise_for_failed_update,
+)
+from services.session_events import (
+    EVENT_RESULT_PROJECTION,
+    build_event_update_pipeline,
+)
 
 
 def str_to_datetime(value) -> Optional[datetime]:
@@ -99,21 +122,21 @@ def _is_required_form_answer_complete(question: Dict[str, Any], answer: Any) ->
     return isinstance(answer, list) and len(answer) > 0
 
 
-def _hydrate_required_form_matrix_rows(quiz: Dict[str, Any]) -> None:
-    for question_set_index, question_set in enumerate(quiz.get("question_sets") or []):
-        questions = question_set.get("questions") or []
-        has_missing_matrix_rows = any(
+async def _hydrate_required_form_matrix_rows(quiz: Dict[str, Any]) -> None:
+    question_sets_missing_matrix_rows = [
+        question_set
+        for question_set in quiz.get("question_sets") or []
+        if any(
             question.get("type")
             in ["matrix-rating", "matrix-numerical", "matrix-subjective"]
             and not question.get("matrix_rows")
-            for question in questions
+            for question in question_set.get("questions") or []
         )
-        if has_missing_matrix_rows:
-            quiz["question_sets"][question_set_index]["questions"] = list(
-                client.quiz.questions.find(
-                    {"question_set_id": question_set["_id"]}
-                ).sort("_id", 1)
-            )
+    ]
+    if question_sets_missing_matrix_rows:
+        questions_by_set = await get_questions_by_set(quiz)
+        for question_set in question_sets_missing_matrix_rows:
+            question_set["questions"] = questions_by_set[question_set["_id"]]
 
 
 def _get_incomplete_required_form_positions(
@@ -135,6 +158,11 @@ def _get_incomplete_required_form_positions(
     return positions
 
 
+def _get_scoring_plan(quiz: Dict[str, Any]):
+    """Compiled scoring plan for the quiz, reused across sessions while it is cached."""
+    return quiz_cache.get_derived(quiz, "scoring_plan", compile_scoring_plan)
+
+
 def _time_elapsed_secs(dt_1, dt_2) -> float:
     d1 = str_to_datetime(dt_1)
     d2 = str_to_datetime(dt_2)
@@ -171,7 +199,7 @@ async def quiz_preflight(
     Lightweight helper endpoint for FE.
     Returns whether FE should request quiz with answers included.
     """
-    latest_session = client.quiz.sessions.find_one(
+    latest_session = await db.sessions.find_one(
         {"quiz_id": quiz_id, "user_id": user_id},
         sort=[("_id", pymongo.DESCENDING)],
     )
@@ -199,7 +227,7 @@ async def create_session(session: Session):
     )
     current_session = jsonable_encoder(session)
 
-    quiz = client.quiz.quizzes.find_one({"_id": current_session["quiz_id"]})
+    quiz = await quiz_cache.get(current_session["quiz_id"])
 
     if quiz is None:
         error_message = (
@@ -211,17 +239,20 @@ async def create_session(session: Session):
             detail=error_message,
         )
 
-    # try to get the previous two sessions of a user+quiz pair if they exist
-    previous_two_sessions = list(
-        client.quiz.sessions.find(
-            {
-                "quiz_id": current_session["quiz_id"],
-                "user_id": current_session["user_id"],
-            },
-            sort=[("_id", pymongo.DESCENDING)],
-            limit=2,
-        )
+    # the previous session's timing is copied below, so write out buffered heartbeats
+    await heartbeat_buffer.flush_user_quiz(
+        current_session["user_id"], current_session["quiz_id"]
     )
+
+    # try to get the previous two sessions of a user+quiz pair if they exist
+    previous_two_sessions = await db.sessions.find(
+        {
+            "quiz_id": current_session["quiz_id"],
+            "user_id": current_session["user_id"],
+        },
+        sort=[("_id", pymongo.DESCENDING)],
+        limit=2,
+    ).to_list()
     last_session, second_last_session = None, None
     # only one session exists
     if len(previous_two_sessions) == 1:
@@ -280,9 +311,9 @@ async def create_session(session: Session):
                 last_session.get("has_quiz_ended")
                 and last_session.get("metrics") is None
             ):
-                session_metrics = compute_session_metrics(last_session, quiz)
+                session_metrics = score_session(last_session, _get_scoring_plan(quiz))
                 now = datetime.utcnow()
-                update_result = client.quiz.sessions.update_one(
+                update_result = await db.sessions.update_one(
                     {"_id": last_session["_id"]},
                     {"$set": {"metrics": session_metrics, "updated_at": now}},
                 )
@@ -298,7 +329,7 @@ async def create_session(session: Session):
                 last_session["omr_mode"] = session.omr_mode
                 last_session["updated_at"] = now
                 logger.info("Updating omr_mode value in last_session")
-                update_result = client.quiz.sessions.update_one(
+                update_result = await db.sessions.update_one(
                     {"_id": last_session["_id"]},
                     {"$set": {"omr_mode": session.omr_mode, "updated_at": now}},
                 )
@@ -309,9 +340,8 @@ async def create_session(session: Session):
                         detail="Failed to update last session's omr_mode value",
                     )
 
-            return JSONResponse(
-                status_code=status.HTTP_201_CREATED,
-                content=jsonable_encoder(last_session),
+            return FastJSONResponse(
+                status_code=status.HTTP_201_CREATED, content=last_session
             )
 
         # we reach here because some meaningful event (start/resume/end) has occurred in last_session
@@ -362,7 +392,7 @@ async def create_session(session: Session):
     current_session["updated_at"] = datetime.utcnow()
 
     # insert current session into db
-    result = client.quiz.sessions.insert_one(current_session)
+    result = await db.sessions.insert_one(current_session)
     if result.acknowledged:
         logger.info(
             f"Created new session with id {result.inserted_id} for user: {session.user_id} and quiz: {session.quiz_id} with {session.omr_mode} as omr_mode"
@@ -376,9 +406,9 @@ async def create_session(session: Session):
             detail="Failed to insert new session",
         )
 
-    # return the created session (ensure datetimes/ObjectIds are JSON-safe)
-    return JSONResponse(
-        status_code=status.HTTP_201_CREATED, content=jsonable_encoder(current_session)
+    # return the created session (datetimes/ObjectIds are encoded by FastJSONResponse)
+    return FastJSONResponse(
+        status_code=status.HTTP_201_CREATED, content=current_session
     )
 
 
@@ -394,232 +424,276 @@ async def update_session(session_id: str, session_updates: UpdateSession):
     when end-quiz event is sent, backend computes and stores metrics
     """
     new_event = jsonable_encoder(session_updates)["event"]
-    log_message = f"Updating session with id {session_id} and event {new_event}"
-    session_update_query = {}
+    logger.info(f"Updating session with id {session_id} and event {new_event}")
+    return await _record_event(session_id, new_event)
 
-    session = client.quiz.sessions.find_one({"_id": session_id})
-    if session is None:
+
+@router.post("/{session_id}/sync", response_model=UpdateSessionResponse)
+async def sync_session(session_id: str, session_sync: SyncSession):
+    """
+    Applies a batch of session answer updates and, optionally, a session event with a
+    single write, e.g. to send answer changes along with heartbeats instead of as
+    separate requests. Returns time_remaining (and metrics for end-quiz), like
+    PATCH /sessions/{session_id}.
+
+    Function Params:
+    session_sync - `answers`: list of [position index, session answer] pairs, as for
+    PATCH /session_answers/{session_id}/update-multiple-answers; `event`: optional event
+    """
+    updates = encode_answer_updates(session_sync.answers)
+    event = jsonable_encoder(session_sync)["event"]
+    logger.info(
+        f"Syncing session with id {session_id}: {len(updates)} answers, event {event}"
+    )
+    try:
+        if event is not None:
+            return await _record_event(session_id, event, updates)
+
+        session = await _write_answers(session_id, updates)
+    except (SessionNotFoundError, SessionAnswersNotFoundError):
         logger.error(
-            f"Received session update request, but session_id {session_id} not found"
+            f"Received session sync request, but session {session_id} or its answers were not found"
         )
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"session {session_id} not found",
         )
-    user_id, quiz_id = session["user_id"], session["quiz_id"]
-    log_message += f", for user: {user_id} and quiz: {quiz_id}"
-    logger.info(log_message)
+    except PositionOutOfBoundsError:
+        error_message = "One or more provided position indices are out of bounds of the session answers array"
+        logger.error(error_message)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=error_message,
+        )
 
-    new_event_obj = jsonable_encoder(Event.parse_obj({"event_type": new_event}))
-    total_time_spent = session.get("total_time_spent", None)
-    running_total = float(total_time_spent or 0)
-    should_update_total_time_spent = total_time_spent is None
-    has_started = session.get("start_quiz_time") is not None or (
-        session.get("events")
-        and session["events"][0].get("event_type") == EventType.start_quiz
-    )
-    if new_event == EventType.start_quiz:
-        has_started = True
-    has_ended = session.get("has_quiz_ended") is True
-
-    gap_since_prev_event_end = 0.0
-    if session["events"] is None:
-        session["events"] = [new_event_obj]
-        if "$set" not in session_update_query:
-            session_update_query["$set"] = {"events": [new_event_obj]}
-        else:
-            session_update_query["$set"].update({"events": [new_event_obj]})
+    buffered = await heartbeat_buffer.get(session_id)
+    if buffered is not None:
+        time_remaining = buffered.time_remaining
+    elif session.get("time_limit_max") is not None:
+        time_remaining = session.get("time_remaining")
     else:
-        last_event = session["events"][-1] if session.get("events") else None
-        last_event_type = last_event.get("event_type") if last_event else None
-        last_event_created_at = last_event.get("created_at") if last_event else None
-        last_event_updated_at = last_event.get("updated_at") if last_event else None
-
-        # Timing rules:
-        # - Dummy events define active windows (count full duration).
-        # - Resume events without a dummy in between get a capped gap (<= 20s).
-        # - End always counts the final gap after the last event.
-        if (
-            new_event == EventType.dummy_event
-            and last_event_type == EventType.dummy_event
-        ):
-            # We'll extend the previous dummy-event window by updating its updated_at.
-            # We also use this to incrementally update session.total_time_spent without double-counting.
-            prev_dummy_updated_at = last_event_updated_at
-            # if previous event is dummy, just change the updated_at time of previous event
-            last_event_index = len(session["events"]) - 1
-            last_event_update_query = {
-                "events."
-                + str(last_event_index)
-                + ".updated_at": new_event_obj["created_at"]
-            }
-            # mirror this update in-memory too (helps keep local state consistent)
-            session["events"][-1]["updated_at"] = new_event_obj["created_at"]
-            if "$set" not in session_update_query:
-                session_update_query["$set"] = last_event_update_query
-            else:
-                session_update_query["$set"].update(last_event_update_query)
-
-            # Increment total_time_spent by only the newly added dummy window extension:
-            # new_updated_at - old_updated_at
-            if has_started and not has_ended:
-                delta = _time_elapsed_secs(
-                    new_event_obj.get("created_at"), prev_dummy_updated_at
-                )
-                if delta > 0:
-                    running_total += float(delta)
-                    should_update_total_time_spent = True
+        time_remaining = None
+    return JSONResponse(
+        status_code=status.HTTP_200_OK, content={"time_remaining": time_remaining}
+    )
 
-        else:
-            # Not a consecutive dummy; record the new event in the timeline.
-            session["events"].append(new_event_obj)
-            if "$push" not in session_update_query:
-                session_update_query["$push"] = {"events": new_event_obj}
-            else:
-                session_update_query["$push"].update({"events": new_event_obj})
-
-            # elapsed time since the previous event "ended" (updated_at if present, else created_at)
-            gap_since_prev_event_end = _time_elapsed_secs(
-                new_event_obj.get("created_at"),
-                last_event_updated_at or last_event_created_at,
+
+async def _write_answers(session_id: str, updates: AnswerUpdates) -> Dict[str, Any]:
+    """Writes answer updates with one conditional update and returns the session's
+    time limit fields."""
+    projection = {"time_limit_max": 1, "time_remaining": 1}
+    if not updates:
+        session = await db.sessions.find_one({"_id": session_id}, projection)
+        if session is None:
+            raise SessionNotFoundError(session_id)
+        return session
+
+    session = await db.sessions.find_one_and_update(
+        answers_filter(session_id, updates),
+        {"$set": {**answers_set_query(updates), "updated_at": datetime.utcnow()}},
+        projection=projection,
+    )
+    if session is None:
+        await raise_for_failed_update(session_id)
+    return session
+
+
+async def _record_event(
+    session_id: str, new_event: str, answer_updates: Optional[AnswerUpdates] = None
+) -> JSONResponse:
+    """
+    Records `new_event` (and `answer_updates`, if any) with a single server-side update
+    (see services/session_events.py); only end-quiz reads the answers, to score them.
+    """
+    if new_event == EventType.dummy_event:
+        buffered = await heartbeat_buffer.extend(session_id, _extend_buffered_heartbeat)
+        if buffered is not None:
+            if answer_updates:
+                await _write_answers(session_id, answer_updates)
+            return JSONResponse(
+                status_code=status.HTTP_200_OK,
+                content={"time_remaining": buffered.time_remaining},
             )
+    else:
+        # other events depend on up-to-date timing
+        await heartbeat_buffer.flush_session(session_id)
 
-            # If this is the first dummy-event after some non-dummy event, we can increment
-            # total_time_spent by:
-            # (dummy.created_at - prev_event.end) + (dummy.updated_at - dummy.created_at)
-            if new_event == EventType.dummy_event:
-                if has_started and not has_ended:
-                    delta = gap_since_prev_event_end
-                    delta += _time_elapsed_secs(
-                        new_event_obj.get("updated_at"), new_event_obj.get("created_at")
-                    )
-                    if delta > 0:
-                        running_total += float(delta)
-                        should_update_total_time_spent = True
-            elif new_event == EventType.end_quiz:
-                # End-quiz always counts the final gap since the last event ended.
-                if has_started and not has_ended and gap_since_prev_event_end > 0:
-                    running_total += float(gap_since_prev_event_end)
-                    should_update_total_time_spent = True
-            elif new_event == EventType.resume_quiz:
-                # Resume updates: if there was no dummy window in between, cap the gap at 20s.
-                # - previous event is dummy: dummy already captured elapsed time, so add 0 here
-                # - previous event is start/resume: add up to 20s to avoid counting long idle gaps
-                if (
-                    has_started
-                    and not has_ended
-                    and last_event_type != EventType.dummy_event
-                ):
-                    delta = max(0, min(gap_since_prev_event_end, 20))
-                    if delta > 0:
-                        running_total += float(delta)
-                        should_update_total_time_spent = True
-
-    # Precompute and store session-level timing fields
-    # - start_quiz_time: set once when start-quiz arrives
-    # - end_quiz_time + total_time_spent: set when end-quiz arrives (event-based, matches ETL)
-    if new_event == EventType.start_quiz and not session.get("start_quiz_time"):
-        session_update_query.setdefault("$set", {}).update(
-            {"start_quiz_time": new_event_obj.get("created_at")}
+    new_event_obj = jsonable_encoder(Event.parse_obj({"event_type": new_event}))
+    end_quiz_fields = None
+    if new_event == EventType.end_quiz:
+        end_quiz_fields = await _get_end_quiz_fields(
+            session_id, new_event_obj, answer_updates
         )
 
-    if should_update_total_time_spent:
-        session_update_query.setdefault("$set", {}).update(
-            {"total_time_spent": round(running_total, 2)}
+    extra_updates = None
+    if answer_updates:
+        extra_updates = {"session_answers": merge_answers_expression(answer_updates)}
+    session = await db.sessions.find_one_and_update(
+        answers_filter(session_id, answer_updates or {}),
+        build_event_update_pipeline(
+            new_event_obj,
+            str_to_datetime(new_event_obj["created_at"]),
+            end_quiz_fields=end_quiz_fields,
+            extra_updates=extra_updates,
+        ),
+        projection=EVENT_RESULT_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if session is None:
+        if answer_updates:
+            await raise_for_failed_update(session_id)
+        logger.error(
+            f"Received session update request, but session_id {session_id} not found"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"session {session_id} not found",
         )
+    user_id, quiz_id = session["user_id"], session["quiz_id"]
 
     # Derive time_remaining from time_limit_max and total_time_spent
-    response_content = {}
     time_limit_max = session.get("time_limit_max")
-    if time_limit_max is None:
-        # no meaning of time remaining, we send time_remaining as None
-        response_content = {"time_remaining": None}
-    if time_limit_max is not None:
-        # running_total may still be None if we haven't accumulated any timing yet.
-        time_remaining = derive_time_remaining(time_limit_max, running_total or 0)
-        session_update_query.setdefault("$set", {}).update(
-            {"time_remaining": time_remaining}
-        )
-        response_content = {"time_remaining": time_remaining}
+    # no meaning of time remaining without a time limit, we send time_remaining as None
+    time_remaining = (
+        session.get("time_remaining") if time_limit_max is not None else None
+    )
+    response_content = {"time_remaining": time_remaining}
+    if end_quiz_fields is not None:
+        response_content["metrics"] = end_quiz_fields["metrics"]
 
-    # update the document in the sessions collection
-    if new_event == EventType.end_quiz:
-        session_metrics = session.get("metrics")
-        if not has_ended:
-            quiz = client.quiz.quizzes.find_one({"_id": session["quiz_id"]})
-            if quiz is None:
-                logger.error(
-                    f"Quiz {session['quiz_id']} not found while scoring session {session_id}"
-                )
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"quiz {session['quiz_id']} not found",
-                )
-            if (quiz.get("metadata") or {}).get(
-                "quiz_type"
-            ) == QuizType.form.value and quiz.get("require_all_questions") is True:
-                _hydrate_required_form_matrix_rows(quiz)
-                incomplete_positions = _get_incomplete_required_form_positions(
-                    quiz, session
-                )
-                if incomplete_positions:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail={
-                            "message": "all required form questions must be answered before submission",
-                            "missing_positions": incomplete_positions,
-                        },
-                    )
-            session_metrics = compute_session_metrics(session, quiz)
-        session_update_query.setdefault("$set", {}).update(
-            {
-                "has_quiz_ended": True,
-                "metrics": session_metrics,
-                "end_quiz_time": new_event_obj.get("created_at"),
-                "total_time_spent": round(running_total, 2),
-            }
+    logger.info(
+        f"Updated session with id {session_id} for user: {user_id} and quiz: {quiz_id}"
+    )
+    has_started = (
+        session.get("start_quiz_time") is not None
+        or session.get("first_event_type") == EventType.start_quiz
+    )
+    if (
+        new_event == EventType.dummy_event
+        and has_started
+        and session.get("has_quiz_ended") is not True
+    ):
+        # buffer further heartbeats of this session
+        await heartbeat_buffer.track(
+            session_id,
+            user_id,
+            quiz_id,
+            event_index=session["event_count"] - 1,
+            event_updated_at=session["last_event"]["updated_at"],
+            total_time_spent=session.get("total_time_spent") or 0,
+            time_limit_max=time_limit_max,
+            time_remaining=time_remaining,
         )
-        response_content["metrics"] = session_metrics
+    return JSONResponse(status_code=status.HTTP_200_OK, content=response_content)
 
-    # Always bump session-level updated_at for any session change
-    session_update_query.setdefault("$set", {}).update(
-        {"updated_at": datetime.utcnow()}
-    )
 
-    update_result = client.quiz.sessions.update_one(
-        {"_id": session_id}, session_update_query
+async def _get_end_quiz_fields(
+    session_id: str,
+    new_event_obj: Dict[str, Any],
+    answer_updates: Optional[AnswerUpdates] = None,
+) -> Dict[str, Any]:
+    """Fields stored along with an end-quiz event: computes metrics for the answers,
+    including `answer_updates` sent with the event (once; an already ended session
+    keeps its metrics)."""
+    session = await db.sessions.find_one(
+        {"_id": session_id},
+        projection={
+            "quiz_id": 1,
+            "has_quiz_ended": 1,
+            "metrics": 1,
+            "session_answers": 1,
+        },
     )
-    if update_result.modified_count == 0:
-        logger.error(f"Failed to update session with id {session_id}")
+    if session is None:
+        logger.error(
+            f"Received session update request, but session_id {session_id} not found"
+        )
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to update session with id {session_id}",
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"session {session_id} not found",
         )
 
-    logger.info(
-        f"Updated session with id {session_id} for user: {user_id} and quiz: {quiz_id}"
+    if answer_updates:
+        if session.get("session_answers") is None:
+            raise SessionAnswersNotFoundError(session_id)
+        session["session_answers"] = apply_answer_updates(
+            session["session_answers"], answer_updates
+        )
+
+    session_metrics = session.get("metrics")
+    if session.get("has_quiz_ended") is not True:
+        quiz = await quiz_cache.get(session["quiz_id"])
+        if quiz is None:
+            logger.error(
+                f"Quiz {session['quiz_id']} not found while scoring session {session_id}"
+            )
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"quiz {session['quiz_id']} not found",
+            )
+        if (quiz.get("metadata") or {}).get(
+            "quiz_type"
+        ) == QuizType.form.value and quiz.get("require_all_questions") is True:
+            await _hydrate_required_form_matrix_rows(quiz)
+            incomplete_positions = _get_incomplete_required_form_positions(
+                quiz, session
+            )
+            if incomplete_positions:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail={
+                        "message": "all required form questions must be answered before submission",
+                        "missing_positions": incomplete_positions,
+                    },
+                )
+        session_metrics = score_session(session, _get_scoring_plan(quiz))
+
+    return {
+        "has_quiz_ended": True,
+        "metrics": session_metrics,
+        "end_quiz_time": new_event_obj.get("created_at"),
+    }
+
+
+def _extend_buffered_heartbeat(buffered) -> None:
+    """
+    Consecutive dummy-event for a session whose timing is buffered: apply the same
+    timing rules as `update_session` to the buffered state, without a DB round trip
+    (see services/heartbeat_buffer.py).
+    """
+    new_event_obj = jsonable_encoder(
+        Event.parse_obj({"event_type": EventType.dummy_event})
     )
-    return JSONResponse(status_code=status.HTTP_200_OK, content=response_content)
+    delta = _time_elapsed_secs(new_event_obj["created_at"], buffered.event_updated_at)
+    if delta > 0:
+        buffered.total_time_spent = round(buffered.total_time_spent + float(delta), 2)
+    buffered.event_updated_at = new_event_obj["created_at"]
+
+    if buffered.time_limit_max is not None:
+        buffered.time_remaining = derive_time_remaining(
+            buffered.time_limit_max, buffered.total_time_spent
+        )
 
 
 @router.get("/{session_id}", response_model=SessionResponse)
 async def get_session(session_id: str):
     logger.info(f"Fetching session with id {session_id}")
-    if (session := client.quiz.sessions.find_one({"_id": session_id})) is not None:
+    await heartbeat_buffer.flush_session(session_id)
+    if (session := await db.sessions.find_one({"_id": session_id})) is not None:
         logger.info(f"Found session with id {session_id}")
         if session.get("has_quiz_ended") and session.get("metrics") is None:
-            quiz = client.quiz.quizzes.find_one({"_id": session["quiz_id"]})
+            quiz = await quiz_cache.get(session["quiz_id"])
             if quiz is not None:
-                session_metrics = compute_session_metrics(session, quiz)
+                session_metrics = score_session(session, _get_scoring_plan(quiz))
                 now = datetime.utcnow()
-                update_result = client.quiz.sessions.update_one(
+                update_result = await db.sessions.update_one(
                     {"_id": session_id},
                     {"$set": {"metrics": session_metrics, "updated_at": now}},
                 )
                 if update_result.acknowledged:
                     session["metrics"] = session_metrics
                     session["updated_at"] = now
-        return session
+        return model_response(SessionResponse, session)
 
     logger.error(f"Session {session_id} not found")
     raise HTTPException(
@@ -638,7 +712,7 @@ async def check_all_quiz_status(user_id: str) -> Dict[str, bool]:
     """
     logger.info(f"Fetching all quiz attempts for user {user_id}")
 
-    user_latest_sessions = client.quiz.sessions.aggregate(
+    user_latest_sessions = await db.sessions.aggregate(
         [
             {"$match": {"user_id": user_id}},
             {"$sort": {"_id": -1}},
@@ -649,7 +723,7 @@ async def check_all_quiz_status(user_id: str) -> Dict[str, bool]:
                 }
             },
         ]
-    )
+    ).to_list()
 
     # Create a dictionary of quiz end statuses for easy lookup
     latest_sessions_dict = {
@@ -670,7 +744,7 @@ async def reveal_correct_answer(
     After a student submits an answer, FE calls this endpoint to fetch the raw
     correct answer (and solution if enabled) for that one question.
     """
-    session = client.quiz.sessions.find_one({"_id": session_id})
+    session = await db.sessions.find_one({"_id": session_id})
     if session is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -678,7 +752,7 @@ async def reveal_correct_answer(
         )
 
     quiz_id = session.get("quiz_id")
-    quiz = client.quiz.quizzes.find_one({"_id": quiz_id})
+    quiz = await quiz_cache.get(quiz_id)
     if quiz is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"quiz {quiz_id} not found"
@@ -712,12 +786,13 @@ async def reveal_correct_answer(
             detail="session answer missing question_id",
         )
 
-    question = client.quiz.questions.find_one({"_id": question_id})
+    question = await db.questions.find_one({"_id": question_id})
     if question is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"question {question_id} not found",
         )
+    await resolve_questions([question])
 
     display_solution = quiz.get("display_solution", True) is not False
     response = {
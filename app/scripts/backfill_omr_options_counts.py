@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Backfill script to store the OMR option counts on existing quizzes.
+
+For every question set without `options_count_per_question`, counts the options of its
+questions (in `_id` order) in the questions collection and stores the counts on the
+quiz, so that rendering the quiz in OMR mode doesn't have to. Questions stored as
+references to deduplicated bodies are counted from their body, the way rendering does
+(services/omr_options.py).
+
+Safe to run multiple times; question sets that already have counts are skipped. Until
+then, rendering such a quiz in OMR mode computes the counts in memory (once per cached
+copy) without storing them.
+
+Usage (from app/):
+    python scripts/backfill_omr_options_counts.py [--dry-run]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from database import client  # noqa: E402
+from services.omr_options import (  # noqa: E402
+    OPTIONS_COUNT_FIELD,
+    load_options_counts,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Store OMR option counts on existing quizzes."
+    )
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    quiz_collection = client.quiz.quizzes
+
+    updated_quizzes = 0
+    for quiz in quiz_collection.find(
+        {"question_sets": {"$elemMatch": {OPTIONS_COUNT_FIELD: {"$exists": False}}}},
+        projection={"question_sets._id": 1, f"question_sets.{OPTIONS_COUNT_FIELD}": 1},
+    ):
+        update = {
+            f"question_sets.{question_set_index}.{OPTIONS_COUNT_FIELD}": (
+                asyncio.run(load_options_counts(question_set["_id"]))
+            )
+            for question_set_index, question_set in enumerate(quiz["question_sets"])
+            if question_set.get(OPTIONS_COUNT_FIELD) is None
+        }
+        if not update:
+            continue
+        if not args.dry_run:
+            quiz_collection.update_one({"_id": quiz["_id"]}, {"$set": update})
+        updated_quizzes += 1
+        print(f"{quiz['_id']}: {len(update)} question set(s)")
+
+    print(f"{'Would update' if args.dry_run else 'Updated'} {updated_quizzes} quizzes")
+
+
+if __name__ == "__main__":
+    main()
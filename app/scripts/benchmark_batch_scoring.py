@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+Benchmark bulk rescoring: per-session `score_session` vs chunked `score_sessions`.
+
+Generates synthetic sessions for a quiz (a JSON file, by default the matrix-match
+assessment from the test fixtures: single/multi-choice, matrix-match and numerical
+questions), scores them both ways, checks the results are identical and prints
+sessions/sec for each path. No database is needed.
+
+Usage (from the repo root):
+    python app/scripts/benchmark_batch_scoring.py --sessions 50000 --chunk-size 1000
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from services.batch_scoring import DEFAULT_CHUNK_SIZE, score_sessions  # noqa: E402
+from services.scoring import compile_scoring_plan, score_session  # noqa: E402
+
+DEFAULT_QUIZ_PATH = os.path.join(
+    ROOT, "tests", "dummy_data", "matrix_matching_assessment.json"
+)
+
+
+def _random_answer(question, rng):
+    if rng.random() < 0.2:
+        return None
+    question_type = question.get("type")
+    correct_answer = question.get("correct_answer")
+    if question_type in ["numerical-integer", "numerical-float"]:
+        try:
+            correct_value = float(correct_answer)
+        except (TypeError, ValueError):
+            correct_value = 0.0
+        return rng.choice([correct_value, correct_value + 1, rng.randint(0, 9)])
+    if question_type == "subjective":
+        return rng.choice(["", "some text"])
+    if isinstance(correct_answer, list) and correct_answer:
+        # the key plus one distractor of the same kind
+        distractor = (
+            "ZZ" if isinstance(correct_answer[0], str) else max(correct_answer) + 1
+        )
+        options = list(correct_answer) + [distractor]
+        if question_type == "single-choice":
+            return [rng.choice(options)]
+        return rng.sample(options, rng.randint(1, len(options)))
+    return None
+
+
+def make_sessions(quiz, num_sessions, seed=0):
+    rng = random.Random(seed)
+    questions = [
+        question
+        for question_set in quiz["question_sets"]
+        for question in question_set["questions"]
+    ]
+    return [
+        {
+            "session_answers": [
+                {
+                    "answer": _random_answer(question, rng),
+                    "marked_for_review": rng.random() < 0.1,
+                }
+                for question in questions
+            ]
+        }
+        for _ in range(num_sessions)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--quiz", default=DEFAULT_QUIZ_PATH, help="quiz JSON file")
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    with open(args.quiz) as quiz_file:
+        quiz = json.load(quiz_file)
+    sessions = make_sessions(quiz, args.sessions)
+    num_questions = len(sessions[0]["session_answers"]) if sessions else 0
+    print(f"{args.sessions} sessions x {num_questions} questions ({args.quiz})")
+
+    start = time.perf_counter()
+    plan = compile_scoring_plan(quiz)
+    expected = [score_session(session, plan) for session in sessions]
+    per_session_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    plan = compile_scoring_plan(quiz)
+    actual = []
+    for offset in range(0, len(sessions), args.chunk_size):
+        actual.extend(score_sessions(sessions[offset : offset + args.chunk_size], plan))
+    batch_seconds = time.perf_counter() - start
+
+    if actual != expected:
+        sys.exit("batch scoring does not match per-session scoring")
+
+    print(
+        f"per-session: {per_session_seconds:.2f}s "
+        f"({args.sessions / per_session_seconds:,.0f} sessions/sec)"
+    )
+    print(
+        f"batch (chunks of {args.chunk_size}): {batch_seconds:.2f}s "
+        f"({args.sessions / batch_seconds:,.0f} sessions/sec, "
+        f"{per_session_seconds / batch_seconds:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
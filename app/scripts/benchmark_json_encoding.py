@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""
+Benchmark response encoding: `jsonable_encoder` + `json` (what FastAPI does for a
+`response_model`) vs `json_encoding.dump_model` (orjson).
+
+Builds a quiz with `--questions` questions (by repeating the questions of a fixture, all
+stored in full, as in single page mode) and a session with as many answers and events,
+encodes each both ways, checks the results decode to the same JSON and prints the time
+per encode and the peak memory allocated during one encode. No database is needed.
+
+Usage (from the repo root):
+    python app/scripts/benchmark_json_encoding.py --questions 200 --repeat 200
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from json_encoding import dump_model  # noqa: E402
+from models import GetQuizResponse, SessionResponse  # noqa: E402
+
+DEFAULT_QUIZ_PATH = os.path.join(
+    ROOT, "tests", "dummy_data", "long_assessment_quiz.json"
+)
+
+
+def make_quiz(quiz, num_questions):
+    quiz = copy.deepcopy(quiz)
+    question_set = quiz["question_sets"][0]
+    question_set["_id"] = str(ObjectId())
+    template = question_set["questions"]
+    question_set["questions"] = [
+        {
+            **copy.deepcopy(template[index % len(template)]),
+            "_id": str(ObjectId()),
+            "question_set_id": question_set["_id"],
+        }
+        for index in range(num_questions)
+    ]
+    quiz["question_sets"] = [question_set]
+    quiz["_id"] = str(ObjectId())
+    return quiz
+
+
+def make_session(quiz, num_questions):
+    start = datetime(2024, 1, 1, 9, 30, 0, 123456)
+    questions = quiz["question_sets"][0]["questions"]
+    return {
+        "_id": str(ObjectId()),
+        "user_id": "1234",
+        "quiz_id": quiz["_id"],
+        "is_first": True,
+        "created_at": start,
+        "updated_at": start + timedelta(minutes=30),
+        "start_quiz_time": start,
+        "has_quiz_ended": False,
+        "time_limit_max": 3600,
+        "total_time_spent": 1800.25,
+        "time_remaining": 1800,
+        "question_order": list(range(num_questions)),
+        "events": [
+            {
+                "event_type": "start-quiz" if index == 0 else "dummy-event",
+                "created_at": (start + timedelta(seconds=20 * index)).isoformat(),
+                "updated_at": (start + timedelta(seconds=20 * index + 19)).isoformat(),
+            }
+            for index in range(num_questions)
+        ],
+        "session_answers": [
+            {
+                "_id": str(ObjectId()),
+                "question_id": question["_id"],
+                "answer": [index % 4],
+                "visited": True,
+                "time_spent": 20,
+                "marked_for_review": False,
+                "created_at": start + timedelta(seconds=20 * index),
+                "updated_at": start + timedelta(seconds=20 * index + 10),
+            }
+            for index, question in enumerate(questions)
+        ],
+    }
+
+
+def encode_with_jsonable_encoder(model, content):
+    if not isinstance(content, model):
+        content = model.parse_obj(content)
+    return JSONResponse(jsonable_encoder(content, by_alias=True)).body
+
+
+def measure(encode, model, content, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = encode(model, content)
+    seconds = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    encode(model, content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return body, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--quiz", default=DEFAULT_QUIZ_PATH, help="quiz JSON file")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    with open(args.quiz) as quiz_file:
+        quiz = make_quiz(json.load(quiz_file), args.questions)
+    session = make_session(quiz, args.questions)
+
+    for name, model, content in [
+        ("GetQuizResponse", GetQuizResponse, quiz),
+        ("SessionResponse", SessionResponse, session),
+    ]:
+        # with validation against the model (as served), and encoding alone
+        for label, payload in [
+            ("validate + encode", content),
+            ("encode only", model.parse_obj(content)),
+        ]:
+            expected, old_seconds, old_peak = measure(
+                encode_with_jsonable_encoder, model, payload, args.repeat
+            )
+            actual, new_seconds, new_peak = measure(
+                dump_model, model, payload, args.repeat
+            )
+            if json.loads(actual) != json.loads(expected):
+                sys.exit(
+                    f"{name}: orjson output does not match jsonable_encoder output"
+                )
+
+            print(
+                f"{name}, {label} ({args.questions} questions, "
+                f"{len(expected) / 1024:.0f} KiB)"
+            )
+            print(
+                f"  jsonable_encoder + json: {old_seconds * 1000:.2f} ms, "
+                f"peak {old_peak / 1024:.0f} KiB"
+            )
+            print(
+                f"  orjson:                  {new_seconds * 1000:.2f} ms, "
+                f"peak {new_peak / 1024:.0f} KiB "
+                f"({old_seconds / new_seconds:.1f}x faster)"
+            )
+
+
+if __name__ == "__main__":
+    main()
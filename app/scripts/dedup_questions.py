@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Convert questions stored in full into references to deduplicated bodies.
+
+For every question without a `body_id`, stores its body once in `question_bodies`
+(under the hash of its content, see services/question_store.py) and replaces the
+question with a reference to it, in batches of `--batch-size`. Question ids and
+`question_set_id` are kept, so quizzes and sessions are unaffected. Safe to re-run;
+questions already converted are skipped.
+
+Only run it once the API has `QUESTION_DEDUP` on (older API versions cannot read
+references), and after `backfill_omr_options_counts.py`, whose counts are read from the
+question documents.
+
+Usage (from app/):
+    python scripts/dedup_questions.py [--dry-run] [--batch-size 1000]
+"""
+
+import argparse
+import os
+import sys
+
+from pymongo import ReplaceOne
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from database import client  # noqa: E402
+from services.question_store import (  # noqa: E402
+    BODY_ID_FIELD,
+    body_writes,
+    split_question,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    question_collection = client.quiz.questions
+    body_collection = client.quiz.question_bodies
+
+    converted = 0
+    body_ids = set()
+    references = []
+    bodies = {}
+
+    def write():
+        if references and not args.dry_run:
+            # bodies first, so a reference never points at a missing body
+            body_collection.bulk_write(body_writes(bodies), ordered=False)
+            question_collection.bulk_write(
+                [
+                    ReplaceOne(
+                        {"_id": reference["_id"], BODY_ID_FIELD: {"$exists": False}},
+                        reference,
+                    )
+                    for reference in references
+                ],
+                ordered=False,
+            )
+        references.clear()
+        bodies.clear()
+
+    for question in question_collection.find({BODY_ID_FIELD: {"$exists": False}}):
+        if BODY_ID_FIELD in question:
+            # converted by an earlier batch while the cursor was open
+            continue
+        reference, body = split_question(question)
+        references.append(reference)
+        bodies[reference[BODY_ID_FIELD]] = body
+        body_ids.add(reference[BODY_ID_FIELD])
+        converted += 1
+        if len(references) >= args.batch_size:
+            write()
+            print(f"{converted} questions done")
+    write()
+
+    print(
+        f"{'Would convert' if args.dry_run else 'Converted'} {converted} questions "
+        f"into references to {len(body_ids)} distinct bodies"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Compare, create and check the indexes declared in app/indexes.py.
+
+- diff (default): print declared indexes missing from the database, and indexes on
+  those collections that are not declared.
+- create: create the missing declared indexes (builds run on the server; on a large
+  collection, run it outside peak hours).
+- explain: run `explain` on every hot query and report collection scans / in-memory
+  sorts; exits non-zero if any.
+
+Usage (from app/):
+    python scripts/manage_indexes.py [diff|create|explain]
+"""
+
+import argparse
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from database import client  # noqa: E402
+from indexes import (  # noqa: E402
+    HOT_QUERIES,
+    create_missing_indexes,
+    diff_indexes,
+    undeclared_indexes,
+    unindexed_stages,
+)
+
+
+def print_diff(database):
+    missing = diff_indexes(database)
+    for collection, specs in missing.items():
+        for spec in specs:
+            print(f"missing    {collection}.{spec.name}  ({spec.used_by})")
+    for collection, names in undeclared_indexes(database).items():
+        for name in names:
+            print(f"undeclared {collection}.{name}")
+    if not missing:
+        print("all declared indexes exist")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the app's MongoDB indexes.")
+    parser.add_argument(
+        "command", nargs="?", default="diff", choices=["diff", "create", "explain"]
+    )
+    args = parser.parse_args()
+    database = client.quiz
+
+    if args.command == "diff":
+        print_diff(database)
+    elif args.command == "create":
+        for collection, names in create_missing_indexes(database).items():
+            print(f"created {collection}: {', '.join(names)}")
+        print_diff(database)
+    else:
+        failed = False
+        for query in HOT_QUERIES:
+            problems = unindexed_stages(query.explain(database))
+            failed = failed or bool(problems)
+            print(
+                f"{'FAIL' if problems else 'ok  '} {query.description} {problems or ''}"
+            )
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Upgrade stored quizzes to the current schema version (services/quiz_schema.py).
+
+Finds every quiz whose `schema_version` is missing or older than
+`QUIZ_SCHEMA_VERSION`, computes the fields it lacks and writes only those fields (plus
+`schema_version`), in unordered bulk writes of `--batch-size` quizzes. Each update is
+conditional on the quiz still being outdated, so the script is safe to run while the
+API is serving, and to re-run.
+
+Until a quiz is migrated, readers upgrade it in memory on every cache fill; after the
+migration that is a single version comparison.
+
+Usage (from app/):
+    python scripts/migrate_quiz_schema.py [--dry-run] [--batch-size 500]
+"""
+
+import argparse
+import os
+import sys
+
+from pymongo import UpdateOne
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from database import client  # noqa: E402
+from services.quiz_schema import QUIZ_SCHEMA_VERSION, schema_upgrades  # noqa: E402
+
+OUTDATED = {"schema_version": {"$not": {"$gte": QUIZ_SCHEMA_VERSION}}}
+
+# what schema_upgrades looks at; question details are not needed
+PROJECTION = {
+    "schema_version": 1,
+    "question_sets.max_questions_allowed_to_attempt": 1,
+    "question_sets.marking_scheme": 1,
+    "question_sets.questions.marking_scheme": 1,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    quiz_collection = client.quiz.quizzes
+    print(
+        f"{quiz_collection.count_documents(OUTDATED)} quizzes older than "
+        f"schema version {QUIZ_SCHEMA_VERSION}"
+    )
+
+    operations = []
+    upgraded = 0
+    stamped_only = 0
+
+    def write():
+        if operations and not args.dry_run:
+            quiz_collection.bulk_write(operations, ordered=False)
+        operations.clear()
+
+    for quiz in quiz_collection.find(OUTDATED, projection=PROJECTION):
+        updates = schema_upgrades(quiz)
+        if len(updates) > 1:
+            upgraded += 1
+        else:
+            stamped_only += 1
+        operations.append(
+            UpdateOne({"_id": quiz["_id"], **OUTDATED}, {"$set": updates})
+        )
+        if len(operations) >= args.batch_size:
+            write()
+            print(f"{upgraded + stamped_only} quizzes done")
+    write()
+
+    print(
+        f"{'Would upgrade' if args.dry_run else 'Upgraded'} {upgraded} quizzes "
+        f"and stamp {stamped_only} already current ones"
+    )
+
+
+if __name__ == "__main__":
+    main()
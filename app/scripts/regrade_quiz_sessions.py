@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Recompute and store metrics for every ended session of a quiz, e.g. after one of its
+correct answers was fixed. See app/services/regrade.py for how it works.
+
+- Streams sessions in _id order and writes changed metrics with one bulk_write per
+  chunk (unchanged sessions are not written).
+- Checkpoints progress in `regrade_checkpoints`: rerunning after a crash or Ctrl-C
+  resumes where it stopped. Use --restart to start over.
+- --dry-run writes nothing and prints a sample of the metric changes instead.
+
+Usage (from app/):
+    python scripts/regrade_quiz_sessions.py <quiz_id> --dry-run
+    python scripts/regrade_quiz_sessions.py <quiz_id> [--chunk-size 1000] [--restart]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from services.batch_scoring import DEFAULT_CHUNK_SIZE  # noqa: E402
+from services.regrade import (  # noqa: E402
+    DEFAULT_MAX_DIFFS,
+    QuizNotFoundError,
+    regrade_quiz_sessions,
+)
+
+
+def print_progress(report):
+    print(
+        f"processed={report['processed']} changed={report['changed']} "
+        f"written={report['written']} last_session_id={report['last_session_id']} "
+        f"({report['sessions_per_sec']:,.0f} sessions/sec)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Regrade all ended sessions of a quiz."
+    )
+    parser.add_argument("quiz_id")
+    parser.add_argument("--dry-run", action="store_true", help="write nothing")
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore the checkpoint and start over"
+    )
+    parser.add_argument(
+        "--after-session-id", help="dry runs: start after this session id"
+    )
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--max-diffs", type=int, default=DEFAULT_MAX_DIFFS)
+    args = parser.parse_args()
+
+    try:
+        report = asyncio.run(
+            regrade_quiz_sessions(
+                args.quiz_id,
+                dry_run=args.dry_run,
+                restart=args.restart,
+                after_session_id=args.after_session_id,
+                chunk_size=args.chunk_size,
+                max_diffs=args.max_diffs,
+                on_chunk=print_progress,
+            )
+        )
+    except QuizNotFoundError as exc:
+        sys.exit(str(exc))
+
+    if args.dry_run:
+        for diff in report.pop("diffs"):
+            print(json.dumps(diff, default=str))
+    print(json.dumps(report, default=str, indent=2))
+
+
+if __name__ == "__main__":
+    main()
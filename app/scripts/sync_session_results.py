@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Keep the `session_results` collection up to date from a change stream on `sessions`.
+
+Runs until interrupted (SIGINT / SIGTERM), resuming from the stored resume token; the
+first run (or `--rebuild`) backfills the results of every ended session first. See
+services/session_results.py. Run exactly one instance per deployment, next to the API
+(not inside it: every API worker would process every change), against a replica set.
+Locally, a single-node replica set is enough:
+    mongod --replSet rs0  &&  mongosh --eval "rs.initiate()"
+
+Usage (from app/):
+    python scripts/sync_session_results.py [--rebuild] [--batch-size 500]
+"""
+
+import argparse
+import os
+import signal
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from database import client  # noqa: E402
+from services.session_results import (  # noqa: E402
+    CHECKPOINT_ID,
+    DEFAULT_BATCH_SIZE,
+    SessionResultsSync,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="forget the stored resume token and backfill all results again",
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    sync = SessionResultsSync(client.quiz, batch_size=args.batch_size)
+    if args.rebuild:
+        sync.checkpoints.delete_one({"_id": CHECKPOINT_ID})
+
+    stopping = []
+
+    def stop(signum, frame):
+        print("Stopping after the current batch")
+        stopping.append(signum)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    sync.run(should_stop=lambda: bool(stopping))
+
+
+if __name__ == "__main__":
+    main()
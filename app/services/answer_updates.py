@@ -0,0 +1,126 @@
+"""
+Conditional writes of session answers by position.
+
+Answer writes are the most frequent writes in the system, so they never read the
+session first. The update filter itself checks that the session exists and that its
+`session_answers` array has the largest position being written. Only when the update
+matches nothing does `raise_for_failed_update` read a tiny projection of the session to
+tell why.
+
+Updates are kept as `{position_index: {field: value}}`, and can be applied as a `$set`
+of dotted paths (`answers_set_query`), inside an update pipeline
+(`merge_answers_expression`), or in memory (`apply_answer_updates`).
+"""
+
+from typing import Any, Dict, Iterable, List, NoReturn, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from database import db
+from models import UpdateSessionAnswer
+from utils import remove_optional_unset_args
+
+
+class SessionNotFoundError(Exception):
+    pass
+
+
+class SessionAnswersNotFoundError(Exception):
+    pass
+
+
+class PositionOutOfBoundsError(Exception):
+    pass
+
+
+AnswerUpdates = Dict[int, Dict[str, Any]]
+
+
+def encode_answer_updates(
+    positions_and_answers: Iterable[Tuple[int, UpdateSessionAnswer]]
+) -> AnswerUpdates:
+    """Only the fields that were sent are written; later updates of the same position
+    win."""
+    updates: AnswerUpdates = {}
+    for position_index, session_answer in positions_and_answers:
+        updates.setdefault(position_index, {}).update(
+            jsonable_encoder(remove_optional_unset_args(session_answer))
+        )
+    return updates
+
+
+def answers_filter(session_id: str, updates: AnswerUpdates) -> Dict[str, Any]:
+    """Filter matching the session only if every position being written exists."""
+    if not updates:
+        return {"_id": session_id}
+    if min(updates) < 0:
+        raise PositionOutOfBoundsError(min(updates))
+    return {"_id": session_id, f"session_answers.{max(updates)}": {"$exists": True}}
+
+
+def answers_set_query(updates: AnswerUpdates) -> Dict[str, Any]:
+    return {
+        f"session_answers.{position_index}.{key}": value
+        for position_index, session_answer in updates.items()
+        for key, value in session_answer.items()
+    }
+
+
+def merge_answers_expression(updates: AnswerUpdates) -> Dict[str, Any]:
+    """Update pipeline expression for `session_answers` with `updates` merged in
+    (dotted array paths can't be used in pipelines)."""
+    return {
+        "$map": {
+            "input": {"$range": [0, {"$size": "$session_answers"}]},
+            "as": "position",
+            "in": {
+                "$let": {
+                    "vars": {
+                        "answer": {"$arrayElemAt": ["$session_answers", "$$position"]}
+                    },
+                    "in": {
+                        "$switch": {
+                            "branches": [
+                                {
+                                    "case": {"$eq": ["$$position", position_index]},
+                                    "then": {
+                                        "$mergeObjects": [
+                                            "$$answer",
+                                            {"$literal": session_answer},
+                                        ]
+                                    },
+                                }
+                                for position_index, session_answer in updates.items()
+                            ],
+                            "default": "$$answer",
+                        }
+                    },
+                }
+            },
+        }
+    }
+
+
+def apply_answer_updates(
+    session_answers: List[Dict[str, Any]], updates: AnswerUpdates
+) -> List[Dict[str, Any]]:
+    if updates and not (0 <= min(updates) and max(updates) < len(session_answers)):
+        raise PositionOutOfBoundsError(max(updates))
+    return [
+        {**session_answer, **updates[position_index]}
+        if position_index in updates
+        else session_answer
+        for position_index, session_answer in enumerate(session_answers)
+    ]
+
+
+async def raise_for_failed_update(session_id: str) -> NoReturn:
+    """Raises why a conditional answer update matched no session."""
+    session = await db.sessions.find_one(
+        {"_id": session_id}, projection={"session_answers": {"$slice": 0}}
+    )
+    if session is None:
+        raise SessionNotFoundError(session_id)
+    if session.get("session_answers") is None:
+        raise SessionAnswersNotFoundError(session_id)
+    raise PositionOutOfBoundsError(session_id)
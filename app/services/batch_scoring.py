@@ -0,0 +1,545 @@
+"""
+Score many sessions of one quiz at once.
+
+`score_session` (services/scoring.py) walks one session's answers question by question.
+That is the right tool for end-quiz, but rescoring every session of a quiz after a
+correct answer is fixed means tens of thousands of sessions, and there the per-answer
+Python dispatch dominates. `score_sessions` instead scores a chunk of sessions column
+by column: each question's answers across the chunk are packed into NumPy arrays and
+graded with a handful of vector operations.
+
+- Choice questions (single-choice, multi-choice, matrix-match): every distinct option
+  value in the column gets a bit, so an answer becomes an int64 bitmask. "Correct" is
+  mask equality and "partially correct" is `mask & ~correct_mask == 0`. Packing is
+  memoized per distinct answer, since a column only has a few hundred of them.
+- Numerical questions: answers become a float vector compared against the key.
+- Everything else (subjective, matrix-rating, ...), and any answer that does not fit the
+  packed representation (duplicates, non-list values, unorderable options), is graded
+  by the compiled per-question grader, so results are identical to `score_session`.
+
+Counts and marks are accumulated per question set as vectors in question order (the
+same float operations, in the same order, as the per-session path), then turned into
+the usual `SessionMetrics` dicts.
+"""
+
+import asyncio
+from itertools import repeat
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from database import db
+from services.scoring import (
+    CORRECT,
+    NOT_ANSWERED,
+    NUMERICAL_FLOAT_TOLERANCE,
+    PARTIALLY_CORRECT,
+    QUESTION_FORCE_CORRECT,
+    QUESTION_GRADED,
+    WRONG,
+    QuestionPlan,
+    QuestionSetPlan,
+    ScoringPlan,
+    _NUMBER_TYPES,
+    _grade_multi_choice,
+    _grade_numerical_float,
+    _grade_numerical_integer,
+    _grade_single_choice,
+    _is_form_answered,
+    compile_scoring_plan,
+)
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# a column can hold at most this many distinct option values before it falls back to
+# per-answer grading (one bit each in an int64 mask)
+_MAX_OPTION_BITS = 63
+
+# packed answer kinds
+_PACKED_NONE = 0
+_PACKED_NUMBER = 1
+_PACKED_MASK = 2
+_PACKED_OTHER = 3
+
+# the value a packed numeric key is compared with when it is not a number at all
+_NO_KEY = np.nan
+
+# session total -> the per-set count it sums
+_TOTALS = {
+    "total_answered": "num_answered",
+    "total_skipped": "num_skipped",
+    "total_correct": "num_correct",
+    "total_wrong": "num_wrong",
+    "total_partially_correct": "num_partially_correct",
+    "total_marked_for_review": "num_marked_for_review",
+}
+
+_CHOICE_GRADERS = (_grade_single_choice, _grade_multi_choice)
+_NUMERICAL_GRADERS = (_grade_numerical_integer, _grade_numerical_float)
+
+
+def _grade_column_scalar(
+    question_plan: QuestionPlan, answers: List[Any], does_partial_marking_exist: bool
+) -> np.ndarray:
+    grade = question_plan.grade
+    return np.fromiter(
+        (
+            grade(question_plan, answer, does_partial_marking_exist)
+            for answer in answers
+        ),
+        dtype=np.int8,
+        count=len(answers),
+    )
+
+
+def _encode(keys: List[Any]) -> Tuple[List[Any], np.ndarray]:
+    """Dictionary-encode a column: its distinct values (equal values share one entry)
+    and, for each entry, the index of its value. Raises TypeError if unhashable."""
+    code_by_key = {key: code for code, key in enumerate(dict.fromkeys(keys))}
+    codes = np.fromiter(map(code_by_key.__getitem__, keys), np.intp, len(keys))
+    return list(code_by_key), codes
+
+
+def _pack_choice(answer: Any, bits: Dict[Any, int]) -> Tuple[int, int, int]:
+    """(kind, mask, length) for one choice answer; assigns bits to unseen options."""
+    if answer is None:
+        return (_PACKED_NONE, 0, -1)
+    if isinstance(answer, _NUMBER_TYPES):
+        return (_PACKED_NUMBER, 0, -1)
+    if not isinstance(answer, list):
+        return (_PACKED_OTHER, 0, -1)
+    try:
+        # the scalar path sorts the answer; unorderable options must behave the same
+        sorted(answer)
+    except TypeError:
+        return (_PACKED_OTHER, 0, len(answer))
+    if len(set(answer)) != len(answer):
+        return (_PACKED_OTHER, 0, len(answer))
+    mask = 0
+    for option in answer:
+        bit = bits.get(option)
+        if bit is None:
+            if len(bits) >= _MAX_OPTION_BITS:
+                return (_PACKED_OTHER, 0, len(answer))
+            bit = bits[option] = 1 << len(bits)
+        mask |= bit
+    return (_PACKED_MASK, mask, len(answer))
+
+
+def _grade_choice_column(
+    question_plan: QuestionPlan, answers: List[Any], does_partial_marking_exist: bool
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Grade a choice column with bitmasks; None if the answer key cannot be packed.
+
+    Returns the outcomes and the length of each list answer (-1 for anything else).
+    """
+    correct_answer = question_plan.correct_answer
+    if (
+        question_plan.correct_sorted is None
+        or len(question_plan.correct_set) != len(correct_answer)
+        or len(correct_answer) > _MAX_OPTION_BITS
+    ):
+        return None
+
+    bits: Dict[Any, int] = {}
+    for option in question_plan.correct_sorted:
+        bits[option] = 1 << len(bits)
+    correct_mask = sum(bits.values())
+
+    try:
+        # lists become tuples so every answer is hashable, then each distinct answer is
+        # packed once (a column only holds a few dozen distinct answers)
+        distinct, codes = _encode(
+            [
+                tuple(answer) if answer.__class__ is list else answer
+                for answer in answers
+            ]
+        )
+    except TypeError:  # unhashable answers (dicts, nested lists): grade one by one
+        return None
+    packed = np.array(
+        [
+            _pack_choice(list(key) if key.__class__ is tuple else key, bits)
+            for key in distinct
+        ],
+        dtype=np.int64,
+    ).reshape(len(distinct), 3)
+    kinds, masks, lengths = packed[codes, 0], packed[codes, 1], packed[codes, 2]
+
+    is_mask = kinds == _PACKED_MASK
+    outcomes = np.full(len(answers), NOT_ANSWERED, dtype=np.int8)
+    outcomes[kinds == _PACKED_NUMBER] = WRONG
+    outcomes[is_mask] = WRONG
+    if question_plan.grade is _grade_multi_choice and does_partial_marking_exist:
+        is_subset = is_mask & (lengths > 0) & ((masks & ~np.int64(correct_mask)) == 0)
+        outcomes[is_subset] = PARTIALLY_CORRECT
+    outcomes[is_mask & (masks == correct_mask)] = CORRECT
+
+    for index in np.flatnonzero(kinds == _PACKED_OTHER):
+        outcomes[index] = question_plan.grade(
+            question_plan, answers[index], does_partial_marking_exist
+        )
+    return outcomes, lengths
+
+
+def _grade_numerical_column(
+    question_plan: QuestionPlan, answers: List[Any]
+) -> Optional[np.ndarray]:
+    """Grade a numerical column as a float vector; None if the key cannot be packed."""
+    correct_answer = question_plan.correct_answer
+    is_float_question = question_plan.grade is _grade_numerical_float
+    if isinstance(correct_answer, _NUMBER_TYPES):
+        if isinstance(correct_answer, int) and abs(correct_answer) > 2**53:
+            return None
+        key = float(correct_answer)
+    else:
+        # no numeric answer can match a missing or non-numeric key
+        key = _NO_KEY
+
+    try:
+        distinct, codes = _encode(answers)
+    except TypeError:  # unhashable answers (lists, dicts): grade one by one
+        return None
+    distinct_kinds = []
+    distinct_values = []
+    for answer in distinct:
+        if answer is None:
+            distinct_kinds.append(_PACKED_NONE)
+            distinct_values.append(0.0)
+        elif isinstance(answer, _NUMBER_TYPES):
+            # floats (and ints up to 2**53) compare exactly after conversion
+            if isinstance(answer, int) and abs(answer) > 2**53:
+                return None
+            distinct_kinds.append(_PACKED_NUMBER)
+            distinct_values.append(answer)
+        else:
+            distinct_kinds.append(_PACKED_OTHER)
+            distinct_values.append(0.0)
+    kinds = np.array(distinct_kinds, dtype=np.int8)[codes]
+    values = np.array(distinct_values, dtype=np.float64)[codes]
+
+    is_number = kinds == _PACKED_NUMBER
+    if is_float_question:
+        matches = np.abs(values - key) < NUMERICAL_FLOAT_TOLERANCE
+    else:
+        matches = values == key
+    outcomes = np.full(len(answers), NOT_ANSWERED, dtype=np.int8)
+    outcomes[kinds == _PACKED_OTHER] = WRONG
+    outcomes[is_number] = WRONG
+    outcomes[is_number & matches] = CORRECT
+    return outcomes
+
+
+def _grade_column(
+    question_plan: QuestionPlan, answers: List[Any], does_partial_marking_exist: bool
+) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Outcomes for one question across the chunk, plus list-answer lengths if known."""
+    if question_plan.grade in _CHOICE_GRADERS:
+        graded = _grade_choice_column(
+            question_plan, answers, does_partial_marking_exist
+        )
+        if graded is not None:
+            return graded
+    elif question_plan.grade in _NUMERICAL_GRADERS:
+        outcomes = _grade_numerical_column(question_plan, answers)
+        if outcomes is not None:
+            return outcomes, None
+    return (
+        _grade_column_scalar(question_plan, answers, does_partial_marking_exist),
+        None,
+    )
+
+
+def _partial_marks(
+    qset_plan: QuestionSetPlan,
+    is_partial: np.ndarray,
+    answers: List[Any],
+    lengths: Optional[np.ndarray],
+) -> np.ndarray:
+    marks_by_count = qset_plan.partial_marks_by_count
+    if lengths is not None:
+        # lengths are -1 for non-list answers, which never score partial marks
+        table = np.array(
+            [float(marks_by_count.get(count, 0)) for count in range(lengths.max() + 1)]
+            + [0.0]
+        )
+        return np.where(is_partial, table[lengths], 0.0)
+
+    marks = np.zeros(len(answers), dtype=np.float64)
+    for index in np.flatnonzero(is_partial):
+        answer = answers[index]
+        if isinstance(answer, list):
+            marks[index] = float(marks_by_count.get(len(answer), 0))
+    return marks
+
+
+def _score_question_set(
+    qset_plan: QuestionSetPlan,
+    is_form: bool,
+    answer_columns: List[Tuple[Any, ...]],
+    num_answers: np.ndarray,
+    position: int,
+) -> Dict[str, np.ndarray]:
+    num_sessions = len(num_answers)
+    num_answered = np.zeros(num_sessions, dtype=np.int64)
+    num_correct = np.zeros(num_sessions, dtype=np.int64)
+    num_wrong = np.zeros(num_sessions, dtype=np.int64)
+    num_partially_correct = np.zeros(num_sessions, dtype=np.int64)
+    num_ungraded = np.zeros(num_sessions, dtype=np.int64)
+    partial_marks = np.zeros(num_sessions, dtype=np.float64)
+
+    for offset in range(qset_plan.num_questions):
+        index = position + offset
+        answers = answer_columns[index]
+        if is_form:
+            num_answered += np.fromiter(
+                map(_is_form_answered, answers), dtype=np.int64, count=num_sessions
+            )
+            continue
+
+        question_plan = qset_plan.questions[offset]
+        if question_plan.kind != QUESTION_GRADED:
+            # answers beyond the end of the session (legacy short sessions) do not count
+            present = num_answers > index
+            if question_plan.kind == QUESTION_FORCE_CORRECT:
+                num_answered += present
+                num_correct += present
+            else:
+                num_ungraded += present
+            continue
+
+        outcomes, lengths = _grade_column(
+            question_plan, answers, qset_plan.does_partial_marking_exist
+        )
+        is_partial = outcomes == PARTIALLY_CORRECT
+        num_answered += outcomes != NOT_ANSWERED
+        num_correct += outcomes == CORRECT
+        num_wrong += outcomes == WRONG
+        num_partially_correct += is_partial
+        if qset_plan.partial_marks_by_count and is_partial.any():
+            # added question by question, in the same order as score_session
+            partial_marks += _partial_marks(qset_plan, is_partial, answers, lengths)
+
+    if is_form:
+        max_questions_allowed = np.full(num_sessions, qset_plan.num_questions)
+        num_skipped = max_questions_allowed - num_answered
+        marks_scored = np.zeros(num_sessions, dtype=np.float64)
+    else:
+        max_questions_allowed = np.maximum(
+            0, qset_plan.max_questions_allowed_to_attempt - num_ungraded
+        )
+        num_skipped = np.maximum(0, max_questions_allowed - num_answered)
+        marks_scored = (
+            qset_plan.correct_marks * num_correct
+            + qset_plan.wrong_marks * num_wrong
+            + qset_plan.skipped_marks * num_skipped
+            + partial_marks
+        )
+
+    return {
+        "max_questions_allowed": max_questions_allowed,
+        "marks_scored": marks_scored,
+        "num_answered": num_answered,
+        "num_skipped": num_skipped,
+        "num_correct": num_correct,
+        "num_wrong": num_wrong,
+        "num_partially_correct": num_partially_correct,
+    }
+
+
+def _rounded(
+    values: np.ndarray, digits: int, defined: Optional[np.ndarray] = None
+) -> List[Any]:
+    """Python's round() of each value (NumPy rounds differently), computed once per
+    distinct value. Entries outside `defined` become a plain 0, like the rates in
+    score_session when their denominator is 0."""
+    values = values.tolist()
+    rounded = {value: round(value, digits) for value in set(values)}
+    rounded_values = list(map(rounded.__getitem__, values))
+    if defined is not None:
+        for index in np.flatnonzero(~defined):
+            rounded_values[index] = 0
+    return rounded_values
+
+
+def _rates(counters: Dict[str, np.ndarray]) -> Tuple[List[Any], List[Any]]:
+    max_questions_allowed = counters["max_questions_allowed"]
+    num_answered = counters["num_answered"]
+    has_questions = max_questions_allowed > 0
+    has_answers = num_answered > 0
+    attempt_rate = np.divide(
+        num_answered,
+        max_questions_allowed,
+        out=np.zeros(len(num_answered)),
+        where=has_questions,
+    )
+    accuracy_rate = np.divide(
+        counters["num_correct"] + 0.5 * counters["num_partially_correct"],
+        num_answered,
+        out=np.zeros(len(num_answered)),
+        where=has_answers,
+    )
+    return (
+        _rounded(attempt_rate, 4, has_questions),
+        _rounded(accuracy_rate, 4, has_answers),
+    )
+
+
+def score_sessions(
+    sessions: List[Dict[str, Any]], plan: ScoringPlan
+) -> List[Dict[str, Any]]:
+    """Score a chunk of sessions of one quiz. Returns one metrics dict per session, in
+    order, equal to what `score_session(session, plan)` returns for each."""
+    num_sessions = len(sessions)
+    if num_sessions == 0:
+        return []
+    num_questions = sum(qset_plan.num_questions for qset_plan in plan.question_sets)
+
+    # one row per session, cut or padded with "no answer" to the quiz length, then
+    # transposed into one column per question
+    session_answers = [session.get("session_answers") or [] for session in sessions]
+    num_answers = np.fromiter(map(len, session_answers), np.int64, num_sessions)
+    no_answers = [None] * num_questions
+    not_marked = [False] * num_questions
+    answer_columns = list(
+        zip(
+            *[
+                (list(map(dict.get, answers, repeat("answer"))) + no_answers)[
+                    :num_questions
+                ]
+                for answers in session_answers
+            ]
+        )
+    )
+    marked_for_review = np.array(
+        [
+            (
+                list(map(bool, map(dict.get, answers, repeat("marked_for_review"))))
+                + not_marked
+            )[:num_questions]
+            for answers in session_answers
+        ],
+        dtype=np.int64,
+    ).reshape(num_sessions, num_questions)
+
+    qset_metric_columns = []
+    totals = {name: np.zeros(num_sessions, dtype=np.int64) for name in _TOTALS}
+    total_marks = np.zeros(num_sessions, dtype=np.float64)
+    position = 0
+    for qset_plan in plan.question_sets:
+        counters = _score_question_set(
+            qset_plan, plan.is_form, answer_columns, num_answers, position
+        )
+        counters["num_marked_for_review"] = marked_for_review[
+            :, position : position + qset_plan.num_questions
+        ].sum(axis=1)
+        position += qset_plan.num_questions
+        attempt_rates, accuracy_rates = _rates(counters)
+
+        for total_name, qset_name in _TOTALS.items():
+            totals[total_name] += counters[qset_name]
+        # summed set by set, in the same order as score_session
+        total_marks += counters["marks_scored"]
+
+        # plain Python numbers from here on: the metrics are stored in Mongo
+        qset_metric_columns.append(
+            [
+                {
+                    "name": qset_plan.name,
+                    "qset_id": qset_plan.qset_id,
+                    "marks_scored": marks_scored,
+                    "num_answered": num_answered,
+                    "num_skipped": num_skipped,
+                    "num_correct": num_correct,
+                    "num_wrong": num_wrong,
+                    "num_partially_correct": num_partially_correct,
+                    "num_marked_for_review": num_marked_for_review,
+                    "attempt_rate": attempt_rate,
+                    "accuracy_rate": accuracy_rate,
+                }
+                for (
+                    marks_scored,
+                    num_answered,
+                    num_skipped,
+                    num_correct,
+                    num_wrong,
+                    num_partially_correct,
+                    num_marked_for_review,
+                    attempt_rate,
+                    accuracy_rate,
+                ) in zip(
+                    _rounded(counters["marks_scored"], 2),
+                    counters["num_answered"].tolist(),
+                    counters["num_skipped"].tolist(),
+                    counters["num_correct"].tolist(),
+                    counters["num_wrong"].tolist(),
+                    counters["num_partially_correct"].tolist(),
+                    counters["num_marked_for_review"].tolist(),
+                    attempt_rates,
+                    accuracy_rates,
+                )
+            ]
+        )
+
+    return [
+        {
+            "qset_metrics": list(qset_metrics),
+            "total_answered": total_answered,
+            "total_skipped": total_skipped,
+            "total_correct": total_correct,
+            "total_wrong": total_wrong,
+            "total_partially_correct": total_partially_correct,
+            "total_marked_for_review": total_marked_for_review,
+            "total_marks": total_marks_rounded,
+        }
+        for (
+            qset_metrics,
+            total_answered,
+            total_skipped,
+            total_correct,
+            total_wrong,
+            total_partially_correct,
+            total_marked_for_review,
+            total_marks_rounded,
+        ) in zip(
+            zip(*qset_metric_columns) if qset_metric_columns else repeat(()),
+            totals["total_answered"].tolist(),
+            totals["total_skipped"].tolist(),
+            totals["total_correct"].tolist(),
+            totals["total_wrong"].tolist(),
+            totals["total_partially_correct"].tolist(),
+            totals["total_marked_for_review"].tolist(),
+            _rounded(total_marks, 2),
+        )
+    ]
+
+
+async def iter_scored_session_chunks(
+    quiz: Dict[str, Any],
+    session_filter: Optional[Dict[str, Any]] = None,
+    projection: Optional[Dict[str, Any]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> AsyncIterator[List[Tuple[Dict[str, Any], Dict[str, Any]]]]:
+    """Stream the sessions of `quiz` in `_id` order, `chunk_size` at a time, and yield
+    each chunk as (session, recomputed metrics) pairs. `session_filter` is merged into
+    the `quiz_id` filter; `projection` defaults to what scoring needs plus the stored
+    metrics, so callers can compare old and new.
+
+    Scoring a chunk is CPU-bound, so it runs in a worker thread: the event loop keeps
+    serving other requests while an admin regrade is running."""
+    plan = await asyncio.to_thread(compile_scoring_plan, quiz)
+    cursor = db.sessions.find(
+        {**(session_filter or {}), "quiz_id": quiz["_id"]},
+        projection or {"session_answers": 1, "metrics": 1},
+        sort=[("_id", 1)],
+        batch_size=chunk_size,
+    )
+    try:
+        while True:
+            sessions = await cursor.to_list(chunk_size)
+            if not sessions:
+                break
+            metrics = await asyncio.to_thread(score_sessions, sessions, plan)
+            yield list(zip(sessions, metrics))
+    finally:
+        await cursor.close()
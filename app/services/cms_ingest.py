@@ -49,10 +49,14 @@ silently mapped to single-choice — a wrong question type in a live quiz is wor
 loud failure at create time.
 """
 
-from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from json_encoding import content_digest
 from schemas import QuizSource
 from settings import Settings
 
@@ -81,10 +85,39 @@ class CmsIngestError(Exception):
     """Raised when the CMS assembled-test JSON cannot be fetched or is unusable."""
 
 
+# CMS responses worth retrying (with backoff) before giving up on a test
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_http_session: Optional[requests.Session] = None
+
+
+def _cms_session() -> requests.Session:
+    """The keep-alive session shared by all CMS calls of this process, with a
+    connection per concurrent fetch and retries of transient failures."""
+    global _http_session
+    if _http_session is None:
+        adapter = HTTPAdapter(
+            pool_maxsize=settings.cms_ingest_concurrency,
+            max_retries=Retry(
+                total=settings.cms_ingest_max_retries,
+                backoff_factor=0.5,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=["GET"],
+                raise_on_status=False,
+            ),
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _http_session = session
+    return _http_session
+
+
 def fetch_assembled_test(
     test_id: int, curriculum_id: int, grade_id: int
 ) -> Dict[str, Any]:
-    """Fetch the assembled-test JSON from the new CMS. Raises CmsIngestError on failure."""
+    """Fetch the assembled-test JSON from the new CMS. Raises CmsIngestError on failure.
+    Blocking: call it off the event loop (see fetch_assembled_tests)."""
     if not settings.cms_service_endpoint or not settings.cms_service_token:
         raise CmsIngestError(
             "CMS_SERVICE_ENDPOINT / CMS_SERVICE_TOKEN are not configured"
@@ -92,7 +125,7 @@ def fetch_assembled_test(
 
     url = settings.cms_service_endpoint.rstrip("/") + "/api/service/test"
     try:
-        response = requests.get(
+        response = _cms_session().get(
             url,
             params={
                 "id": test_id,
@@ -100,7 +133,7 @@ def fetch_assembled_test(
                 "grade_id": grade_id,
             },
             headers={"Authorization": f"Bearer {settings.cms_service_token}"},
-            timeout=30,
+            timeout=settings.cms_request_timeout_seconds,
         )
     except requests.RequestException as exc:
         raise CmsIngestError(f"error calling CMS: {exc}") from exc
@@ -109,7 +142,28 @@ def fetch_assembled_test(
         raise CmsIngestError(
             f"CMS returned {response.status_code} for test {test_id}: {response.text[:200]}"
         )
-    return response.json()
+    try:
+        return response.json()
+    except ValueError as exc:
+        raise CmsIngestError(f"CMS returned invalid JSON for test {test_id}") from exc
+
+
+async def fetch_assembled_tests(
+    tests: List[Tuple[int, int, int]]
+) -> List[Union[Dict[str, Any], CmsIngestError]]:
+    """Fetch several assembled tests ((test_id, curriculum_id, grade_id) each), at most
+    `cms_ingest_concurrency` at a time. Returns, in order, each test's JSON or the
+    CmsIngestError it failed with."""
+    semaphore = asyncio.Semaphore(settings.cms_ingest_concurrency)
+
+    async def fetch(test: Tuple[int, int, int]):
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(fetch_assembled_test, *test)
+            except CmsIngestError as exc:
+                return exc
+
+    return await asyncio.gather(*(fetch(test) for test in tests))
 
 
 def _pos_marks(level: Optional[Dict[str, Any]]) -> List[int]:
@@ -540,3 +594,48 @@ def map_cms_test_to_quiz(
         },
     }
     return quiz, warnings
+
+
+# hash of the mapped content of a CMS-sourced quiz / question, used to re-sync only what
+# changed in the CMS (see the `resync` mode of POST /quiz/from-cms)
+CONTENT_HASH_FIELD = "content_hash"
+_QUESTION_ID_FIELDS = ("_id", "question_set_id", CONTENT_HASH_FIELD)
+
+
+def add_content_hashes(quiz: Dict[str, Any]) -> str:
+    """Stamps each question of a mapped, jsonable-encoded quiz, and the quiz itself, with
+    the hash of its content, and returns the quiz's. Ids are left out of the hashes, so
+    mapping unchanged CMS content again gives the same hashes."""
+    question_sets = []
+    for question_set in quiz["question_sets"]:
+        question_hashes = []
+        for question in question_set["questions"]:
+            question[CONTENT_HASH_FIELD] = content_digest(
+                {
+                    field: value
+                    for field, value in question.items()
+                    if field not in _QUESTION_ID_FIELDS
+                }
+            )
+            question_hashes.append(question[CONTENT_HASH_FIELD])
+        question_sets.append(
+            {
+                **{
+                    field: value
+                    for field, value in question_set.items()
+                    if field not in ("_id", "questions")
+                },
+                "questions": question_hashes,
+            }
+        )
+    quiz[CONTENT_HASH_FIELD] = content_digest(
+        {
+            **{
+                field: value
+                for field, value in quiz.items()
+                if field not in ("_id", "question_sets", CONTENT_HASH_FIELD)
+            },
+            "question_sets": question_sets,
+        }
+    )
+    return quiz[CONTENT_HASH_FIELD]
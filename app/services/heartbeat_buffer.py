@@ -0,0 +1,388 @@
+"""
+Write-behind buffer for `dummy-event` heartbeats, shared by all API workers.
+
+While a quiz is open the frontend sends a dummy-event every few seconds. When the
+previous event is already a dummy, all that changes is the end of that dummy window
+(`events.<last>.updated_at`) and the derived `total_time_spent` / `time_remaining`,
+yet each heartbeat used to cost a full session read plus a write (~25% of DB load).
+
+After a heartbeat has gone through the regular path once, the session's timing state
+is kept in Redis (or any Redis-compatible store), under `heartbeat:session:<id>`.
+Further consecutive heartbeats, whichever worker or instance receives them, are
+applied to that state by `update_session` (same timing rules) in a WATCH/MULTI
+transaction and answered without touching Mongo. A changed session is added to the
+`heartbeat:dirty` set; every `heartbeat_flush_interval_seconds` each worker pops the
+sessions in that set and writes each with its own conditional update.
+
+Correctness rules:
+- Each buffered write is conditional: the dummy event must still be the last event,
+  its `updated_at` must not be later than the buffered one (so of two concurrent
+  flushes of a session the older one is skipped), and the quiz must not have ended.
+  If anything else touched the session in between, the write is skipped and the state
+  dropped, so the next heartbeat reloads the session through the regular path. The
+  heartbeat time buffered since the previous flush of that session (at most one flush
+  interval) is lost in that case.
+- Every other session read or write that depends on timing (start/resume/end events,
+  GET /sessions/{id}, creating a new session from the previous one) first takes the
+  session's state out of the store and writes it. A heartbeat racing with that finds
+  no state and goes through the regular path, so end-quiz always scores against
+  up-to-date timing.
+- States expire `ENTRY_TTL_INTERVALS` flush intervals after their last heartbeat, which
+  evicts sessions that stopped sending heartbeats (and caps what is lost if no worker
+  is left to flush).
+- If the store is unreachable, heartbeats go through the regular path.
+- On shutdown, each worker flushes the dirty sessions once more.
+
+The buffer is off unless `heartbeat_redis_url` is set; every API instance must point
+at the same store. It needs a background flush task, so it is also disabled when the
+interval is 0 and on AWS Lambda, where the process is frozen between invocations.
+"""
+
+import asyncio
+import json
+import math
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from database import db
+from logger_config import get_logger
+from schemas import EventType
+from settings import Settings
+
+settings = Settings()
+logger = get_logger()
+
+KEY_PREFIX = "heartbeat"
+DIRTY_KEY = f"{KEY_PREFIX}:dirty"
+
+# how many dirty sessions a flush pops (and writes concurrently) at a time
+FLUSH_BATCH_SIZE = 500
+ENTRY_TTL_INTERVALS = 4
+
+
+def _entry_key(session_id: str) -> str:
+    return f"{KEY_PREFIX}:session:{session_id}"
+
+
+def _user_quiz_key(user_id: Any, quiz_id: str) -> str:
+    return f"{KEY_PREFIX}:user_quiz:{user_id}:{quiz_id}"
+
+
+class BufferedHeartbeat:
+    """Timing state of one in-progress session whose last event is a dummy-event."""
+
+    __slots__ = (
+        "user_id",
+        "quiz_id",
+        "event_index",
+        "event_updated_at",
+        "total_time_spent",
+        "time_limit_max",
+        "time_remaining",
+        "version",
+        "flushed_version",
+    )
+
+    def __init__(
+        self,
+        user_id: Any,
+        quiz_id: str,
+        event_index: int,
+        event_updated_at: str,
+        total_time_spent: float,
+        time_limit_max: Optional[int],
+        time_remaining: Optional[int],
+        version: int = 0,
+        flushed_version: int = 0,
+    ):
+        self.user_id = user_id
+        self.quiz_id = quiz_id
+        self.event_index = event_index
+        # ISO string, as events store it
+        self.event_updated_at = event_updated_at
+        self.total_time_spent = total_time_spent
+        self.time_limit_max = time_limit_max
+        self.time_remaining = time_remaining
+        # bumped on every buffered heartbeat; equal to flushed_version when clean
+        self.version = version
+        self.flushed_version = flushed_version
+
+    @property
+    def dirty(self) -> bool:
+        return self.version != self.flushed_version
+
+    def dumps(self) -> str:
+        return json.dumps({field: getattr(self, field) for field in self.__slots__})
+
+    @classmethod
+    def loads(cls, raw: Optional[str]) -> Optional["BufferedHeartbeat"]:
+        return None if raw is None else cls(**json.loads(raw))
+
+
+class HeartbeatBuffer:
+    """Write-behind buffer of heartbeat timing in a shared Redis-compatible store; see
+    the module docstring."""
+
+    def __init__(
+        self,
+        redis: Optional[aioredis.Redis],
+        flush_interval_seconds: float,
+        enabled: bool = True,
+    ):
+        self.redis = redis
+        self.flush_interval_seconds = flush_interval_seconds
+        self.enabled = enabled and redis is not None and flush_interval_seconds > 0
+        self.entry_ttl_seconds = max(
+            math.ceil(ENTRY_TTL_INTERVALS * flush_interval_seconds), 1
+        )
+        self._task: Optional[asyncio.Task] = None
+
+        # of this worker
+        self.buffered = 0
+        self.flushed = 0
+        self.conflicts = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "buffered": self.buffered,
+            "flushed": self.flushed,
+            "conflicts": self.conflicts,
+        }
+
+    async def get(self, session_id: str) -> Optional[BufferedHeartbeat]:
+        if not self.enabled:
+            return None
+        try:
+            return BufferedHeartbeat.loads(await self.redis.get(_entry_key(session_id)))
+        except RedisError as exc:
+            logger.error(f"Could not read buffered heartbeat of {session_id}: {exc}")
+            return None
+
+    async def track(
+        self,
+        session_id: str,
+        user_id: Any,
+        quiz_id: str,
+        event_index: int,
+        event_updated_at: str,
+        total_time_spent: float,
+        time_limit_max: Optional[int],
+        time_remaining: Optional[int],
+    ) -> None:
+        """Start buffering heartbeats of a session whose state was just written."""
+        if not self.enabled:
+            return
+        entry = BufferedHeartbeat(
+            user_id,
+            quiz_id,
+            event_index,
+            event_updated_at,
+            total_time_spent,
+            time_limit_max,
+            time_remaining,
+        )
+        user_quiz_key = _user_quiz_key(user_id, quiz_id)
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.set(_entry_key(session_id), entry.dumps(), ex=self.entry_ttl_seconds)
+            pipe.sadd(user_quiz_key, session_id)
+            pipe.expire(user_quiz_key, self.entry_ttl_seconds)
+            await pipe.execute()
+        except RedisError as exc:
+            logger.error(f"Could not buffer heartbeats of {session_id}: {exc}")
+
+    async def extend(
+        self, session_id: str, apply: Callable[[BufferedHeartbeat], None]
+    ) -> Optional[BufferedHeartbeat]:
+        """Applies a heartbeat to the buffered state with `apply` (which updates the
+        timing fields), atomically; None if the session is not buffered."""
+        if not self.enabled:
+            return None
+        key = _entry_key(session_id)
+
+        async def transaction(pipe) -> Optional[BufferedHeartbeat]:
+            entry = BufferedHeartbeat.loads(await pipe.get(key))
+            if entry is None:
+                return None
+            apply(entry)
+            entry.version += 1
+            pipe.multi()
+            pipe.set(key, entry.dumps(), ex=self.entry_ttl_seconds)
+            pipe.expire(
+                _user_quiz_key(entry.user_id, entry.quiz_id), self.entry_ttl_seconds
+            )
+            pipe.sadd(DIRTY_KEY, session_id)
+            return entry
+
+        try:
+            # retried while another heartbeat or flush changes the state concurrently
+            entry = await self.redis.transaction(
+                transaction, key, value_from_callable=True
+            )
+        except RedisError as exc:
+            logger.error(f"Could not buffer heartbeat of {session_id}: {exc}")
+            return None
+        if entry is not None:
+            self.buffered += 1
+        return entry
+
+    def _update(
+        self, session_id: str, entry: BufferedHeartbeat
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """(filter, update) of the conditional write of a buffered session."""
+        event_path = f"events.{entry.event_index}"
+        update = {
+            f"{event_path}.updated_at": entry.event_updated_at,
+            "total_time_spent": entry.total_time_spent,
+            # the write time, so updated_at never moves back past other writes
+            "updated_at": datetime.utcnow(),
+        }
+        if entry.time_limit_max is not None:
+            update["time_remaining"] = entry.time_remaining
+        return (
+            {
+                "_id": session_id,
+                "has_quiz_ended": {"$ne": True},
+                f"{event_path}.event_type": EventType.dummy_event.value,
+                f"{event_path}.updated_at": {"$lte": entry.event_updated_at},
+                f"events.{entry.event_index + 1}": {"$exists": False},
+            },
+            {"$set": update},
+        )
+
+    async def _write(self, session_id: str, entry: BufferedHeartbeat) -> bool:
+        """Writes one buffered session to Mongo; False if it was changed elsewhere."""
+        result = await db.sessions.update_one(*self._update(session_id, entry))
+        if result.matched_count == 0:
+            self.conflicts += 1
+            return False
+        self.flushed += 1
+        return True
+
+    async def _after_write(
+        self, session_id: str, written: BufferedHeartbeat, matched: bool
+    ) -> None:
+        """Marks the state flushed up to `written`, or drops it (unless it has changed
+        since) when the write was skipped, to reload it through the regular path."""
+        key = _entry_key(session_id)
+
+        async def transaction(pipe) -> None:
+            entry = BufferedHeartbeat.loads(await pipe.get(key))
+            if entry is None:
+                return
+            pipe.multi()
+            if not matched:
+                if entry.version == written.version:
+                    pipe.delete(key)
+                return
+            if written.version > entry.flushed_version:
+                entry.flushed_version = written.version
+                pipe.set(key, entry.dumps(), keepttl=True)
+
+        await self.redis.transaction(transaction, key)
+
+    async def _flush_one(self, session_id: str) -> bool:
+        try:
+            entry = BufferedHeartbeat.loads(
+                await self.redis.get(_entry_key(session_id))
+            )
+            if entry is None or not entry.dirty:
+                return False
+            matched = await self._write(session_id, entry)
+            await self._after_write(session_id, entry, matched)
+            return matched
+        except Exception:
+            # keep it dirty; it is retried on the next flush
+            await self.redis.sadd(DIRTY_KEY, session_id)
+            raise
+
+    async def flush(self) -> int:
+        """Write the dirty sessions (of all workers); returns how many were written."""
+        if not self.enabled:
+            return 0
+        count = 0
+        while True:
+            session_ids: List[str] = await self.redis.spop(DIRTY_KEY, FLUSH_BATCH_SIZE)
+            if not session_ids:
+                return count
+            # one update per session: only the sessions whose write was skipped are
+            # dropped
+            results = await asyncio.gather(
+                *(self._flush_one(session_id) for session_id in session_ids),
+                return_exceptions=True,
+            )
+            errors = [result for result in results if isinstance(result, Exception)]
+            written = sum(result is True for result in results)
+            skipped = len(results) - written - len(errors)
+            count += written
+            if skipped:
+                logger.warning(
+                    f"Heartbeat flush skipped {skipped} of {len(results)} sessions "
+                    "changed elsewhere"
+                )
+            if errors:
+                raise errors[0]
+
+    async def flush_session(self, session_id: str) -> None:
+        """Write (and stop buffering) one session, before something else reads or
+        changes its timing."""
+        if not self.enabled:
+            return
+        key = _entry_key(session_id)
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.get(key)
+            pipe.delete(key)
+            pipe.srem(DIRTY_KEY, session_id)
+            raw, _, _ = await pipe.execute()
+        except RedisError as exc:
+            logger.error(f"Could not flush buffered heartbeat of {session_id}: {exc}")
+            return
+        entry = BufferedHeartbeat.loads(raw)
+        if entry is not None and entry.dirty:
+            await self._write(session_id, entry)
+
+    async def flush_user_quiz(self, user_id: Any, quiz_id: str) -> None:
+        """Flush the buffered sessions of a user+quiz pair."""
+        if not self.enabled:
+            return
+        try:
+            session_ids = await self.redis.smembers(_user_quiz_key(user_id, quiz_id))
+        except RedisError as exc:
+            logger.error(f"Could not read buffered sessions of {user_id}: {exc}")
+            return
+        for session_id in session_ids:
+            await self.flush_session(session_id)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+            except Exception as exc:
+                # the sessions stay dirty; they are retried on the next flush
+                logger.error(f"Heartbeat flush failed: {exc}")
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.enabled:
+            await self.flush()
+
+
+heartbeat_buffer = HeartbeatBuffer(
+    redis=aioredis.Redis.from_url(settings.heartbeat_redis_url, decode_responses=True)
+    if settings.heartbeat_redis_url
+    else None,
+    flush_interval_seconds=settings.heartbeat_flush_interval_seconds,
+    enabled="AWS_LAMBDA_FUNCTION_NAME" not in os.environ,
+)
@@ -0,0 +1,139 @@
+"""
+ETags and conditional GETs for quiz, form and question content.
+
+Content endpoints answer with a strong ETag (a hash of the body) and
+`Cache-Control: private, no-cache`, so browsers keep the body but check it on every
+reload. A request whose `If-None-Match` lists the current ETag gets an empty 304.
+
+The ETag is known without reading Mongo whenever the body was rendered recently: quiz
+and form payloads keep theirs next to the cached payload (services/quiz_payload.py),
+and question endpoints remember theirs in `etag_cache`, keyed by the endpoint and its
+query flags. A worker that changes questions (CMS re-sync) clears its own
+`etag_cache`; other workers, and changes made outside the API (scripts), only pick a
+changed question up within `etag_cache_ttl_seconds`.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple, Union
+
+from fastapi import Request, status
+from fastapi.responses import Response
+
+from compression import (
+    COMPRESS_MIN_THRESHOLD,
+    ENCODINGS,
+    CompressedBody,
+    choose_encoding,
+)
+from settings import Settings
+
+settings = Settings()
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def etag_for(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def _representation_etag(etag: str, encoding: Optional[str]) -> str:
+    """Compressed variants of a body get their own ETags, as they are different bytes."""
+    return etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's `If-None-Match` lists `etag`, or the ETag of another
+    encoding of the same body (weak comparison)."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    base_etag = etag.split("-", 1)[0].rstrip('"') + '"'
+    same_body = {base_etag} | {
+        _representation_etag(base_etag, encoding) for encoding in ENCODINGS
+    }
+    return any(
+        candidate.strip().removeprefix("W/") in same_body
+        for candidate in if_none_match.split(",")
+    )
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL},
+    )
+
+
+def conditional_response(
+    request: Request, content: Union[bytes, CompressedBody], etag: str
+) -> Response:
+    """304 if the client has this body already, else the JSON body with its ETag. A
+    `CompressedBody` is sent in the encoding the client prefers, if large enough."""
+    headers = {"Cache-Control": CACHE_CONTROL}
+    encoding = None
+    if isinstance(content, CompressedBody):
+        body = content.body
+        if len(body) >= COMPRESS_MIN_THRESHOLD:
+            headers["Vary"] = "Accept-Encoding"
+            encoding = choose_encoding(request.headers.get("accept-encoding"))
+    else:
+        body = content
+    etag = _representation_etag(etag, encoding)
+
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    if encoding is not None:
+        body = content.encoded(encoding)
+        headers["Content-Encoding"] = encoding
+    headers["ETag"] = etag
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+class ETagCache:
+    """Bounded LRU of the ETags of recently served bodies, each fresh for
+    `ttl_seconds`."""
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[str, float]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        etag, stored_at = entry
+        if self._clock() - stored_at >= self.ttl_seconds:
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return etag
+
+    def put(self, key: Hashable, body: bytes) -> str:
+        """Stores and returns the ETag of `body`."""
+        etag = etag_for(body)
+        if self.max_size > 0:
+            self._entries[key] = (etag, self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return etag
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+etag_cache = ETagCache(
+    max_size=settings.etag_cache_max_size,
+    ttl_seconds=settings.etag_cache_ttl_seconds,
+)
@@ -0,0 +1,96 @@
+"""
+Option counts for rendering quizzes in OMR mode.
+
+Quiz documents only store the first `subset_size` questions of a set in full; the rest
+are stored without their options. In OMR mode those questions are rendered with blank
+placeholder options, so the renderer only needs to know how many options each one has.
+
+The counts are computed once, when the quiz is created, and stored on each question set
+as `options_count_per_question` (one count per question, in `_id` order, the order the
+questions are stored in). For quizzes created before that, the counts are computed
+from the questions collection when the quiz is rendered in OMR mode, in memory only and
+memoized on the quiz's cache entry; the read path never writes them back.
+`scripts/backfill_omr_options_counts.py` stores them for all quizzes at once.
+"""
+
+from typing import Any, Dict, List
+
+from database import db
+from logger_config import get_logger
+from services.question_store import BODY_ID_FIELD, resolve_questions
+from services.quiz_cache import quiz_cache
+from settings import Settings
+
+settings = Settings()
+logger = get_logger()
+
+OPTIONS_COUNT_FIELD = "options_count_per_question"
+
+
+def count_options(questions: List[Dict[str, Any]]) -> List[int]:
+    """Number of options of each question, in `_id` order (zero for
+    subjective/numerical questions)."""
+    return [
+        len(question.get("options") or [])
+        for question in sorted(questions, key=lambda question: str(question["_id"]))
+    ]
+
+
+def add_options_counts(quiz: Dict[str, Any]) -> None:
+    """Stores the option counts on each question set of `quiz` (in place); must be
+    called while the question sets still hold every question in full."""
+    for question_set in quiz["question_sets"]:
+        question_set[OPTIONS_COUNT_FIELD] = count_options(question_set["questions"])
+
+
+async def load_options_counts(question_set_id: str) -> List[int]:
+    """Option counts of a question set, from the questions collection."""
+    questions = await db.questions.find(
+        {"question_set_id": question_set_id},
+        projection={"options": 1, BODY_ID_FIELD: 1},
+    ).to_list()
+    # questions stored as references to deduplicated bodies have their options there
+    return count_options(await resolve_questions(questions))
+
+
+async def _missing_options_counts(quiz: Dict[str, Any]) -> Dict[str, List[int]]:
+    """Option counts of the question sets of `quiz` stored without them, by question
+    set id."""
+    logger.info(f"Computing OMR option counts for quiz: {quiz['_id']}")
+    return {
+        question_set["_id"]: await load_options_counts(question_set["_id"])
+        for question_set in quiz["question_sets"]
+        if question_set.get(OPTIONS_COUNT_FIELD) is None
+    }
+
+
+async def ensure_options_counts(quiz: Dict[str, Any]) -> None:
+    """Fills in (in memory) the option counts of question sets stored without them."""
+    if all(
+        question_set.get(OPTIONS_COUNT_FIELD) is not None
+        for question_set in quiz["question_sets"]
+    ):
+        return
+
+    # read-only: shared between requests
+    counts = await quiz_cache.get_derived_async(
+        quiz, OPTIONS_COUNT_FIELD, _missing_options_counts
+    )
+    for question_set in quiz["question_sets"]:
+        if question_set.get(OPTIONS_COUNT_FIELD) is None:
+            question_set[OPTIONS_COUNT_FIELD] = list(counts[question_set["_id"]])
+
+
+async def add_omr_option_placeholders(quiz: Dict[str, Any]) -> None:
+    """Gives the questions stored without details as many blank options as they have
+    (in place)."""
+    await ensure_options_counts(quiz)
+    for question_set in quiz["question_sets"]:
+        options_count_per_question = question_set[OPTIONS_COUNT_FIELD]
+        for question_index, question in enumerate(
+            question_set["questions"][settings.subset_size :],
+            start=settings.subset_size,
+        ):
+            question["options"] = [
+                {"text": "", "image": None}
+            ] * options_count_per_question[question_index]
@@ -0,0 +1,62 @@
+"""
+All questions of a quiz, in full, in one query.
+
+Quiz documents only store the first `subset_size` questions of each set in full.
+Single page mode and form submission need every question, which used to take one
+`questions.find` per question set. `load_questions_by_set` fetches them with a single
+`$in` query instead (served in order by the `question_set_id, _id` index) and groups the
+streamed results per set.
+
+The grouped questions are memoized, pickled, on the quiz's `quiz_cache` entry, so they
+are only read again after the quiz is invalidated or re-read. Every caller unpickles its
+own copy, since handlers mutate the questions (hiding answers, ...).
+"""
+
+import pickle
+from typing import Any, Dict, List
+
+from database import db
+from services.question_store import resolve_questions
+from services.quiz_cache import quiz_cache
+
+QuestionsBySet = Dict[str, List[Dict[str, Any]]]
+
+
+async def load_questions_by_set(question_set_ids: List[str]) -> QuestionsBySet:
+    """Questions of each set, in `_id` order (empty for sets without questions)."""
+    questions_by_set: QuestionsBySet = {
+        question_set_id: [] for question_set_id in question_set_ids
+    }
+    cursor = db.questions.find(
+        {"question_set_id": {"$in": question_set_ids}},
+        sort=[("question_set_id", 1), ("_id", 1)],
+    )
+    questions = []
+    async for question in cursor:
+        questions_by_set[question["question_set_id"]].append(question)
+        questions.append(question)
+    await resolve_questions(questions)
+    return questions_by_set
+
+
+async def _load_snapshot(quiz: Dict[str, Any]) -> bytes:
+    questions_by_set = await load_questions_by_set(
+        [question_set["_id"] for question_set in quiz["question_sets"]]
+    )
+    return pickle.dumps(questions_by_set, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+async def get_questions_by_set(quiz: Dict[str, Any]) -> QuestionsBySet:
+    """A private copy of all the questions of `quiz`, per question set id."""
+    snapshot = await quiz_cache.get_derived_async(
+        quiz, "questions_by_set", _load_snapshot
+    )
+    return pickle.loads(snapshot)
+
+
+async def hydrate_question_sets(quiz: Dict[str, Any]) -> None:
+    """Replaces the questions of every set of `quiz` with all its questions, in full
+    (in place)."""
+    questions_by_set = await get_questions_by_set(quiz)
+    for question_set in quiz["question_sets"]:
+        question_set["questions"] = questions_by_set[question_set["_id"]]
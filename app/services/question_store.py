@@ -0,0 +1,161 @@
+"""
+Content-addressed storage of question bodies (optional, `question_dedup`).
+
+The same question (a CMS problem, a reused authored question) appears in many quizzes,
+and each quiz used to store its own full copy in the questions collection. With
+`question_dedup` on, a question's body — everything but its `_id`, `question_set_id`
+and `content_hash` — is stored once in `question_bodies`, under the hash of its content,
+and the questions collection only keeps a reference to it (`body_id`). Question ids,
+set membership and order are unchanged, so sessions and the queries on
+`question_set_id` work as before.
+
+Read paths resolve references with `resolve_questions`, which fills in the bodies from
+an in-process LRU (`question_body_cache_max_size`) and reads the missing ones with one
+`$in` query. Bodies are immutable (a changed question gets a new hash), so cached bodies
+never go stale. Questions stored in full (before dedup was turned on, or with it off)
+are returned as they are.
+
+The first `subset_size` questions embedded in quiz documents stay in full, as GET /quiz
+renders them without reading the questions collection.
+`scripts/dedup_questions.py` converts questions stored in full into references.
+"""
+
+import pickle
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from pymongo import UpdateOne
+
+from database import db
+from json_encoding import content_digest
+from logger_config import get_logger
+from services.cms_ingest import CONTENT_HASH_FIELD
+from settings import Settings
+
+settings = Settings()
+logger = get_logger()
+
+BODY_ID_FIELD = "body_id"
+# what a reference keeps of a question; the rest is its body
+REFERENCE_FIELDS = ("_id", "question_set_id", CONTENT_HASH_FIELD)
+
+
+def split_question(question: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(reference, body) of a question stored in full."""
+    body = {
+        field: value
+        for field, value in question.items()
+        if field not in REFERENCE_FIELDS
+    }
+    reference = {
+        field: question[field] for field in REFERENCE_FIELDS if field in question
+    }
+    reference[BODY_ID_FIELD] = content_digest(body)
+    return reference, body
+
+
+def body_writes(bodies: Dict[str, Dict[str, Any]]) -> List[UpdateOne]:
+    """Upserts of `bodies` (by body id) that leave bodies already stored untouched."""
+    return [
+        UpdateOne({"_id": body_id}, {"$setOnInsert": body}, upsert=True)
+        for body_id, body in bodies.items()
+    ]
+
+
+async def store_question_bodies(
+    questions: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Stores the bodies of `questions` (if dedup is on) and returns the documents to
+    write to the questions collection for them: references, or the questions
+    themselves if dedup is off."""
+    if not settings.question_dedup or not questions:
+        return questions
+
+    references = []
+    bodies = {}
+    for question in questions:
+        reference, body = split_question(question)
+        references.append(reference)
+        bodies[reference[BODY_ID_FIELD]] = body
+    await db.question_bodies.bulk_write(body_writes(bodies), ordered=False)
+    return references
+
+
+class QuestionBodyCache:
+    """Bounded LRU of pickled question bodies, by body id (no TTL: bodies never
+    change)."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def get(self, body_id: str) -> Any:
+        snapshot = self._entries.get(body_id)
+        if snapshot is None:
+            return None
+        self._entries.move_to_end(body_id)
+        # a private copy, since handlers mutate the questions they return
+        return pickle.loads(snapshot)
+
+    def put(self, body_id: str, body: Dict[str, Any]) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[body_id] = pickle.dumps(body, protocol=pickle.HIGHEST_PROTOCOL)
+        self._entries.move_to_end(body_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+question_body_cache = QuestionBodyCache(settings.question_body_cache_max_size)
+
+
+async def resolve_questions(questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fills in the body of each question stored as a reference (in place) and returns
+    `questions`."""
+    # by identity: the same dict may be listed more than once (e.g. a batch request
+    # whose listed ids and ranges overlap), and is filled in once
+    references = list(
+        {
+            id(question): question
+            for question in questions
+            if BODY_ID_FIELD in question
+        }.values()
+    )
+    if not references:
+        return questions
+
+    bodies = {}
+    missing = set()
+    for reference in references:
+        body_id = reference[BODY_ID_FIELD]
+        if body_id in bodies or body_id in missing:
+            continue
+        body = question_body_cache.get(body_id)
+        if body is None:
+            missing.add(body_id)
+        else:
+            bodies[body_id] = body
+
+    if missing:
+        async for body in db.question_bodies.find({"_id": {"$in": list(missing)}}):
+            body_id = body.pop("_id")
+            question_body_cache.put(body_id, body)
+            bodies[body_id] = body
+
+    used = set()
+    for reference in references:
+        body_id = reference[BODY_ID_FIELD]
+        body = bodies.get(body_id)
+        if body is None:
+            logger.error(f"Body {body_id} of question {reference['_id']} not found")
+            continue
+        if body_id in used:
+            # questions sharing a body each get their own copy
+            body = pickle.loads(pickle.dumps(body, protocol=pickle.HIGHEST_PROTOCOL))
+        used.add(body_id)
+        del reference[BODY_ID_FIELD]
+        reference.update(body)
+    return questions
@@ -0,0 +1,238 @@
+"""
+In-process cache of quiz documents.
+
+Quiz documents are effectively immutable while an exam is live, yet nearly every
+student-facing request (GET /quiz, GET /form, session create / end / reveal) used to
+read the full quiz from Mongo. This cache keeps recently used quizzes in memory, per
+worker process:
+
+- Bounded LRU keyed by quiz id (`quiz_cache_max_size`), each entry fresh for
+  `quiz_cache_ttl_seconds`.
+- Entries are stored as pickled snapshots and every read unpickles a private copy,
+  because handlers mutate the quiz dict in place (sanitizing answers, hydrating
+  questions, ...). Unpickling is a single C-level pass, much cheaper than deepcopy.
+- Concurrent misses for the same quiz share one Mongo read (single flight), so a burst
+  of students opening the same test costs one read per worker.
+- Stale-while-revalidate: once an entry expires, the next reader starts a refresh and
+  waits at most `quiz_cache_revalidate_timeout_seconds` for it. If Mongo is slower than
+  that (or errors), the stale copy is served — for up to `quiz_cache_max_stale_seconds`
+  past expiry — while the refresh finishes in the background.
+
+Code that writes a quiz document must call `quiz_cache.invalidate(quiz_id)`. That only
+clears this process's copy; other workers (and writes made outside the API, e.g. the
+scripts in app/scripts) are bounded by the TTL.
+"""
+
+import asyncio
+import pickle
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from database import db
+from logger_config import get_logger
+from services.quiz_schema import upgrade_quiz
+from settings import Settings
+
+settings = Settings()
+logger = get_logger()
+
+
+async def _load_quiz_from_db(quiz_id: str) -> Optional[Dict[str, Any]]:
+    quiz = await db.quizzes.find_one({"_id": quiz_id})
+    if quiz is not None:
+        # legacy documents are upgraded in memory only, see services/quiz_schema.py
+        upgrade_quiz(quiz)
+    return quiz
+
+
+class _Entry:
+    __slots__ = ("snapshot", "fetched_at", "derived")
+
+    def __init__(self, snapshot: bytes, fetched_at: float):
+        self.snapshot = snapshot
+        self.fetched_at = fetched_at
+        # values computed from this snapshot (e.g. the scoring plan), see get_derived
+        self.derived: Dict[str, Any] = {}
+
+
+class QuizCache:
+    """Bounded LRU + TTL cache of quiz documents; see the module docstring."""
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl_seconds: float,
+        max_stale_seconds: float,
+        revalidate_timeout_seconds: float,
+        loader: Callable[[str], Awaitable[Optional[Dict[str, Any]]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.revalidate_timeout_seconds = revalidate_timeout_seconds
+        self._loader = loader or _load_quiz_from_db
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # bumped on every invalidation so an in-flight read that started before the
+        # invalidation cannot store the outdated document it fetched
+        self._version = 0
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+        }
+
+    async def get(self, quiz_id: str) -> Optional[Dict[str, Any]]:
+        """Return a private copy of the quiz document, or None if it does not exist."""
+        if not self.enabled:
+            self.misses += 1
+            return await self._loader(quiz_id)
+
+        entry = self._entries.get(quiz_id)
+        if entry is not None:
+            age = self._clock() - entry.fetched_at
+            if age < self.ttl_seconds:
+                self.hits += 1
+                self._entries.move_to_end(quiz_id)
+                return pickle.loads(entry.snapshot)
+            if age < self.ttl_seconds + self.max_stale_seconds:
+                return await self._revalidate(quiz_id, entry)
+
+        self.misses += 1
+        snapshot = await self._fetch(quiz_id)
+        return None if snapshot is None else pickle.loads(snapshot)
+
+    def get_derived(
+        self, quiz: Dict[str, Any], key: str, build: Callable[[Dict[str, Any]], Any]
+    ) -> Any:
+        """Return `build(quiz)`, memoized on the cache entry for this quiz so it is
+        computed once per cached version and dropped on invalidation. The value is
+        built from the entry's own snapshot, so it always matches the cached document.
+        Values must be treated as read-only since they are shared between requests.
+        """
+        entry = self._entries.get(quiz.get("_id"))
+        if entry is None:
+            return build(quiz)
+        if key not in entry.derived:
+            entry.derived[key] = build(pickle.loads(entry.snapshot))
+        return entry.derived[key]
+
+    async def get_derived_async(
+        self,
+        quiz: Dict[str, Any],
+        key: str,
+        build: Callable[[Dict[str, Any]], Awaitable[Any]],
+    ) -> Any:
+        """Like `get_derived`, for values that need I/O to build. The value is only
+        memoized if the entry was not replaced or invalidated while it was built."""
+        entry = self._entries.get(quiz.get("_id"))
+        if entry is None:
+            return await build(quiz)
+        if key not in entry.derived:
+            value = await build(pickle.loads(entry.snapshot))
+            if self._entries.get(quiz["_id"]) is not entry:
+                return value
+            entry.derived[key] = value
+        return entry.derived[key]
+
+    def get_fresh_derived(self, quiz_id: str, key: str) -> Optional[Any]:
+        """The value memoized under `key` for a quiz whose entry is still fresh, without
+        copying the quiz document; None if there is none (then go through `get`)."""
+        entry = self._entries.get(quiz_id)
+        if entry is None or key not in entry.derived:
+            return None
+        if self._clock() - entry.fetched_at >= self.ttl_seconds:
+            return None
+        self.hits += 1
+        self._entries.move_to_end(quiz_id)
+        return entry.derived[key]
+
+    def invalidate(self, quiz_id: str) -> None:
+        self._version += 1
+        self._entries.pop(quiz_id, None)
+        self._inflight.pop(quiz_id, None)
+
+    def clear(self) -> None:
+        self._version += 1
+        self._entries.clear()
+        self._inflight.clear()
+
+    async def _revalidate(
+        self, quiz_id: str, entry: _Entry
+    ) -> Optional[Dict[str, Any]]:
+        refresh = self._fetch_task(quiz_id)
+        try:
+            snapshot = await asyncio.wait_for(
+                asyncio.shield(refresh), self.revalidate_timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Quiz {quiz_id} refresh is slow, serving stale copy")
+            snapshot = entry.snapshot
+        except Exception as exc:
+            logger.error(f"Quiz {quiz_id} refresh failed, serving stale copy: {exc}")
+            snapshot = entry.snapshot
+        else:
+            # refreshed in time, so this read was served by Mongo
+            self.misses += 1
+            # (None means the quiz was deleted; do not resurrect it from the stale copy)
+            return None if snapshot is None else pickle.loads(snapshot)
+
+        self.stale_hits += 1
+        return pickle.loads(snapshot)
+
+    async def _fetch(self, quiz_id: str) -> Optional[bytes]:
+        return await self._fetch_task(quiz_id)
+
+    def _fetch_task(self, quiz_id: str) -> "asyncio.Task":
+        """Single flight: join the running read for this quiz or start a new one."""
+        task = self._inflight.get(quiz_id)
+        if (
+            task is None
+            or task.done()
+            or task.get_loop() is not asyncio.get_running_loop()
+        ):
+            task = asyncio.ensure_future(self._load_and_store(quiz_id))
+            self._inflight[quiz_id] = task
+        return task
+
+    async def _load_and_store(self, quiz_id: str) -> Optional[bytes]:
+        version = self._version
+        try:
+            quiz = await self._loader(quiz_id)
+        finally:
+            if self._inflight.get(quiz_id) is asyncio.current_task():
+                self._inflight.pop(quiz_id)
+        if quiz is None:
+            if version == self._version:
+                self._entries.pop(quiz_id, None)
+            return None
+
+        snapshot = pickle.dumps(quiz, protocol=pickle.HIGHEST_PROTOCOL)
+        if version == self._version:
+            self._entries[quiz_id] = _Entry(snapshot, self._clock())
+            self._entries.move_to_end(quiz_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return snapshot
+
+
+quiz_cache = QuizCache(
+    max_size=settings.quiz_cache_max_size,
+    ttl_seconds=settings.quiz_cache_ttl_seconds,
+    max_stale_seconds=settings.quiz_cache_max_stale_seconds,
+    revalidate_timeout_seconds=settings.quiz_cache_revalidate_timeout_seconds,
+)
@@ -0,0 +1,67 @@
+"""
+Rendered GET /quiz and GET /form responses, cached as JSON bytes.
+
+Rendering a quiz (hydrating questions, adding OMR placeholders, hiding answers) and then
+validating and encoding it against `GetQuizResponse` costs far more than sending it, and
+every student opening the same test gets the same bytes. So the encoded body of each
+render variant is memoized, with its ETag and compressed variants, on the quiz's
+`quiz_cache` entry: it is dropped whenever the quiz is invalidated or re-read, and a
+cache hit (or a 304 for a client that has the body already) is served without copying
+the quiz document or compressing anything.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from compression import CompressedBody
+from json_encoding import dump_model
+from models import GetQuizResponse
+from services.http_caching import conditional_response, etag_for
+from services.quiz_cache import quiz_cache
+
+
+class Payload(CompressedBody):
+    """An encoded response body, its ETag and its compressed variants."""
+
+    __slots__ = ("etag",)
+
+    def __init__(self, body: bytes):
+        super().__init__(body)
+        self.etag = etag_for(body)
+
+
+def payload_key(endpoint: str, **variant: bool) -> str:
+    """Cache key of one render variant, e.g. `quiz:omr_mode=1:single_page_mode=0`."""
+    return ":".join(
+        [endpoint] + [f"{name}={int(value)}" for name, value in variant.items()]
+    )
+
+
+def encode_payload(quiz: Dict[str, Any]) -> bytes:
+    """The body FastAPI would send for `quiz` with `response_model=GetQuizResponse`."""
+    return dump_model(GetQuizResponse, quiz)
+
+
+def payload_response(request: Request, payload: Payload) -> Response:
+    return conditional_response(request, payload, payload.etag)
+
+
+def get_cached_payload(quiz_id: str, key: str) -> Optional[Payload]:
+    """The cached payload of this variant, if the quiz is cached and fresh; else None."""
+    return quiz_cache.get_fresh_derived(quiz_id, key)
+
+
+async def render_payload(
+    quiz: Dict[str, Any],
+    key: str,
+    render: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+) -> Payload:
+    """Encoded `render(quiz)`, memoized for this version of the quiz. `render` may
+    mutate the quiz it is given."""
+
+    async def build(quiz: Dict[str, Any]) -> Payload:
+        return Payload(encode_payload(await render(quiz)))
+
+    return await quiz_cache.get_derived_async(quiz, key, build)
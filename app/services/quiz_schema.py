@@ -0,0 +1,64 @@
+"""
+Versioning of the quiz document schema.
+
+Quizzes store the version of the schema they were written with in `schema_version`.
+Quizzes written before versioning have no such field (version 0): their question sets
+may lack `max_questions_allowed_to_attempt`, `title` and `marking_scheme`.
+
+Readers only compare the version (`upgrade_quiz`); a legacy quiz is upgraded in memory
+and never written back on the read path. `scripts/migrate_quiz_schema.py` upgrades the
+stored documents once, in batches.
+
+To change the schema: bump `QUIZ_SCHEMA_VERSION`, extend `schema_upgrades`, and run the
+migration script.
+"""
+
+from typing import Any, Dict
+
+QUIZ_SCHEMA_VERSION = 1
+
+DEFAULT_MARKING_SCHEME = {"correct": 1, "wrong": 0, "skipped": 0}
+
+
+def is_current(quiz: Dict[str, Any]) -> bool:
+    return quiz.get("schema_version", 0) >= QUIZ_SCHEMA_VERSION
+
+
+def schema_upgrades(quiz: Dict[str, Any]) -> Dict[str, Any]:
+    """The fields (as dotted `$set` paths) that bring `quiz` to the current version."""
+    updates: Dict[str, Any] = {}
+    for question_set_index, question_set in enumerate(quiz["question_sets"]):
+        path = f"question_sets.{question_set_index}"
+        questions = question_set.get("questions") or []
+        if "max_questions_allowed_to_attempt" not in question_set:
+            updates[f"{path}.max_questions_allowed_to_attempt"] = len(questions)
+            updates[f"{path}.title"] = "Section A"
+
+        if question_set.get("marking_scheme") is None:
+            question_marking_scheme = (
+                questions[0].get("marking_scheme") if questions else None
+            )
+            updates[f"{path}.marking_scheme"] = (
+                question_marking_scheme
+                if question_marking_scheme is not None
+                else dict(DEFAULT_MARKING_SCHEME)
+            )
+
+    updates["schema_version"] = QUIZ_SCHEMA_VERSION
+    return updates
+
+
+def apply_updates(document: Dict[str, Any], updates: Dict[str, Any]) -> None:
+    """Applies dotted `$set` paths to `document` in place."""
+    for path, value in updates.items():
+        *parents, field = path.split(".")
+        target: Any = document
+        for part in parents:
+            target = target[int(part)] if isinstance(target, list) else target[part]
+        target[field] = value
+
+
+def upgrade_quiz(quiz: Dict[str, Any]) -> None:
+    """Brings `quiz` to the current schema version in memory (in place)."""
+    if not is_current(quiz):
+        apply_updates(quiz, schema_upgrades(quiz))
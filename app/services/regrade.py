@@ -0,0 +1,205 @@
+"""
+Regrade every ended session of a quiz, e.g. after a correct answer was fixed.
+
+Sessions are streamed in `_id` order with a server-side cursor and rescored in chunks
+(services/batch_scoring.py). Only sessions whose metrics actually change are written,
+as one unordered `bulk_write` of `UpdateOne`s per chunk (which also bumps `updated_at`,
+so the ETL picks the new scores up).
+
+Progress is checkpointed in `regrade_checkpoints` (one document per quiz, holding the
+last session `_id` written) after every chunk, so a crashed or time-boxed run resumes
+where it stopped. Rewriting a chunk twice is harmless: the second pass finds the
+metrics unchanged and writes nothing. A finished run marks its checkpoint completed,
+and the next run for that quiz starts from the beginning again.
+
+Dry runs write nothing (not even the checkpoint) and instead report how many sessions
+would change, with a sample of before/after differences.
+"""
+
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from database import db
+from logger_config import get_logger
+from services.batch_scoring import DEFAULT_CHUNK_SIZE, iter_scored_session_chunks
+from services.quiz_schema import upgrade_quiz
+
+logger = get_logger()
+
+DEFAULT_MAX_DIFFS = 50
+
+_METRIC_TOTALS = [
+    "total_marks",
+    "total_answered",
+    "total_correct",
+    "total_wrong",
+    "total_partially_correct",
+    "total_skipped",
+]
+
+
+class QuizNotFoundError(Exception):
+    pass
+
+
+def _diff_metrics(
+    session_id: Any, old: Optional[Dict[str, Any]], new: Dict[str, Any]
+) -> Dict[str, Any]:
+    old = old or {}
+    return {
+        "session_id": str(session_id),
+        "changes": {
+            key: {"before": old.get(key), "after": new[key]}
+            for key in _METRIC_TOTALS
+            if old.get(key) != new[key]
+        },
+    }
+
+
+async def regrade_quiz_sessions(
+    quiz_id: str,
+    dry_run: bool = False,
+    restart: bool = False,
+    after_session_id: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    time_budget_seconds: Optional[float] = None,
+    max_diffs: int = DEFAULT_MAX_DIFFS,
+    on_chunk: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """Recompute and store metrics for the ended sessions of `quiz_id`.
+
+    Real runs resume from the quiz's checkpoint unless `restart` is set; dry runs start
+    from `after_session_id` (or the beginning). With `time_budget_seconds`, the run
+    stops after the chunk that crosses the budget and reports `completed: False`;
+    calling again continues from there. `on_chunk` receives the running report after
+    every chunk (used by the CLI to print progress).
+    """
+    quiz = await db.quizzes.find_one({"_id": quiz_id})
+    if quiz is None:
+        raise QuizNotFoundError(f"quiz {quiz_id} not found")
+    upgrade_quiz(quiz)
+
+    checkpoint = None
+    if not dry_run:
+        checkpoint = await db.regrade_checkpoints.find_one({"_id": quiz_id})
+        if restart or (checkpoint is not None and checkpoint.get("completed")):
+            checkpoint = None
+        if checkpoint is not None:
+            after_session_id = checkpoint.get("last_session_id")
+
+    session_filter: Dict[str, Any] = {"has_quiz_ended": True}
+    if after_session_id is not None:
+        session_filter["_id"] = {"$gt": after_session_id}
+
+    report: Dict[str, Any] = {
+        "quiz_id": quiz_id,
+        "dry_run": dry_run,
+        "resumed_from": after_session_id,
+        "last_session_id": after_session_id,
+        "processed": 0,
+        "changed": 0,
+        "written": 0,
+        "completed": False,
+        "elapsed_seconds": 0.0,
+        "sessions_per_sec": 0.0,
+    }
+    if dry_run:
+        report["diffs"] = []
+    if not dry_run and checkpoint is None:
+        now = datetime.utcnow()
+        await db.regrade_checkpoints.update_one(
+            {"_id": quiz_id},
+            {
+                "$set": {
+                    "last_session_id": after_session_id,
+                    "processed": 0,
+                    "written": 0,
+                    "completed": False,
+                    "started_at": now,
+                    "updated_at": now,
+                }
+            },
+            upsert=True,
+        )
+
+    logger.info(
+        f"Regrading sessions of quiz {quiz_id} (dry_run={dry_run}, "
+        f"after={after_session_id})"
+    )
+    start = time.monotonic()
+    completed = True
+    chunks = iter_scored_session_chunks(
+        quiz, session_filter=session_filter, chunk_size=chunk_size
+    )
+    try:
+        async for chunk in chunks:
+            now = datetime.utcnow()
+            updates: List[UpdateOne] = []
+            for session, metrics in chunk:
+                if session.get("metrics") == metrics:
+                    continue
+                report["changed"] += 1
+                if dry_run:
+                    if len(report["diffs"]) < max_diffs:
+                        report["diffs"].append(
+                            _diff_metrics(
+                                session["_id"], session.get("metrics"), metrics
+                            )
+                        )
+                    continue
+                updates.append(
+                    UpdateOne(
+                        {"_id": session["_id"]},
+                        {"$set": {"metrics": metrics, "updated_at": now}},
+                    )
+                )
+
+            written = 0
+            if updates:
+                result = await db.sessions.bulk_write(updates, ordered=False)
+                written = result.modified_count
+            report["written"] += written
+            report["processed"] += len(chunk)
+            report["last_session_id"] = chunk[-1][0]["_id"]
+
+            if not dry_run:
+                await db.regrade_checkpoints.update_one(
+                    {"_id": quiz_id},
+                    {
+                        "$set": {
+                            "last_session_id": report["last_session_id"],
+                            "updated_at": now,
+                        },
+                        "$inc": {"processed": len(chunk), "written": written},
+                    },
+                )
+
+            elapsed = time.monotonic() - start
+            report["elapsed_seconds"] = round(elapsed, 3)
+            report["sessions_per_sec"] = round(
+                report["processed"] / max(elapsed, 1e-9), 1
+            )
+            if on_chunk is not None:
+                on_chunk(report)
+            if time_budget_seconds is not None and elapsed >= time_budget_seconds:
+                completed = False
+                break
+    finally:
+        # closes the server-side cursor when stopping early
+        await chunks.aclose()
+
+    report["completed"] = completed
+    if not dry_run and completed:
+        await db.regrade_checkpoints.update_one(
+            {"_id": quiz_id},
+            {"$set": {"completed": True, "updated_at": datetime.utcnow()}},
+        )
+    logger.info(
+        f"Regrade of quiz {quiz_id}: processed={report['processed']} "
+        f"changed={report['changed']} written={report['written']} "
+        f"completed={completed} ({report['sessions_per_sec']} sessions/sec)"
+    )
+    return report
@@ -1,4 +1,5 @@
-from typing import Any, Dict, Optional
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
 
 
 NUMERICAL_FLOAT_TOLERANCE = 0.05
@@ -181,12 +182,286 @@ def _compute_partial_marks(marking_scheme: Dict[str, Any], user_answer: Any) ->
     return 0.0
 
 
-def compute_session_metrics(
-    session: Dict[str, Any], quiz: Dict[str, Any]
-) -> Dict[str, Any]:
+# --- compiled scoring plans ---------------------------------------------------------
+#
+# compute_session_metrics used to walk the nested quiz dict for every session: resolving
+# marking schemes, sorting correct answers and dispatching on question-type strings per
+# question. compile_scoring_plan does that work once per quiz and produces an immutable,
+# flat plan (safe to cache and share across requests); score_session then only walks
+# the session answers. The graders below mirror `_evaluate_answer` branch for branch.
+
+# grading outcomes for one answered-or-not question
+NOT_ANSWERED = 0
+CORRECT = 1
+WRONG = 2
+PARTIALLY_CORRECT = 3
+
+# per-position handling decided at compile time
+QUESTION_FORCE_CORRECT = 0
+QUESTION_UNGRADED = 1
+QUESTION_GRADED = 2
+
+_NUMBER_TYPES = (int, float)
+
+
+class QuestionPlan(NamedTuple):
+    kind: int  # QUESTION_* constant
+    # (plan, user_answer, does_partial_marking_exist) -> outcome; None unless graded
+    grade: Optional[Callable[["QuestionPlan", Any, bool], int]] = None
+    correct_answer: Any = None
+    # sorted copy of a list correct answer, for order-insensitive comparison
+    correct_sorted: Optional[List[Any]] = None
+    # set of a list correct answer, for subset (partial marking) checks
+    correct_set: Optional[frozenset] = None
+    # the raw question, only kept for answers that cannot be normalized up front
+    question: Optional[Dict[str, Any]] = None
+
+
+class QuestionSetPlan(NamedTuple):
+    name: str
+    qset_id: str
+    num_questions: int
+    questions: Tuple[QuestionPlan, ...]
+    max_questions_allowed_to_attempt: int
+    correct_marks: float
+    wrong_marks: float
+    skipped_marks: float
+    does_partial_marking_exist: bool
+    # num_correct_selected -> marks (raw value; first matching rule wins)
+    partial_marks_by_count: Mapping[Any, Any]
+
+
+class ScoringPlan(NamedTuple):
+    is_form: bool
+    question_sets: Tuple[QuestionSetPlan, ...]
+
+
+def _equals_correct(plan: QuestionPlan, user_answer: Any) -> bool:
+    if plan.correct_sorted is not None and isinstance(user_answer, list):
+        return sorted(user_answer) == plan.correct_sorted
+    return user_answer == plan.correct_answer
+
+
+def _is_subset_of_correct(plan: QuestionPlan, user_answer: List[Any]) -> bool:
+    try:
+        return all(option in plan.correct_set for option in user_answer)
+    except TypeError:  # unhashable option; fall back to list membership
+        return _is_subset(user_answer, plan.correct_answer)
+
+
+def _grade_single_choice(plan: QuestionPlan, user_answer: Any, _: bool) -> int:
+    if user_answer is None:
+        return NOT_ANSWERED
+    if isinstance(user_answer, _NUMBER_TYPES):
+        return WRONG
+    return CORRECT if _equals_correct(plan, user_answer) else WRONG
+
+
+def _grade_multi_choice(
+    plan: QuestionPlan, user_answer: Any, does_partial_marking_exist: bool
+) -> int:
+    # used for both multi-choice and matrix-match
+    if user_answer is None:
+        return NOT_ANSWERED
+    if isinstance(user_answer, _NUMBER_TYPES):
+        return WRONG
+    if _equals_correct(plan, user_answer):
+        return CORRECT
+    if (
+        does_partial_marking_exist
+        and isinstance(user_answer, list)
+        and plan.correct_set is not None
+        and len(user_answer) > 0
+        and _is_subset_of_correct(plan, user_answer)
+    ):
+        return PARTIALLY_CORRECT
+    return WRONG
+
+
+def _grade_matrix_exact(plan: QuestionPlan, user_answer: Any, _: bool) -> int:
+    # matrix-rating / matrix-numerical: numbers are not a valid response
+    if user_answer is None or isinstance(user_answer, _NUMBER_TYPES):
+        return NOT_ANSWERED
+    return CORRECT if _equals_correct(plan, user_answer) else WRONG
+
+
+def _grade_matrix_subjective(plan: QuestionPlan, user_answer: Any, _: bool) -> int:
+    # NOTE: Matching legacy FE/ETL behavior: any non-empty response counts as correct.
+    if user_answer is None or isinstance(user_answer, _NUMBER_TYPES):
+        return NOT_ANSWERED
+    if isinstance(user_answer, dict) and any(
+        isinstance(val, str) and val.strip() != "" for val in user_answer.values()
+    ):
+        return CORRECT
+    return WRONG
+
+
+def _grade_subjective(plan: QuestionPlan, user_answer: Any, _: bool) -> int:
+    # NOTE: Matching legacy FE/ETL behavior: any non-empty response counts as correct.
+    if user_answer is None or isinstance(user_answer, _NUMBER_TYPES):
+        return NOT_ANSWERED
+    if isinstance(user_answer, str) and user_answer.strip() != "":
+        return CORRECT
+    return WRONG
+
+
+def _grade_numerical_integer(plan: QuestionPlan, user_answer: Any, _: bool) -> int:
+    if user_answer is None:
+        return NOT_ANSWERED
+    if not isinstance(user_answer, _NUMBER_TYPES):
+        return WRONG
+    correct_answer = plan.correct_answer
+    if correct_answer is not None and user_answer == correct_answer:
+        return CORRECT
+    return WRONG
+
+
+def _grade_numerical_float(plan: QuestionPlan, user_answer: Any, _: bool) -> int:
+    if user_answer is None:
+        return NOT_ANSWERED
+    if not isinstance(user_answer, _NUMBER_TYPES):
+        return WRONG
+    correct_answer = plan.correct_answer
+    if (
+        isinstance(correct_answer, _NUMBER_TYPES)
+        and abs(user_answer - correct_answer) < NUMERICAL_FLOAT_TOLERANCE
+    ):
+        return CORRECT
+    return WRONG
+
+
+def _grade_unknown_type(plan: QuestionPlan, user_answer: Any, _: bool) -> int:
+    if user_answer is None or isinstance(user_answer, _NUMBER_TYPES):
+        return NOT_ANSWERED
+    return WRONG
+
+
+def _grade_with_question(
+    plan: QuestionPlan, user_answer: Any, does_partial_marking_exist: bool
+) -> int:
+    """Fallback for questions whose correct answer could not be normalized."""
+    result = _evaluate_answer(plan.question, user_answer, does_partial_marking_exist)
+    if not result["answered"]:
+        return NOT_ANSWERED
+    if result["is_correct"]:
+        return CORRECT
+    if result["is_partially_correct"]:
+        return PARTIALLY_CORRECT
+    return WRONG
+
+
+_GRADERS = {
+    "single-choice": _grade_single_choice,
+    "multi-choice": _grade_multi_choice,
+    "matrix-match": _grade_multi_choice,
+    "matrix-rating": _grade_matrix_exact,
+    "matrix-numerical": _grade_matrix_exact,
+    "matrix-subjective": _grade_matrix_subjective,
+    "subjective": _grade_subjective,
+    "numerical-integer": _grade_numerical_integer,
+    "numerical-float": _grade_numerical_float,
+}
+
+
+def _compile_question(question: Dict[str, Any]) -> QuestionPlan:
+    if question.get("force_correct", False):
+        return QuestionPlan(kind=QUESTION_FORCE_CORRECT)
+    if not question.get("graded", True):
+        return QuestionPlan(kind=QUESTION_UNGRADED)
+
+    grade = _GRADERS.get(question.get("type"), _grade_unknown_type)
+    correct_answer = question.get("correct_answer")
+    correct_sorted = None
+    correct_set = None
+    if isinstance(correct_answer, list):
+        try:
+            correct_sorted = sorted(correct_answer)
+            correct_set = frozenset(correct_answer)
+        except TypeError:
+            # mixed or unhashable entries: keep today's exact semantics (including
+            # any errors) by grading this question through _evaluate_answer
+            return QuestionPlan(
+                kind=QUESTION_GRADED, grade=_grade_with_question, question=question
+            )
+    return QuestionPlan(
+        kind=QUESTION_GRADED,
+        grade=grade,
+        correct_answer=correct_answer,
+        correct_sorted=correct_sorted,
+        correct_set=correct_set,
+    )
+
+
+def _partial_marks_by_count(marking_scheme: Dict[str, Any]) -> Mapping[Any, Any]:
+    marks_by_count: Dict[Any, Any] = {}
+    for partial_mark_rule in marking_scheme.get("partial") or []:
+        for condition in partial_mark_rule.get("conditions", []):
+            marks_by_count.setdefault(
+                condition.get("num_correct_selected"), partial_mark_rule.get("marks", 0)
+            )
+    return MappingProxyType(marks_by_count)
+
+
+def compile_scoring_plan(quiz: Dict[str, Any]) -> ScoringPlan:
+    """Compile a quiz into the flat structure `score_session` consumes. The plan only
+    depends on the quiz document, so it can be built once and reused for every session
+    of that quiz."""
     quiz_type = _get_quiz_type(quiz)
-    question_sets = quiz.get("question_sets") or []
+    is_form = quiz_type == "form"
+
+    question_set_plans = []
+    for question_set in quiz.get("question_sets") or []:
+        questions = question_set.get("questions") or []
+        qset_title = question_set.get("title")
+        if qset_title is None:
+            qset_title = ""
+        qset_id = question_set.get("_id") or question_set.get("id")
+        qset_id = str(qset_id) if qset_id is not None else ""
+        marking_scheme = _get_marking_scheme(question_set, quiz_type)
+
+        if is_form:
+            question_set_plans.append(
+                QuestionSetPlan(
+                    name=qset_title,
+                    qset_id=qset_id,
+                    num_questions=len(questions),
+                    questions=(),
+                    max_questions_allowed_to_attempt=len(questions),
+                    correct_marks=0.0,
+                    wrong_marks=0.0,
+                    skipped_marks=0.0,
+                    does_partial_marking_exist=False,
+                    partial_marks_by_count=MappingProxyType({}),
+                )
+            )
+            continue
+
+        max_questions_allowed = question_set.get("max_questions_allowed_to_attempt")
+        if max_questions_allowed is None:
+            max_questions_allowed = len(questions)
+        question_set_plans.append(
+            QuestionSetPlan(
+                name=qset_title,
+                qset_id=qset_id,
+                num_questions=len(questions),
+                questions=tuple(_compile_question(q) for q in questions),
+                max_questions_allowed_to_attempt=max_questions_allowed,
+                correct_marks=float(marking_scheme.get("correct", 0)),
+                wrong_marks=float(marking_scheme.get("wrong", 0)),
+                skipped_marks=float(marking_scheme.get("skipped", 0)),
+                does_partial_marking_exist=marking_scheme.get("partial") is not None,
+                partial_marks_by_count=_partial_marks_by_count(marking_scheme),
+            )
+        )
+
+    return ScoringPlan(is_form=is_form, question_sets=tuple(question_set_plans))
+
+
+def score_session(session: Dict[str, Any], plan: ScoringPlan) -> Dict[str, Any]:
+    """Compute session metrics from a compiled plan; see `compute_session_metrics`."""
     session_answers = session.get("session_answers") or []
+    num_session_answers = len(session_answers)
+    is_form = plan.is_form
 
     qset_metrics = []
     total_answered = 0
@@ -197,15 +472,10 @@ def compute_session_metrics(
     total_marked_for_review = 0
     total_marks = 0.0
 
-    session_answer_index = 0
-    for question_set in question_sets:
-        questions = question_set.get("questions") or []
-        qset_title = question_set.get("title")
-        if qset_title is None:
-            qset_title = ""
-        qset_id = question_set.get("_id") or question_set.get("id")
-        qset_id = str(qset_id) if qset_id is not None else ""
-        marking_scheme = _get_marking_scheme(question_set, quiz_type)
+    position = 0
+    for qset_plan in plan.question_sets:
+        # answers beyond the end of the session (legacy short sessions) are not scored
+        end = min(position + qset_plan.num_questions, num_session_answers)
 
         qset_num_answered = 0
         qset_num_correct = 0
@@ -215,64 +485,63 @@ def compute_session_metrics(
         qset_num_ungraded = 0
         qset_partial_marks = 0.0
 
-        for question in questions:
-            if session_answer_index >= len(session_answers):
-                break
-            session_answer = session_answers[session_answer_index]
-            session_answer_index += 1
-
-            if session_answer.get("marked_for_review"):
-                qset_num_marked_for_review += 1
-
-            if quiz_type == "form":
+        if is_form:
+            for session_answer in session_answers[position:end]:
+                if session_answer.get("marked_for_review"):
+                    qset_num_marked_for_review += 1
                 if _is_form_answered(session_answer.get("answer")):
                     qset_num_answered += 1
-                continue
-
-            if question.get("force_correct", False):
-                qset_num_answered += 1
-                qset_num_correct += 1
-                continue
-
-            if not question.get("graded", True):
-                qset_num_ungraded += 1
-                continue
-
-            answer_eval = _evaluate_answer(
-                question,
-                session_answer.get("answer"),
-                marking_scheme.get("partial") is not None,
-            )
-
-            if not answer_eval.get("valid"):
-                continue
+        else:
+            does_partial_marking_exist = qset_plan.does_partial_marking_exist
+            for question_plan, session_answer in zip(
+                qset_plan.questions, session_answers[position:end]
+            ):
+                if session_answer.get("marked_for_review"):
+                    qset_num_marked_for_review += 1
 
-            if answer_eval.get("answered"):
+                kind = question_plan.kind
+                if kind == QUESTION_FORCE_CORRECT:
+                    qset_num_answered += 1
+                    qset_num_correct += 1
+                    continue
+                if kind == QUESTION_UNGRADED:
+                    qset_num_ungraded += 1
+                    continue
+
+                user_answer = session_answer.get("answer")
+                outcome = question_plan.grade(
+                    question_plan, user_answer, does_partial_marking_exist
+                )
+                if outcome == NOT_ANSWERED:
+                    continue
                 qset_num_answered += 1
-                if answer_eval.get("is_correct"):
+                if outcome == CORRECT:
                     qset_num_correct += 1
-                elif answer_eval.get("is_partially_correct"):
+                elif outcome == PARTIALLY_CORRECT:
                     qset_num_partially_correct += 1
-                    qset_partial_marks += _compute_partial_marks(
-                        marking_scheme, session_answer.get("answer")
-                    )
+                    if qset_plan.partial_marks_by_count and isinstance(
+                        user_answer, list
+                    ):
+                        qset_partial_marks += float(
+                            qset_plan.partial_marks_by_count.get(len(user_answer), 0)
+                        )
                 else:
                     qset_num_wrong += 1
+        position += qset_plan.num_questions
 
-        if quiz_type == "form":
-            max_questions_allowed = len(questions)
+        if is_form:
+            max_questions_allowed = qset_plan.num_questions
             qset_num_skipped = max_questions_allowed - qset_num_answered
             qset_marks_scored = 0.0
         else:
-            max_questions_allowed = question_set.get("max_questions_allowed_to_attempt")
-            if max_questions_allowed is None:
-                max_questions_allowed = len(questions)
-            max_questions_allowed = max(0, max_questions_allowed - qset_num_ungraded)
+            max_questions_allowed = max(
+                0, qset_plan.max_questions_allowed_to_attempt - qset_num_ungraded
+            )
             qset_num_skipped = max(0, max_questions_allowed - qset_num_answered)
             qset_marks_scored = (
-                float(marking_scheme.get("correct", 0)) * qset_num_correct
-                + float(marking_scheme.get("wrong", 0)) * qset_num_wrong
-                + float(marking_scheme.get("skipped", 0)) * qset_num_skipped
+                qset_plan.correct_marks * qset_num_correct
+                + qset_plan.wrong_marks * qset_num_wrong
+                + qset_plan.skipped_marks * qset_num_skipped
                 + qset_partial_marks
             )
 
@@ -289,8 +558,8 @@ def compute_session_metrics(
 
         qset_metrics.append(
             {
-                "name": qset_title,
-                "qset_id": qset_id,
+                "name": qset_plan.name,
+                "qset_id": qset_plan.qset_id,
                 "marks_scored": round(qset_marks_scored, 2),
                 "num_answered": qset_num_answered,
                 "num_skipped": qset_num_skipped,
@@ -321,3 +590,11 @@ def compute_session_metrics(
         "total_marked_for_review": total_marked_for_review,
         "total_marks": round(total_marks, 2),
     }
+
+
+def compute_session_metrics(
+    session: Dict[str, Any], quiz: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Score one session against its quiz. Callers scoring many sessions of the same
+    quiz should compile the plan once and call `score_session` directly."""
+    return score_session(session, compile_scoring_plan(quiz))
@@ -0,0 +1,256 @@
+"""
+Server-side session event updates.
+
+`PATCH /sessions/{id}` used to read the whole session (all `session_answers` and
+`events`) only to look at the last event and the timing fields, and then write it back
+with a second round trip. `build_event_update_pipeline` instead expresses the event
+timeline and timing rules as an update pipeline, so the event is recorded with a single
+atomic `find_one_and_update` that returns only `EVENT_RESULT_PROJECTION`.
+
+Timing rules (unchanged):
+- Dummy events define active windows (count full duration). A dummy right after a dummy
+  extends the previous one (its `updated_at`) instead of adding a new event.
+- Resume events without a dummy in between get a capped gap (<= 20s).
+- End always counts the final gap after the last event.
+Time is only counted while the quiz has started and not ended.
+
+Event timestamps are stored as ISO strings (older sessions may have BSON dates), and
+are converted to dates on the server at millisecond precision.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from schemas import EventType
+
+# cap on the time counted between two non-dummy events (e.g. start -> resume)
+RESUME_GAP_CAP_SECONDS = 20
+
+# what the update returns: enough to answer the request and track heartbeats,
+# never the answers
+EVENT_RESULT_PROJECTION = {
+    "user_id": 1,
+    "quiz_id": 1,
+    "has_quiz_ended": 1,
+    "start_quiz_time": 1,
+    "total_time_spent": 1,
+    "time_limit_max": 1,
+    "time_remaining": 1,
+    "event_count": {"$size": {"$ifNull": ["$events", []]}},
+    "first_event_type": {"$arrayElemAt": ["$events.event_type", 0]},
+    "last_event": {"$arrayElemAt": ["$events", -1]},
+}
+
+_TIMING = "_event_timing"
+_LAST_EVENT = f"${_TIMING}.last_event"
+
+
+def _to_date(value: Any) -> Dict[str, Any]:
+    """ISO string (truncated to milliseconds) or BSON date -> date; null stays null."""
+    return {
+        "$let": {
+            "vars": {"value": value},
+            "in": {
+                "$cond": [
+                    {"$eq": [{"$type": "$$value"}, "string"]},
+                    {
+                        "$dateFromString": {
+                            "dateString": {"$substrCP": ["$$value", 0, 23]}
+                        }
+                    },
+                    "$$value",
+                ]
+            },
+        }
+    }
+
+
+def _seconds_since(now: datetime, value: Any) -> Dict[str, Any]:
+    """Seconds from `value` to `now`, or 0 if `value` is not set."""
+    return {
+        "$let": {
+            "vars": {"since": _to_date(value)},
+            "in": {
+                "$cond": [
+                    {"$eq": [{"$type": "$$since"}, "date"]},
+                    {"$divide": [{"$subtract": [now, "$$since"]}, 1000]},
+                    0,
+                ]
+            },
+        }
+    }
+
+
+def _counted_seconds(event_type: str, now: datetime) -> Any:
+    """Time this event adds to `total_time_spent` (before clamping at 0)."""
+    if event_type not in (
+        EventType.dummy_event,
+        EventType.end_quiz,
+        EventType.resume_quiz,
+    ):
+        return 0
+
+    # elapsed time since the previous event "ended" (updated_at if present, else
+    # created_at); a dummy extending a dummy only counts from its updated_at
+    previous_end = {
+        "$ifNull": [f"{_LAST_EVENT}.updated_at", f"{_LAST_EVENT}.created_at"]
+    }
+    if event_type == EventType.dummy_event:
+        previous_end = {
+            "$cond": [
+                {"$eq": [f"{_LAST_EVENT}.event_type", EventType.dummy_event.value]},
+                f"{_LAST_EVENT}.updated_at",
+                previous_end,
+            ]
+        }
+    gap = _seconds_since(now, previous_end)
+    counted = f"${_TIMING}.is_active"
+    if event_type == EventType.resume_quiz:
+        # previous event is dummy: dummy already captured elapsed time, so add 0 here
+        # previous event is start/resume: add up to 20s to avoid counting long idle gaps
+        gap = {"$min": [gap, RESUME_GAP_CAP_SECONDS]}
+        counted = {
+            "$and": [
+                counted,
+                {"$ne": [f"{_LAST_EVENT}.event_type", EventType.dummy_event.value]},
+            ]
+        }
+    return {"$cond": [counted, gap, 0]}
+
+
+def build_event_update_pipeline(
+    new_event_obj: Dict[str, Any],
+    now: datetime,
+    end_quiz_fields: Optional[Dict[str, Any]] = None,
+    extra_updates: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Update pipeline recording `new_event_obj` (an encoded `Event`) on a session.
+
+    `now` is the event time as a date; `end_quiz_fields` (metrics etc.) are set along
+    with an end-quiz event. `extra_updates` are further field expressions applied in
+    the same update (e.g. merged answers).
+    """
+    event_type = new_event_obj["event_type"]
+    is_start = event_type == EventType.start_quiz
+    is_end = event_type == EventType.end_quiz
+    events = {"$ifNull": ["$events", []]}
+
+    previous_total = {"$ifNull": ["$total_time_spent", 0]}
+    total = f"${_TIMING}.total"
+
+    appended = {"$concatArrays": [events, [{"$literal": new_event_obj}]]}
+    if event_type == EventType.dummy_event:
+        # if previous event is dummy, just change the updated_at time of previous event
+        new_events = {
+            "$cond": [
+                {"$eq": [f"{_LAST_EVENT}.event_type", EventType.dummy_event.value]},
+                {
+                    "$concatArrays": [
+                        {"$slice": [events, {"$subtract": [{"$size": events}, 1]}]},
+                        [
+                            {
+                                "$mergeObjects": [
+                                    _LAST_EVENT,
+                                    {"updated_at": new_event_obj["created_at"]},
+                                ]
+                            }
+                        ],
+                    ]
+                },
+                appended,
+            ]
+        }
+    else:
+        new_events = appended
+
+    update: Dict[str, Any] = {
+        "events": new_events,
+        # only write total_time_spent when time was added, it was never set, or the quiz ends
+        "total_time_spent": {
+            "$cond": [
+                {
+                    "$or": [
+                        is_end,
+                        {"$eq": [{"$ifNull": ["$total_time_spent", None]}, None]},
+                        {"$gt": [total, previous_total]},
+                    ]
+                },
+                {"$round": [total, 2]},
+                "$total_time_spent",
+            ]
+        },
+        # clamp to avoid negative time_remaining due to polling/latency gaps
+        "time_remaining": {
+            "$cond": [
+                {"$eq": [{"$ifNull": ["$time_limit_max", None]}, None]},
+                "$time_remaining",
+                {
+                    "$max": [
+                        0,
+                        {
+                            "$subtract": [
+                                {"$toInt": "$time_limit_max"},
+                                {"$toInt": total},
+                            ]
+                        },
+                    ]
+                },
+            ]
+        },
+        "updated_at": datetime.utcnow(),
+    }
+    if is_start:
+        # set once when start-quiz arrives
+        update["start_quiz_time"] = {
+            "$ifNull": ["$start_quiz_time", new_event_obj["created_at"]]
+        }
+    if end_quiz_fields:
+        update.update(
+            {key: {"$literal": value} for key, value in end_quiz_fields.items()}
+        )
+    if extra_updates:
+        update.update(extra_updates)
+
+    return [
+        {
+            "$set": {
+                _TIMING: {
+                    "last_event": {"$arrayElemAt": [events, -1]},
+                    "is_active": {
+                        "$and": [
+                            {"$ne": ["$has_quiz_ended", True]},
+                            {
+                                "$or": [
+                                    is_start,
+                                    {
+                                        "$ne": [
+                                            {"$ifNull": ["$start_quiz_time", None]},
+                                            None,
+                                        ]
+                                    },
+                                    {
+                                        "$eq": [
+                                            {"$arrayElemAt": ["$events.event_type", 0]},
+                                            EventType.start_quiz.value,
+                                        ]
+                                    },
+                                ]
+                            },
+                        ]
+                    },
+                }
+            }
+        },
+        {
+            "$set": {
+                f"{_TIMING}.total": {
+                    "$add": [
+                        previous_total,
+                        {"$max": [0, _counted_seconds(event_type, now)]},
+                    ]
+                }
+            }
+        },
+        {"$set": update},
+        {"$unset": _TIMING},
+    ]
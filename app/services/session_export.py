@@ -0,0 +1,139 @@
+"""
+Incremental export of sessions as NDJSON, for the ETL.
+
+Sessions are read in `(updated_at, _id)` order, served by the index on those fields,
+from a server-side cursor on a secondary when there is one, and written out one JSON
+document per line as they arrive, so memory use does not depend on how many sessions
+match.
+
+Resuming is keyset based. After the last session, the export ends with one more line,
+`{"next_cursor": ...}`: an opaque token encoding the `(updated_at, _id)` of the last
+session exported (or of the cursor passed in, if there were none), and whether the
+export got to the end of the matching sessions (it did unless `limit` cut it off).
+Passing it back as `cursor` returns every session after that one, in order. An export
+cut off before its last line is resumed from the previous cursor; the sessions
+exported twice are the same documents, so consumers upsert by `_id`.
+
+`updated_at` is set by the API servers, and the export reads from a secondary when
+there is one, so a session can become visible after sessions with a later `updated_at`
+were exported (clock skew between servers, writes committing out of order, replication
+lag). Keyset resuming would skip it for good. `overlap_seconds` re-reads the sessions
+updated within that window before the cursor; the ETL should pass a window larger than
+those delays (e.g. 300) and ignore rows whose `updated_at` it has already stored. The
+window only applies at the start of a run, to a cursor that got to the end: the pages
+of a run cut off by `limit` follow each other by keyset, so paging always advances.
+
+Sessions without `updated_at` (created before it was added) are not exported.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pymongo import ReadPreference
+
+from database import AsyncCollection, db
+from json_encoding import dumps
+
+# always exported, since they make up the resume cursor
+CURSOR_FIELDS = ("_id", "updated_at")
+# sessions per round trip to Mongo
+EXPORT_BATCH_SIZE = 500
+
+# the primary serves the exams; exports can read slightly stale data from a secondary
+_session_collection = AsyncCollection(
+    db.sessions.delegate.with_options(
+        read_preference=ReadPreference.SECONDARY_PREFERRED
+    )
+)
+
+
+class InvalidCursorError(Exception):
+    pass
+
+
+def encode_cursor(updated_at: datetime, session_id: str, caught_up: bool) -> str:
+    raw = json.dumps([updated_at.isoformat(), session_id, caught_up]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str, bool]:
+    """(updated_at, _id, caught_up) of a cursor."""
+    try:
+        # (cursors without the flag were all issued at the end of an export)
+        updated_at, session_id, caught_up = (
+            *json.loads(base64.urlsafe_b64decode(cursor)),
+            True,
+        )[:3]
+        return datetime.fromisoformat(updated_at), session_id, bool(caught_up)
+    except (binascii.Error, TypeError, ValueError) as exc:
+        raise InvalidCursorError(f"invalid cursor {cursor!r}") from exc
+
+
+def export_filter(
+    updated_since: Optional[datetime],
+    cursor: Optional[str] = None,
+    overlap_seconds: float = 0,
+) -> Dict[str, Any]:
+    """Sessions updated at or after `updated_since`, or the sessions after `cursor` in
+    `(updated_at, _id)` order; with `overlap_seconds`, also those updated within that
+    window before it, unless `cursor` is in the middle of a run."""
+    if cursor is None:
+        if updated_since is None:
+            return {"updated_at": {"$gte": datetime.min}}
+        return {
+            "updated_at": {"$gte": updated_since - timedelta(seconds=overlap_seconds)}
+        }
+    since, after_id, caught_up = decode_cursor(cursor)
+    if overlap_seconds and caught_up:
+        return {"updated_at": {"$gte": since - timedelta(seconds=overlap_seconds)}}
+    return {
+        "$or": [
+            {"updated_at": {"$gt": since}},
+            {"updated_at": since, "_id": {"$gt": after_id}},
+        ]
+    }
+
+
+def export_projection(fields: Optional[List[str]]) -> Optional[Dict[str, int]]:
+    if not fields:
+        return None
+    return {field: 1 for field in (*CURSOR_FIELDS, *fields)}
+
+
+async def iter_session_lines(
+    session_filter: Dict[str, Any],
+    fields: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> AsyncIterator[bytes]:
+    """NDJSON lines of the sessions matching `session_filter` (see `export_filter`), in
+    `(updated_at, _id)` order, then the `next_cursor` line (that of `cursor` if there
+    were no sessions)."""
+    sessions = _session_collection.find(
+        session_filter,
+        projection=export_projection(fields),
+        sort=[("updated_at", 1), ("_id", 1)],
+        limit=limit or 0,
+        batch_size=EXPORT_BATCH_SIZE,
+    )
+    last = None
+    count = 0
+    try:
+        async for session in sessions:
+            last = session
+            count += 1
+            yield dumps(session) + b"\n"
+    finally:
+        await sessions.close()
+    if last is not None:
+        # a full page may have more after it: the next one continues the run
+        cursor = encode_cursor(
+            last["updated_at"], last["_id"], caught_up=not limit or count < limit
+        )
+    elif cursor is not None:
+        since, after_id, _ = decode_cursor(cursor)
+        cursor = encode_cursor(since, after_id, caught_up=True)
+    yield dumps({"next_cursor": cursor}) + b"\n"
@@ -0,0 +1,283 @@
+"""
+Materialized `session_results`: one small document per ended session.
+
+Dashboards and the ETL only need the scores and timing of ended sessions, but session
+documents also carry every event and the question order. `SessionResultsSync` keeps a
+compact copy of what they need (`RESULT_FIELDS`, under the session's `_id`) in
+`session_results`, by following a change stream on `sessions`:
+
+- inserts / replaces of an ended session upsert its result from the new document;
+- updates that set one of `TRIGGER_FIELDS` upsert the result of the session as it is
+  now, looked up by the consumer with one query per batch of changes, so re-applying
+  a change is harmless;
+- deleting a session deletes its result.
+
+Most writes to sessions are heartbeats, which only set the events and the timing
+fields. The server filters updates on the fields they set, from the change event
+alone, so heartbeats never reach the consumer nor cost a lookup (the stream does not
+use `fullDocument: updateLookup`, which would look up every update). Changes to an
+ended session's `updated_at` or `total_time_spent` alone, or to a field inside one of
+`TRIGGER_FIELDS` (e.g. `metrics.total_marks`), are therefore not followed; writes
+that change results set those fields as a whole.
+
+The resume token is stored in `change_stream_checkpoints` after every batch of
+changes, and every `checkpoint_interval_seconds` while the filtered stream is quiet
+(its token still advances with the oplog), so a restarted consumer carries on where
+it stopped and its token does not fall off the oplog for lack of changes. On the very
+first run, or when the stored token has fallen off the oplog, the results are first
+backfilled from all ended sessions; the change stream is opened before the backfill,
+so writes made during it are not lost. Every result write stamps `synced_at`, and the
+backfill ends by deleting the results it did not rewrite: those of sessions deleted
+while the consumer was not following the stream.
+
+Change streams need a replica set (a single-node one is enough locally). Run one
+consumer per deployment, with `scripts/sync_session_results.py`.
+"""
+
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo import DeleteOne, ReplaceOne
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
+
+from logger_config import get_logger
+
+logger = get_logger()
+
+RESULTS_COLLECTION = "session_results"
+CHECKPOINTS_COLLECTION = "change_stream_checkpoints"
+CHECKPOINT_ID = "session_results"
+
+RESULT_FIELDS = (
+    "quiz_id",
+    "user_id",
+    "omr_mode",
+    "created_at",
+    "updated_at",
+    "start_quiz_time",
+    "end_quiz_time",
+    "total_time_spent",
+    "time_limit_max",
+    "metrics",
+)
+
+# an update that sets none of these is dropped by the server
+TRIGGER_FIELDS = (
+    "has_quiz_ended",
+    "end_quiz_time",
+    "metrics",
+    "quiz_id",
+    "user_id",
+    "omr_mode",
+    "start_quiz_time",
+    "time_limit_max",
+)
+
+SYNCED_AT_FIELD = "synced_at"
+
+# the resume token is older than anything left in the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_CHECKPOINT_INTERVAL_SECONDS = 60
+
+
+def _now() -> datetime:
+    """The current time at the millisecond precision Mongo stores."""
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def result_document(session: Dict[str, Any]) -> Dict[str, Any]:
+    result = {"_id": session["_id"]}
+    result.update({field: session.get(field) for field in RESULT_FIELDS})
+    result[SYNCED_AT_FIELD] = _now()
+    return result
+
+
+def change_stream_pipeline() -> List[Dict[str, Any]]:
+    return [
+        {
+            "$match": {
+                "$or": [
+                    {
+                        "operationType": {"$in": ["insert", "replace"]},
+                        "fullDocument.has_quiz_ended": True,
+                    },
+                    {
+                        "operationType": "update",
+                        "$or": [
+                            {
+                                f"updateDescription.updatedFields.{field}": {
+                                    "$exists": True
+                                }
+                            }
+                            for field in TRIGGER_FIELDS
+                        ],
+                    },
+                    {"operationType": "delete"},
+                ]
+            }
+        },
+        # only what a result needs travels to the consumer (`_id` is the resume token)
+        {
+            "$project": {
+                "operationType": 1,
+                "documentKey": 1,
+                **{f"fullDocument.{field}": 1 for field in ("_id", *RESULT_FIELDS)},
+            }
+        },
+    ]
+
+
+class SessionResultsSync:
+    """Maintains `session_results` from a change stream on `sessions`; see the module
+    docstring."""
+
+    def __init__(
+        self,
+        database: Database,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_await_time_ms: int = 1000,
+        checkpoint_interval_seconds: float = DEFAULT_CHECKPOINT_INTERVAL_SECONDS,
+    ):
+        self.database = database
+        self.sessions = database.sessions
+        self.results = database[RESULTS_COLLECTION]
+        self.checkpoints = database[CHECKPOINTS_COLLECTION]
+        self.batch_size = batch_size
+        self.max_await_time_ms = max_await_time_ms
+        self.checkpoint_interval_seconds = checkpoint_interval_seconds
+
+    def load_resume_token(self) -> Optional[Dict[str, Any]]:
+        checkpoint = self.checkpoints.find_one({"_id": CHECKPOINT_ID})
+        return None if checkpoint is None else checkpoint.get("resume_token")
+
+    def save_resume_token(self, resume_token: Optional[Dict[str, Any]]) -> None:
+        self.checkpoints.update_one(
+            {"_id": CHECKPOINT_ID},
+            {"$set": {"resume_token": resume_token, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    def backfill(self) -> int:
+        """Upserts the result of every ended session and deletes the other results;
+        returns how many were upserted."""
+        started_at = _now()
+        count = 0
+        writes = []
+        for session in self.sessions.find(
+            {"has_quiz_ended": True},
+            projection=list(RESULT_FIELDS),
+            batch_size=self.batch_size,
+        ):
+            result = result_document(session)
+            writes.append(ReplaceOne({"_id": result["_id"]}, result, upsert=True))
+            if len(writes) >= self.batch_size:
+                self.results.bulk_write(writes, ordered=False)
+                count += len(writes)
+                writes = []
+        if writes:
+            self.results.bulk_write(writes, ordered=False)
+            count += len(writes)
+
+        # not rewritten: the session is gone. A session deleted after it was read
+        # above is removed by its delete event, from the stream opened before.
+        deleted = self.results.delete_many(
+            {SYNCED_AT_FIELD: {"$not": {"$gte": started_at}}}
+        ).deleted_count
+        if deleted:
+            logger.info(f"Deleted {deleted} results of sessions no longer ended")
+        return count
+
+    def apply(self, changes: List[Dict[str, Any]]) -> None:
+        """Applies a batch of change events (of `change_stream_pipeline`) to the
+        results."""
+        updated_ids = [
+            change["documentKey"]["_id"]
+            for change in changes
+            if change["operationType"] == "update"
+        ]
+        updated = {}
+        if updated_ids:
+            # the sessions as they are now; the others are in progress or deleted
+            for session in self.sessions.find(
+                {"_id": {"$in": updated_ids}, "has_quiz_ended": True},
+                projection=list(RESULT_FIELDS),
+            ):
+                updated[session["_id"]] = session
+
+        # the last change of each session wins (the bulk write is unordered)
+        writes = {}
+        for change in changes:
+            session_id = change["documentKey"]["_id"]
+            if change["operationType"] == "delete":
+                writes[session_id] = DeleteOne({"_id": session_id})
+                continue
+            if change["operationType"] == "update":
+                session = updated.get(session_id)
+            else:
+                session = change["fullDocument"]
+            if session is not None:
+                writes[session_id] = ReplaceOne(
+                    {"_id": session_id}, result_document(session), upsert=True
+                )
+        if writes:
+            self.results.bulk_write(list(writes.values()), ordered=False)
+
+    def _watch(self, resume_token: Optional[Dict[str, Any]]):
+        return self.sessions.watch(
+            change_stream_pipeline(),
+            resume_after=resume_token,
+            batch_size=self.batch_size,
+            max_await_time_ms=self.max_await_time_ms,
+        )
+
+    def _consume(self, stream, should_stop: Callable[[], bool]) -> None:
+        saved_token, saved_at = stream.resume_token, time.monotonic()
+        while stream.alive and not should_stop():
+            changes = []
+            # try_next waits at most max_await_time_ms, so `should_stop` is checked
+            # regularly even when nothing changes
+            while len(changes) < self.batch_size:
+                change = stream.try_next()
+                if change is None:
+                    break
+                changes.append(change)
+            if changes:
+                self.apply(changes)
+                logger.info(f"Applied {len(changes)} session changes to results")
+            elif (
+                stream.resume_token == saved_token
+                or time.monotonic() - saved_at < self.checkpoint_interval_seconds
+            ):
+                continue
+            self.save_resume_token(stream.resume_token)
+            saved_token, saved_at = stream.resume_token, time.monotonic()
+
+    def run(self, should_stop: Callable[[], bool] = lambda: False) -> None:
+        """Follows the change stream until `should_stop()` returns True."""
+        resume_token = self.load_resume_token()
+        while not should_stop():
+            try:
+                with self._watch(resume_token) as stream:
+                    if resume_token is None:
+                        start_token = stream.resume_token
+                        logger.info("Backfilling session results")
+                        count = self.backfill()
+                        logger.info(f"Backfilled {count} session results")
+                        self.save_resume_token(start_token)
+                    self._consume(stream, should_stop)
+            except OperationFailure as exc:
+                if exc.code != CHANGE_STREAM_HISTORY_LOST:
+                    raise
+                logger.warning(
+                    "Session results resume token is no longer in the oplog, "
+                    "backfilling again"
+                )
+                resume_token = None
+            else:
+                # the stream was invalidated (e.g. the collection was dropped)
+                resume_token = self.load_resume_token()
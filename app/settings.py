@@ -16,9 +16,81 @@ class Settings(BaseSettings):
         assembled chapter-test JSON for CMS->quiz ingest.
     cms_service_token : str
         bearer token for the CMS /api/service/* routes (matches CMS_SERVICE_TOKEN there).
+    cms_request_timeout_seconds : float
+        timeout of each call to the CMS.
+    cms_ingest_concurrency : int
+        how many assembled tests a bulk CMS ingest fetches at once; also the size of the
+        keep-alive connection pool to the CMS.
+    cms_ingest_max_retries : int
+        retries (with backoff) of a CMS call that fails to connect or returns a
+        transient error status.
+    mongo_max_pool_size : int
+        max MongoDB connections per process; also the number of threads the async
+        data-access layer (`database.db`) uses to run pymongo calls off the event loop.
+    mongo_min_pool_size : int
+        MongoDB connections kept open even when idle.
+    mongo_max_idle_time_ms : int
+        idle time after which a pooled connection is closed.
+    mongo_connect_timeout_ms : int
+        timeout for establishing a new MongoDB connection.
+    mongo_server_selection_timeout_ms : int
+        how long an operation waits for a suitable server before failing.
+    quiz_creation_transaction : bool
+        insert a new quiz and its questions in one transaction, so a failed creation
+        leaves no orphaned questions behind. Needs a replica set (e.g. Atlas).
+    question_dedup : bool
+        store each distinct question body once, in `question_bodies`, and only a
+        reference to it per question (see services/question_store.py).
+    question_body_cache_max_size : int
+        number of question bodies each worker keeps in memory to resolve references.
+    quiz_cache_max_size : int
+        number of quiz documents each worker keeps in its in-process cache
+        (see services/quiz_cache.py). 0 disables the cache.
+    quiz_cache_ttl_seconds : float
+        how long a cached quiz is served without going back to Mongo.
+    quiz_cache_max_stale_seconds : float
+        how long past its TTL a cached quiz may still be served while Mongo is slow
+        or unavailable.
+    quiz_cache_revalidate_timeout_seconds : float
+        how long a reader waits for an expired quiz to refresh before falling back to
+        the stale copy.
+    etag_cache_max_size : int
+        number of question-endpoint ETags each worker remembers, to answer conditional
+        GETs without reading Mongo (see services/http_caching.py). 0 disables it.
+    etag_cache_ttl_seconds : float
+        how long a remembered ETag is trusted.
+    heartbeat_redis_url : str
+        Redis (or Redis-compatible) URL of the store that buffers consecutive
+        dummy-event heartbeats (see services/heartbeat_buffer.py), shared by every API
+        instance. Empty disables buffering; always disabled on AWS Lambda.
+    heartbeat_flush_interval_seconds : float
+        how often each worker writes the buffered heartbeats. 0 disables buffering.
+    admin_api_key : str
+        key required in the X-Admin-Key header by the /admin routes (e.g. regrading a
+        quiz). Empty disables those routes.
     """
 
     api_key_length: int = 20
     subset_size: int = 10
     cms_service_endpoint: str = ""
     cms_service_token: str = ""
+    cms_request_timeout_seconds: float = 30
+    cms_ingest_concurrency: int = 8
+    cms_ingest_max_retries: int = 3
+    mongo_max_pool_size: int = 20
+    mongo_min_pool_size: int = 5
+    mongo_max_idle_time_ms: int = 30000
+    mongo_connect_timeout_ms: int = 5000
+    mongo_server_selection_timeout_ms: int = 5000
+    quiz_creation_transaction: bool = False
+    question_dedup: bool = False
+    question_body_cache_max_size: int = 8192
+    quiz_cache_max_size: int = 512
+    quiz_cache_ttl_seconds: float = 300
+    quiz_cache_max_stale_seconds: float = 3600
+    quiz_cache_revalidate_timeout_seconds: float = 0.25
+    etag_cache_max_size: int = 4096
+    etag_cache_ttl_seconds: float = 300
+    heartbeat_redis_url: str = ""
+    heartbeat_flush_interval_seconds: float = 30
+    admin_api_key: str = ""
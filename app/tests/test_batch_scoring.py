@@ -0,0 +1,153 @@
+import asyncio
+import glob
+import json
+import random
+import threading
+import unittest
+from unittest import mock
+
+from database import db
+from services import batch_scoring
+from services.batch_scoring import iter_scored_session_chunks, score_sessions
+from services.scoring import compile_scoring_plan, score_session
+
+ANSWERS = [
+    None,
+    0,
+    4,
+    4.02,
+    True,
+    "",
+    "text",
+    [],
+    [0],
+    [2, 0],
+    [0, 1, 2],
+    [0, 0, 2],
+    ["A"],
+    ["B", "A"],
+    {},
+    {"r1": "x"},
+]
+
+
+def _random_sessions(quiz, num_sessions, rng):
+    num_questions = sum(
+        len(question_set["questions"]) for question_set in quiz["question_sets"]
+    )
+    return [
+        {
+            "session_answers": [
+                {"answer": rng.choice(ANSWERS), "marked_for_review": rng.random() < 0.2}
+                # include legacy sessions shorter (or longer) than the quiz
+                for _ in range(rng.choice([num_questions, num_questions - 1, 1]))
+            ]
+        }
+        for _ in range(num_sessions)
+    ]
+
+
+class TestBatchScoring(unittest.TestCase):
+    def assert_matches_per_session_scoring(self, quiz, sessions):
+        plan = compile_scoring_plan(quiz)
+        expected = [score_session(session, plan) for session in sessions]
+        actual = score_sessions(sessions, plan)
+        self.assertEqual(actual, expected)
+        # same Python types too (e.g. int 0 vs 0.0), since these go straight to Mongo
+        self.assertEqual(repr(actual), repr(expected))
+
+    def test_matches_score_session_for_fixture_quizzes(self):
+        rng = random.Random(7)
+        for path in sorted(glob.glob("app/tests/dummy_data/*.json")):
+            quiz = json.load(open(path))
+            if "question_sets" not in quiz:
+                continue
+            with self.subTest(quiz=path):
+                self.assert_matches_per_session_scoring(
+                    quiz, _random_sessions(quiz, 50, rng)
+                )
+
+    def test_matches_score_session_with_partial_marking(self):
+        quiz = json.load(open("app/tests/dummy_data/scoring_small_assessment.json"))
+        sessions = [
+            {"session_answers": [{"answer": answer}] * 4}
+            for answer in [[0], [2], [0, 2], [2, 0], [0, 1], [0, 0], [], 1, None]
+        ]
+        self.assert_matches_per_session_scoring(quiz, sessions)
+
+    def test_matches_score_session_for_form(self):
+        quiz = json.load(open("app/tests/dummy_data/scoring_small_form.json"))
+        sessions = [
+            {"session_answers": [{"answer": answer, "marked_for_review": True}] * 3}
+            for answer in [None, "", " ", "x", [], [1], {}, {"a": 1}, 0]
+        ]
+        self.assert_matches_per_session_scoring(quiz, sessions)
+
+    def test_empty_chunk(self):
+        quiz = json.load(open("app/tests/dummy_data/scoring_small_assessment.json"))
+        self.assertEqual(score_sessions([], compile_scoring_plan(quiz)), [])
+
+
+class TestIterScoredSessionChunks(unittest.TestCase):
+    def setUp(self):
+        self.quiz = json.load(
+            open("app/tests/dummy_data/scoring_small_assessment.json")
+        )
+        self.quiz["_id"] = "batch-scoring-quiz"
+        asyncio.run(db.sessions.delete_many({"quiz_id": self.quiz["_id"]}))
+
+    def tearDown(self):
+        asyncio.run(db.sessions.delete_many({"quiz_id": self.quiz["_id"]}))
+
+    def test_streams_sessions_of_the_quiz_in_chunks(self):
+        sessions = [
+            {
+                "_id": f"batch-scoring-{index}",
+                "quiz_id": self.quiz["_id"],
+                "session_answers": [{"answer": [0, 2]}] * (index % 4),
+            }
+            for index in range(5)
+        ]
+        other_quiz_session = {"_id": "batch-scoring-other", "quiz_id": "other"}
+
+        async def run():
+            await db.sessions.insert_many(sessions + [other_quiz_session])
+            try:
+                return [
+                    chunk
+                    async for chunk in iter_scored_session_chunks(
+                        self.quiz, chunk_size=2
+                    )
+                ]
+            finally:
+                await db.sessions.delete_one({"_id": other_quiz_session["_id"]})
+
+        chunks = asyncio.run(run())
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        plan = compile_scoring_plan(self.quiz)
+        for (session, metrics), expected_session in zip(
+            [pair for chunk in chunks for pair in chunk], sessions
+        ):
+            self.assertEqual(session["_id"], expected_session["_id"])
+            self.assertEqual(metrics, score_session(expected_session, plan))
+
+    def test_scores_chunks_off_the_event_loop_thread(self):
+        scoring_threads = []
+
+        def recording_score_sessions(sessions, plan):
+            scoring_threads.append(threading.get_ident())
+            return score_sessions(sessions, plan)
+
+        async def run():
+            await db.sessions.insert_one(
+                {"_id": "batch-scoring-thread", "quiz_id": self.quiz["_id"]}
+            )
+            return [chunk async for chunk in iter_scored_session_chunks(self.quiz)]
+
+        with mock.patch.object(
+            batch_scoring, "score_sessions", recording_score_sessions
+        ):
+            chunks = asyncio.run(run())
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(len(scoring_threads), 1)
+        self.assertNotEqual(scoring_threads[0], threading.get_ident())
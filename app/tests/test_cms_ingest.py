@@ -2,12 +2,25 @@
 
 Fixtures mirror the assembled-test JSON shape verified live against staging
 (test 504 / problem 506) plus fabricated multi-choice and numerical problems.
-No MongoDB needed — these exercise the pure mapping.
+No MongoDB needed — these exercise the pure mapping. The bulk ingest endpoint is tested
+against a stub CMS server.
 """
 
+import json
+import threading
 import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 
+from pymongo.errors import PyMongoError
+
+from services import cms_ingest
 from services.cms_ingest import map_cms_test_to_quiz, CmsIngestError
+from .base import BaseTestCase
+from ..routers import quizzes
+from routers import quizzes as app_quizzes
+from ..database import client as mongo_client
 
 
 def _test_with_problems(problems, sections, subtype="chapter_test"):
@@ -676,3 +689,226 @@ class TestCmsMapper(unittest.TestCase):
 
 if __name__ == "__main__":
     unittest.main()
+
+
+class _StubCmsHandler(BaseHTTPRequestHandler):
+    """Serves assembled tests from `tests` (keyed by test id) like the CMS does. Test
+    ids in `flaky` fail once with 503 before succeeding."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, as the CMS does
+    tests = {}
+    flaky = set()
+    connections = set()
+
+    def do_GET(self):
+        self.connections.add(self.client_address)
+        query = parse_qs(urlparse(self.path).query)
+        test_id = int(query["id"][0])
+        if test_id in self.flaky:
+            self.flaky.discard(test_id)
+            self._send(503, {"error": "busy"})
+        elif test_id in self.tests:
+            self._send(200, self.tests[test_id])
+        else:
+            self._send(404, {"error": "not found"})
+
+    def _send(self, status_code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _single_choice_test(test_id, num_problems=1):
+    problem_ids = [test_id + index + 1 for index in range(num_problems)]
+    assembled = _test_with_problems(
+        problems=[
+            _problem(
+                problem_id,
+                "mcq_single_answer",
+                {"text": f"Q{problem_id}?", "options": ["A", "B"], "answer": ["1"]},
+            )
+            for problem_id in problem_ids
+        ],
+        sections=[
+            {
+                "type": "mcq_single_answer",
+                "name": "",
+                "compulsory": {
+                    "problems": [{"id": problem_id} for problem_id in problem_ids]
+                },
+            }
+        ],
+    )
+    assembled["test"]["id"] = test_id
+    return assembled
+
+
+class TestCmsBulkIngest(BaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubCmsHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.previous_settings = (
+            cms_ingest.settings.cms_service_endpoint,
+            cms_ingest.settings.cms_service_token,
+        )
+        cms_ingest.settings.cms_service_endpoint = (
+            f"http://127.0.0.1:{cls.server.server_address[1]}"
+        )
+        cms_ingest.settings.cms_service_token = "token"
+
+    @classmethod
+    def tearDownClass(cls):
+        (
+            cms_ingest.settings.cms_service_endpoint,
+            cms_ingest.settings.cms_service_token,
+        ) = cls.previous_settings
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def test_bulk_ingest_reports_each_test(self):
+        test_ids = list(range(1000, 1030, 2))
+        _StubCmsHandler.tests = {
+            test_id: _single_choice_test(test_id) for test_id in test_ids
+        }
+        _StubCmsHandler.flaky = {test_ids[0]}
+        _StubCmsHandler.connections = set()
+
+        response = self.client.post(
+            f"{quizzes.router.prefix}/from-cms/bulk",
+            json={
+                "tests": [
+                    {"test_id": test_id, "curriculum_id": 1, "grade_id": 1}
+                    for test_id in test_ids + [999]
+                ]
+            },
+        )
+        assert response.status_code == 200
+        report = response.json()
+        assert report["created"] == len(test_ids)
+        assert report["failed"] == 1
+
+        *created, missing = report["results"]
+        assert [result["test_id"] for result in created] == test_ids
+        for test_id, result in zip(test_ids, created):
+            assert result["error"] is None
+            quiz = mongo_client.quiz.quizzes.find_one({"_id": result["id"]})
+            assert quiz["metadata"]["source_id"] == str(test_id)
+            assert mongo_client.quiz.questions.count_documents(
+                {"question_set_id": quiz["question_sets"][0]["_id"]}
+            ) == len(quiz["question_sets"][0]["questions"])
+        assert missing["id"] is None
+        assert "404" in missing["error"]
+
+        # the flaky test was retried, and connections were reused across tests
+        assert not _StubCmsHandler.flaky
+        assert (
+            len(_StubCmsHandler.connections)
+            <= cms_ingest.settings.cms_ingest_concurrency
+        )
+
+    def test_bulk_ingest_reports_failed_resyncs_per_test(self):
+        test_ids = [3000, 3010]
+        _StubCmsHandler.tests = {
+            test_id: _single_choice_test(test_id) for test_id in test_ids
+        }
+        # (the module the app imported)
+        resync = app_quizzes._resync_quiz_from_cms
+        calls = []
+
+        async def failing_first_resync(quiz):
+            calls.append(quiz["metadata"]["source_id"])
+            if len(calls) == 1:
+                raise PyMongoError("connection reset")
+            return await resync(quiz)
+
+        with mock.patch.object(
+            app_quizzes, "_resync_quiz_from_cms", failing_first_resync
+        ):
+            response = self.client.post(
+                f"{quizzes.router.prefix}/from-cms/bulk",
+                json={
+                    "tests": [
+                        {
+                            "test_id": test_id,
+                            "curriculum_id": 1,
+                            "grade_id": 1,
+                            "resync": True,
+                        }
+                        for test_id in test_ids
+                    ]
+                },
+            )
+        assert response.status_code == 200
+        report = response.json()
+        assert report["failed"] == 1
+        assert report["created"] == 1
+        failed, created = report["results"]
+        assert failed["id"] is None
+        assert failed["error"] == "connection reset"
+        assert created["error"] is None
+        assert created["sync"] == "created"
+
+    def test_resync_updates_only_changed_questions(self):
+        test_id = 2000
+        assembled = _single_choice_test(test_id, num_problems=3)
+        _StubCmsHandler.tests = {test_id: assembled}
+        url = f"{quizzes.router.prefix}/from-cms"
+        body = {"test_id": test_id, "curriculum_id": 1, "grade_id": 1}
+
+        created = self.client.post(url, json=body)
+        assert created.status_code == 201
+        quiz_id = created.json()["id"]
+        stored_questions = list(
+            mongo_client.quiz.questions.find(
+                {"source_id": {"$in": ["2001", "2002", "2003"]}}, sort=[("_id", 1)]
+            )
+        )
+
+        unchanged = self.client.post(url, json={**body, "resync": True})
+        assert unchanged.status_code == 200
+        assert unchanged.json()["sync"] == "unchanged"
+        assert unchanged.json()["id"] == quiz_id
+
+        # fields the CMS mapping no longer produces are removed by the re-sync
+        mongo_client.quiz.quizzes.update_one(
+            {"_id": quiz_id},
+            {"$set": {"dropped_field": 1, "question_sets.0.dropped_field": 1}},
+        )
+        assembled["problems"][1]["meta_data"]["text"] = "Edited?"
+        updated = self.client.post(url, json={**body, "resync": True})
+        assert updated.status_code == 200
+        assert updated.json()["sync"] == "updated"
+        assert updated.json()["id"] == quiz_id
+        assert updated.json()["updated_questions"] == 1
+
+        resynced_questions = list(
+            mongo_client.quiz.questions.find(
+                {"source_id": {"$in": ["2001", "2002", "2003"]}}, sort=[("_id", 1)]
+            )
+        )
+        assert [question["_id"] for question in resynced_questions] == [
+            question["_id"] for question in stored_questions
+        ]
+        assert resynced_questions[0] == stored_questions[0]
+        assert resynced_questions[1]["text"] == "Edited?"
+        quiz = self.client.get(f"{quizzes.router.prefix}/{quiz_id}").json()
+        assert quiz["question_sets"][0]["questions"][1]["text"] == "Edited?"
+        stored_quiz = mongo_client.quiz.quizzes.find_one({"_id": quiz_id})
+        assert "dropped_field" not in stored_quiz
+        assert "dropped_field" not in stored_quiz["question_sets"][0]
+
+        # a different set of problems cannot be patched in place
+        _StubCmsHandler.tests = {test_id: _single_choice_test(test_id, num_problems=4)}
+        recreated = self.client.post(url, json={**body, "resync": True})
+        assert recreated.status_code == 201
+        assert recreated.json()["sync"] == "created"
+        assert recreated.json()["id"] != quiz_id
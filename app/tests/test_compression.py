@@ -0,0 +1,20 @@
+import unittest
+
+from compression import CompressedBody, choose_encoding
+
+
+class TestCompression(unittest.TestCase):
+    def test_choose_encoding(self):
+        assert choose_encoding(None) is None
+        assert choose_encoding("identity") is None
+        assert choose_encoding("gzip, deflate, br") == "br"
+        assert choose_encoding("br;q=0.5, gzip") == "gzip"
+        assert choose_encoding("br;q=0, gzip;q=0") is None
+        assert choose_encoding("*") == "br"
+        assert choose_encoding("*;q=0.1, gzip;q=0.5") == "gzip"
+
+    def test_variants_are_compressed_once(self):
+        body = CompressedBody(b'{"questions": []}' * 100)
+        gzipped = body.encoded("gzip")
+        assert body.encoded("gzip") is gzipped
+        assert len(gzipped) < len(body.body)
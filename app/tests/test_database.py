@@ -0,0 +1,44 @@
+import asyncio
+import unittest
+
+from ..database import AsyncCursor, db
+
+
+class AsyncDatabaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.collection = db["async_layer_test"]
+        asyncio.run(self.collection.delete_many({}))
+
+    def tearDown(self):
+        asyncio.run(self.collection.delete_many({}))
+
+    def test_round_trip_through_async_collection(self):
+        async def run():
+            await self.collection.insert_one({"_id": "a", "value": 1})
+            await self.collection.update_one({"_id": "a"}, {"$set": {"value": 2}})
+            return await self.collection.find_one({"_id": "a"})
+
+        assert asyncio.run(run()) == {"_id": "a", "value": 2}
+
+    def test_find_streams_all_documents_across_batches(self):
+        async def run():
+            await self.collection.insert_many([{"_id": i} for i in range(7)])
+            cursor = AsyncCursor(
+                lambda: self.collection.delegate.find({}, sort=[("_id", 1)]),
+                batch_size=3,
+            )
+            return [document["_id"] async for document in cursor]
+
+        assert asyncio.run(run()) == list(range(7))
+
+    def test_to_list_respects_length(self):
+        async def run():
+            await self.collection.insert_many([{"_id": i} for i in range(5)])
+            cursor = self.collection.find({}, sort=[("_id", 1)])
+            first = await cursor.to_list(2)
+            rest = await cursor.to_list()
+            return first, rest
+
+        first, rest = asyncio.run(run())
+        assert [d["_id"] for d in first] == [0, 1]
+        assert [d["_id"] for d in rest] == [2, 3, 4]
@@ -0,0 +1,181 @@
+import asyncio
+import time
+
+from fakeredis import FakeServer, aioredis as fake_aioredis
+from redis import asyncio as aioredis
+
+from database import db
+from routers import sessions
+from schemas import EventType
+from services.heartbeat_buffer import HeartbeatBuffer, heartbeat_buffer
+
+from .base import SessionsBaseTestCase
+
+
+class ConnectionPerCommandPool(aioredis.ConnectionPool):
+    """Never reuses a connection: connections are bound to the event loop that opened
+    them, and the test client and asyncio.run each run their own."""
+
+    def owns_connection(self, connection):
+        return False
+
+
+class HeartbeatBufferTestCase(SessionsBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.session_id = self.timed_quiz_session["_id"]
+        self.redis_server = FakeServer()
+        heartbeat_buffer.redis = self._redis()
+        heartbeat_buffer.enabled = True
+
+    def tearDown(self):
+        asyncio.run(heartbeat_buffer.flush())
+        heartbeat_buffer.redis = None
+        heartbeat_buffer.enabled = False
+
+    def _redis(self):
+        return aioredis.Redis(
+            connection_pool=ConnectionPerCommandPool(
+                connection_class=fake_aioredis.FakeConnection,
+                server=self.redis_server,
+                decode_responses=True,
+            )
+        )
+
+    def _buffered(self, session_id=None):
+        return asyncio.run(heartbeat_buffer.get(session_id or self.session_id))
+
+    def _send(self, event_type, session_id=None):
+        response = self.client.patch(
+            f"{sessions.router.prefix}/{session_id or self.session_id}",
+            json={"event": event_type.value},
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    def _stored(self):
+        return asyncio.run(db.sessions.find_one({"_id": self.session_id}))
+
+    def _start_and_buffer(self):
+        self._send(EventType.start_quiz)
+        self._send(EventType.dummy_event)
+        assert self._buffered() is not None
+        return self._stored()
+
+    def test_consecutive_dummy_events_are_not_written_until_flushed(self):
+        before = self._start_and_buffer()
+
+        time.sleep(0.2)
+        self._send(EventType.dummy_event)
+        response = self._send(EventType.dummy_event)
+
+        stored = self._stored()
+        assert stored["events"] == before["events"]
+        assert stored["total_time_spent"] == before["total_time_spent"]
+
+        buffered = self._buffered()
+        assert buffered.total_time_spent > before["total_time_spent"]
+        assert response["time_remaining"] == buffered.time_remaining
+
+        assert asyncio.run(heartbeat_buffer.flush()) >= 1
+        stored = self._stored()
+        assert len(stored["events"]) == 2
+        assert stored["events"][1]["updated_at"] == buffered.event_updated_at
+        assert stored["total_time_spent"] == buffered.total_time_spent
+        assert stored["time_remaining"] == buffered.time_remaining
+        # stays buffered for further heartbeats
+        assert not self._buffered().dirty
+
+    def test_get_session_flushes_buffered_heartbeat(self):
+        before = self._start_and_buffer()
+        time.sleep(0.2)
+        self._send(EventType.dummy_event)
+
+        session = self.client.get(f"{sessions.router.prefix}/{self.session_id}").json()
+        assert session["total_time_spent"] > before["total_time_spent"]
+        assert self._buffered() is None
+
+    def test_end_quiz_counts_buffered_time(self):
+        self._start_and_buffer()
+        time.sleep(0.2)
+        self._send(EventType.dummy_event)
+        buffered_total = self._buffered().total_time_spent
+
+        self._send(EventType.end_quiz)
+        stored = self._stored()
+        assert stored["has_quiz_ended"] is True
+        assert stored["total_time_spent"] >= buffered_total
+        assert [event["event_type"] for event in stored["events"]] == [
+            EventType.start_quiz.value,
+            EventType.dummy_event.value,
+            EventType.end_quiz.value,
+        ]
+        assert self._buffered() is None
+
+    def test_flush_skips_sessions_changed_elsewhere(self):
+        before = self._start_and_buffer()
+        self._send(EventType.dummy_event)
+        # e.g. another worker recorded a resume in the meantime
+        asyncio.run(
+            db.sessions.update_one(
+                {"_id": self.session_id},
+                {"$push": {"events": {"event_type": EventType.resume_quiz.value}}},
+            )
+        )
+
+        asyncio.run(heartbeat_buffer.flush())
+        stored = self._stored()
+        assert stored["events"][1] == before["events"][1]
+        assert stored["total_time_spent"] == before["total_time_spent"]
+        assert self._buffered() is None
+
+    def test_flush_only_drops_sessions_changed_elsewhere(self):
+        self._start_and_buffer()
+        other_session_id = self.multi_qset_quiz_session["_id"]
+        self._send(EventType.start_quiz, other_session_id)
+        self._send(EventType.dummy_event, other_session_id)
+        other_before = asyncio.run(db.sessions.find_one({"_id": other_session_id}))
+
+        time.sleep(0.2)
+        self._send(EventType.dummy_event)
+        self._send(EventType.dummy_event, other_session_id)
+        asyncio.run(
+            db.sessions.update_one(
+                {"_id": self.session_id},
+                {"$push": {"events": {"event_type": EventType.resume_quiz.value}}},
+            )
+        )
+
+        assert asyncio.run(heartbeat_buffer.flush()) == 1
+        assert self._buffered() is None
+        buffered = self._buffered(other_session_id)
+        assert not buffered.dirty
+        other = asyncio.run(db.sessions.find_one({"_id": other_session_id}))
+        assert other["total_time_spent"] > other_before["total_time_spent"]
+        assert other["total_time_spent"] == buffered.total_time_spent
+
+    def test_buffered_state_is_shared_by_workers(self):
+        before = self._start_and_buffer()
+        time.sleep(0.2)
+        self._send(EventType.dummy_event)
+        buffered = self._buffered()
+
+        # another worker (or instance) using the same store
+        other_worker = HeartbeatBuffer(self._redis(), flush_interval_seconds=30)
+        assert asyncio.run(other_worker.flush()) == 1
+        stored = self._stored()
+        assert stored["total_time_spent"] == buffered.total_time_spent
+        assert stored["total_time_spent"] > before["total_time_spent"]
+        # nothing left to write for this worker
+        assert asyncio.run(heartbeat_buffer.flush()) == 0
+        assert not self._buffered().dirty
+
+    def test_heartbeats_are_written_when_the_store_is_down(self):
+        before = self._start_and_buffer()
+        self.redis_server.connected = False
+        time.sleep(0.2)
+        self._send(EventType.dummy_event)
+
+        stored = self._stored()
+        assert stored["total_time_spent"] > before["total_time_spent"]
+        self.redis_server.connected = True
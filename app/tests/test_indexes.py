@@ -0,0 +1,90 @@
+import unittest
+
+from database import client
+from indexes import (
+    HOT_QUERIES,
+    REQUIRED_INDEXES,
+    create_missing_indexes,
+    diff_indexes,
+    undeclared_indexes,
+    unindexed_stages,
+)
+
+database = client.quiz
+
+
+class TestUnindexedStages(unittest.TestCase):
+    def test_find_plans(self):
+        ixscan = {
+            "queryPlanner": {
+                "winningPlan": {
+                    "stage": "FETCH",
+                    "inputStage": {"stage": "IXSCAN", "indexName": "a_1"},
+                },
+                "rejectedPlans": [
+                    {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}
+                ],
+            }
+        }
+        self.assertEqual(unindexed_stages(ixscan), [])
+
+        collscan = {
+            "queryPlanner": {
+                "winningPlan": {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}
+            }
+        }
+        self.assertEqual(unindexed_stages(collscan), ["COLLSCAN", "SORT"])
+
+        # slot-based engine output nests the plan one level deeper
+        sbe = {"queryPlanner": {"winningPlan": {"queryPlan": {"stage": "COLLSCAN"}}}}
+        self.assertEqual(unindexed_stages(sbe), ["COLLSCAN"])
+
+    def test_aggregation_plans(self):
+        explain = {
+            "stages": [
+                {
+                    "$cursor": {
+                        "queryPlanner": {"winningPlan": {"stage": "IXSCAN"}},
+                    }
+                },
+                {"$sort": {"sortKey": {"_id": -1}}},
+                {"$group": {"_id": "$quiz_id"}},
+            ]
+        }
+        self.assertEqual(unindexed_stages(explain), ["$sort"])
+
+
+class TestIndexRegistry(unittest.TestCase):
+    def setUp(self):
+        for collection in REQUIRED_INDEXES:
+            database[collection].drop_indexes()
+
+    def test_create_missing_indexes(self):
+        self.assertEqual(
+            {
+                collection: [spec.name for spec in specs]
+                for collection, specs in diff_indexes(database).items()
+            },
+            {
+                collection: [spec.name for spec in specs]
+                for collection, specs in REQUIRED_INDEXES.items()
+            },
+        )
+
+        database.sessions.create_index([("legacy_field", 1)])
+        create_missing_indexes(database)
+        self.assertEqual(diff_indexes(database), {})
+        self.assertEqual(undeclared_indexes(database), {"sessions": ["legacy_field_1"]})
+        # idempotent
+        self.assertEqual(create_missing_indexes(database), {})
+
+    def test_hot_queries_use_indexes(self):
+        """Needs a real mongod (explain is not available on mock clients)."""
+        create_missing_indexes(database)
+        for query in HOT_QUERIES:
+            try:
+                explain = query.explain(database)
+            except (AttributeError, NotImplementedError, TypeError):
+                self.skipTest("explain is not supported by this MongoDB client")
+            with self.subTest(query.description):
+                self.assertEqual(unindexed_stages(explain), [])
@@ -0,0 +1,48 @@
+import json
+import unittest
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from json_encoding import dump_model, dumps
+from models import SessionResponse
+from schemas import EventType
+
+
+class TestJsonEncoding(unittest.TestCase):
+    def test_dumps_matches_jsonable_encoder(self):
+        content = {
+            "_id": ObjectId(),
+            "created_at": datetime(2024, 1, 1, 9, 30, 0, 123456),
+            "updated_at": datetime(2024, 1, 1, 9, 30),
+            "event_type": EventType.start_quiz,
+            "answers": [[0, 2], None, 1.5, "text"],
+            "nested": {"ids": [ObjectId()]},
+        }
+        assert json.loads(dumps(content)) == jsonable_encoder(
+            content, custom_encoder={ObjectId: str}
+        )
+
+    def test_dump_model_matches_response_model(self):
+        session = {
+            "_id": str(ObjectId()),
+            "user_id": "1",
+            "quiz_id": "2",
+            "is_first": True,
+            "created_at": datetime(2024, 1, 1, 9, 30),
+            "updated_at": datetime(2024, 1, 1, 9, 45),
+            "events": [
+                {
+                    "event_type": "start-quiz",
+                    "created_at": "2024-01-01T09:30:00",
+                    "updated_at": "2024-01-01T09:30:00",
+                }
+            ],
+            "session_answers": [],
+            "not_in_the_model": 1,
+        }
+        expected = jsonable_encoder(SessionResponse.parse_obj(session), by_alias=True)
+        encoded = json.loads(dump_model(SessionResponse, session))
+        assert encoded == expected
+        assert "not_in_the_model" not in encoded
@@ -0,0 +1,135 @@
+import asyncio
+
+from .base import BaseTestCase
+from ..routers import questions, quizzes
+from database import client as mongo_client
+from services import question_store
+from services.omr_options import OPTIONS_COUNT_FIELD, load_options_counts
+from services.question_store import (
+    BODY_ID_FIELD,
+    question_body_cache,
+    resolve_questions,
+)
+
+
+class QuestionDedupTestCase(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        question_store.settings.question_dedup = True
+        question_body_cache.clear()
+        # the same quiz created twice, with its questions deduplicated
+        self.dedup_quiz_ids = [
+            self.post_and_get_quiz(self.multi_qset_quiz_data)[0] for _ in range(2)
+        ]
+
+    def tearDown(self):
+        question_store.settings.question_dedup = False
+        super().tearDown()
+
+    def _stored_questions(self, quiz_id):
+        quiz = mongo_client.quiz.quizzes.find_one({"_id": quiz_id})
+        return [
+            list(
+                mongo_client.quiz.questions.find(
+                    {"question_set_id": question_set["_id"]}, sort=[("_id", 1)]
+                )
+            )
+            for question_set in quiz["question_sets"]
+        ]
+
+    def test_identical_questions_share_one_stored_body(self):
+        first, second = [
+            self._stored_questions(quiz_id) for quiz_id in self.dedup_quiz_ids
+        ]
+        for first_set, second_set in zip(first, second):
+            for first_question, second_question in zip(first_set, second_set):
+                assert first_question["_id"] != second_question["_id"]
+                assert first_question[BODY_ID_FIELD] == second_question[BODY_ID_FIELD]
+                assert "text" not in first_question
+
+        body_ids = {
+            question[BODY_ID_FIELD]
+            for question_set in first
+            for question in question_set
+        }
+        assert mongo_client.quiz.question_bodies.count_documents(
+            {"_id": {"$in": list(body_ids)}}
+        ) == len(body_ids)
+
+    def test_read_paths_resolve_references(self):
+        reference_set = self.multi_qset_quiz["question_sets"][0]
+        dedup_quiz = mongo_client.quiz.quizzes.find_one({"_id": self.dedup_quiz_ids[0]})
+        dedup_set_id = dedup_quiz["question_sets"][0]["_id"]
+
+        def without_ids(question):
+            return {
+                field: value
+                for field, value in question.items()
+                if field not in ("_id", "question_set_id")
+            }
+
+        full = self.client.get(
+            f"{questions.router.prefix}/",
+            params={"question_set_id": reference_set["_id"]},
+        ).json()
+        resolved = self.client.get(
+            f"{questions.router.prefix}/", params={"question_set_id": dedup_set_id}
+        ).json()
+        assert [without_ids(question) for question in resolved] == [
+            without_ids(question) for question in full
+        ]
+
+        # served from the body cache the second time
+        question = self.client.get(
+            f"{questions.router.prefix}/{resolved[-1]['_id']}"
+        ).json()
+        assert question["text"] == full[-1]["text"]
+        assert BODY_ID_FIELD not in question
+
+        single_page = self.client.get(
+            f"{quizzes.router.prefix}/{self.dedup_quiz_ids[0]}",
+            params={"single_page_mode": True},
+        ).json()
+        assert [
+            question["text"]
+            for question in single_page["question_sets"][0]["questions"]
+        ] == [question["text"] for question in full]
+
+    def test_overlapping_batch_requests_resolve_each_question(self):
+        dedup_quiz = mongo_client.quiz.quizzes.find_one({"_id": self.dedup_quiz_ids[0]})
+        dedup_set_id = dedup_quiz["question_sets"][0]["_id"]
+        stored = self._stored_questions(self.dedup_quiz_ids[0])[0]
+
+        # a listed id that is also in the range
+        response = self.client.post(
+            f"{questions.router.prefix}/batch",
+            json={
+                "question_ids": [stored[1]["_id"]],
+                "ranges": [{"question_set_id": dedup_set_id, "limit": 3}],
+            },
+        )
+        assert response.status_code == 200
+        batch = response.json()
+        (listed,) = batch["questions"]
+        in_range = batch["question_sets"][0]["questions"]
+        assert listed == in_range[1]
+        assert "text" in listed and BODY_ID_FIELD not in listed
+
+        # the same question twice in one call
+        question = dict(stored[0])
+        assert asyncio.run(resolve_questions([question, question])) == [
+            question,
+            question,
+        ]
+        assert "text" in question and BODY_ID_FIELD not in question
+
+    def test_option_counts_of_references_come_from_their_bodies(self):
+        # (what scripts/backfill_omr_options_counts.py stores)
+        dedup_quiz = mongo_client.quiz.quizzes.find_one({"_id": self.dedup_quiz_ids[0]})
+        for question_set in dedup_quiz["question_sets"]:
+            counts = asyncio.run(load_options_counts(question_set["_id"]))
+            assert counts == question_set[OPTIONS_COUNT_FIELD]
+        assert any(
+            any(question_set[OPTIONS_COUNT_FIELD])
+            for question_set in dedup_quiz["question_sets"]
+        )
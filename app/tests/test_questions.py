@@ -1,6 +1,7 @@
 from .base import BaseTestCase
 from ..routers import questions
 from settings import Settings
+from database import client as mongo_client
 
 settings = Settings()
 
@@ -40,3 +41,103 @@ class QuestionsTestCase(BaseTestCase):
             response = response.json()
             assert isinstance(response, list)
             assert len(response) == settings.subset_size
+
+    def test_conditional_get_of_question_skips_mongo_while_etag_is_cached(self):
+        url = f"{questions.router.prefix}/{self.question_id}"
+        response = self.client.get(url)
+        etag = response.headers["etag"]
+        assert response.headers["cache-control"] == "private, no-cache"
+
+        mongo_client.quiz.questions.delete_one({"_id": self.question_id})
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+    def test_conditional_get_of_questions(self):
+        qset_id = self.multi_qset_quiz["question_sets"][0]["_id"]
+        url = f"{questions.router.prefix}/?question_set_id={qset_id}"
+        etag = self.client.get(url).headers["etag"]
+
+        response = self.client.get(url, headers={"If-None-Match": f'W/{etag}, "x"'})
+        assert response.status_code == 304
+        response = self.client.get(url, headers={"If-None-Match": '"stale"'})
+        assert response.status_code == 200
+        assert response.headers["etag"] == etag
+
+    def test_get_questions_by_cursor_pages_through_question_set(self):
+        qset_id = self.multi_qset_quiz["question_sets"][0]["_id"]
+        url = f"{questions.router.prefix}/?question_set_id={qset_id}"
+        all_questions = self.client.get(url + "&include_answers=true").json()
+
+        pages, after_id = [], None
+        while True:
+            params = {"limit": 3, "include_answers": True}
+            if after_id is not None:
+                params["after_id"] = after_id
+            response = self.client.get(url, params=params)
+            assert response.status_code == 200
+            pages.append(response.json())
+            after_id = response.headers.get(questions.NEXT_CURSOR_HEADER)
+            if after_id is None:
+                break
+
+        assert [len(page) for page in pages[:-1]] == [3] * (len(pages) - 1)
+        assert [question for page in pages for question in page] == all_questions
+        assert len(pages) > 1
+
+    def test_get_questions_after_last_id_is_empty(self):
+        qset_id = self.multi_qset_quiz["question_sets"][0]["_id"]
+        url = f"{questions.router.prefix}/?question_set_id={qset_id}"
+        last_id = self.client.get(url).json()[-1]["_id"]
+
+        response = self.client.get(url, params={"after_id": last_id, "limit": 3})
+        assert response.status_code == 200
+        assert response.json() == []
+        assert questions.NEXT_CURSOR_HEADER not in response.headers
+
+    def test_question_batch_returns_listed_questions_and_ranges_across_sets(self):
+        qset_ids = [
+            question_set["_id"]
+            for question_set in self.multi_qset_quiz["question_sets"]
+        ]
+        url = f"{questions.router.prefix}/?question_set_id="
+        all_questions = [
+            self.client.get(url + qset_id, params={"include_answers": True}).json()
+            for qset_id in qset_ids
+        ]
+        listed = [all_questions[1][2]["_id"], "00", all_questions[0][5]["_id"]]
+
+        response = self.client.post(
+            f"{questions.router.prefix}/batch",
+            params={"include_answers": True},
+            json={
+                "question_ids": listed,
+                "ranges": [
+                    {
+                        "question_set_id": qset_ids[0],
+                        "after_id": all_questions[0][2]["_id"],
+                        "limit": 4,
+                    },
+                    {"question_set_id": qset_ids[1], "skip": 1, "limit": 2},
+                ],
+            },
+        )
+        assert response.status_code == 200
+        batch = response.json()
+        assert batch["questions"] == [all_questions[1][2], all_questions[0][5]]
+        first, second = batch["question_sets"]
+        assert first["questions"] == all_questions[0][3:7]
+        assert first["next_cursor"] == all_questions[0][6]["_id"]
+        assert second["question_set_id"] == qset_ids[1]
+        assert second["questions"] == all_questions[1][1:3]
+
+    def test_question_batch_hides_answers_by_default(self):
+        response = self.client.post(
+            f"{questions.router.prefix}/batch",
+            json={"question_ids": [self.question_id]},
+        )
+        assert response.status_code == 200
+        (question,) = response.json()["questions"]
+        assert question["text"] == self.text
+        assert question["correct_answer"] is None
@@ -0,0 +1,203 @@
+import asyncio
+import unittest
+
+from services.quiz_cache import QuizCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestQuizCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = {"q1": {"_id": "q1", "title": "one", "question_sets": []}}
+        self.loads = 0
+        self.load_delay = 0.0
+
+    async def _loader(self, quiz_id):
+        self.loads += 1
+        if self.load_delay:
+            await asyncio.sleep(self.load_delay)
+        quiz = self.store.get(quiz_id)
+        return None if quiz is None else dict(quiz)
+
+    def _cache(self, **overrides):
+        options = {
+            "max_size": 2,
+            "ttl_seconds": 10,
+            "max_stale_seconds": 100,
+            "revalidate_timeout_seconds": 0.01,
+        }
+        options.update(overrides)
+        return QuizCache(loader=self._loader, clock=self.clock, **options)
+
+    def test_hit_after_miss_and_reads_are_private_copies(self):
+        cache = self._cache()
+
+        async def run():
+            first = await cache.get("q1")
+            first["title"] = "mutated by a handler"
+            return await cache.get("q1")
+
+        second = asyncio.run(run())
+        assert second["title"] == "one"
+        assert self.loads == 1
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_missing_quiz_is_not_cached(self):
+        cache = self._cache()
+
+        async def run():
+            return await cache.get("nope"), await cache.get("nope")
+
+        assert asyncio.run(run()) == (None, None)
+        assert self.loads == 2
+
+    def test_concurrent_misses_share_one_read(self):
+        cache = self._cache()
+        self.load_delay = 0.01
+
+        async def run():
+            return await asyncio.gather(*[cache.get("q1") for _ in range(20)])
+
+        results = asyncio.run(run())
+        assert all(quiz["title"] == "one" for quiz in results)
+        assert self.loads == 1
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = self._cache(max_size=2)
+        self.store["q2"] = {"_id": "q2"}
+        self.store["q3"] = {"_id": "q3"}
+
+        async def run():
+            await cache.get("q1")
+            await cache.get("q2")
+            await cache.get("q1")  # q2 is now least recently used
+            await cache.get("q3")
+            await cache.get("q1")
+            await cache.get("q2")
+
+        asyncio.run(run())
+        # q1, q2, q3 loaded once each, then q2 again after eviction
+        assert self.loads == 4
+
+    def test_expired_entry_is_refreshed(self):
+        cache = self._cache()
+
+        async def run():
+            await cache.get("q1")
+            self.store["q1"]["title"] = "updated"
+            self.clock.now = 11
+            return await cache.get("q1")
+
+        assert asyncio.run(run())["title"] == "updated"
+        assert self.loads == 2
+
+    def test_stale_copy_served_when_refresh_is_slow(self):
+        cache = self._cache()
+
+        async def run():
+            await cache.get("q1")
+            self.store["q1"]["title"] = "updated"
+            self.clock.now = 11
+            self.load_delay = 0.05
+            stale = await cache.get("q1")
+            # let the background refresh land
+            await asyncio.sleep(0.1)
+            fresh = await cache.get("q1")
+            return stale, fresh
+
+        stale, fresh = asyncio.run(run())
+        assert stale["title"] == "one"
+        assert fresh["title"] == "updated"
+        assert cache.stats()["stale_hits"] == 1
+
+    def test_entry_past_max_stale_is_reloaded(self):
+        cache = self._cache()
+
+        async def run():
+            await cache.get("q1")
+            self.store["q1"]["title"] = "updated"
+            self.clock.now = 500
+            self.load_delay = 0.05
+            return await cache.get("q1")
+
+        assert asyncio.run(run())["title"] == "updated"
+
+    def test_invalidate_forces_reload(self):
+        cache = self._cache()
+
+        async def run():
+            await cache.get("q1")
+            self.store["q1"]["title"] = "updated"
+            cache.invalidate("q1")
+            return await cache.get("q1")
+
+        assert asyncio.run(run())["title"] == "updated"
+        assert self.loads == 2
+
+    def test_disabled_cache_always_reads_through(self):
+        cache = self._cache(max_size=0)
+
+        async def run():
+            await cache.get("q1")
+            await cache.get("q1")
+
+        asyncio.run(run())
+        assert self.loads == 2
+
+    def test_derived_values_are_memoized_until_invalidation(self):
+        cache = self._cache()
+        builds = []
+
+        def build(quiz):
+            builds.append(quiz["title"])
+            return quiz["title"].upper()
+
+        async def run():
+            quiz = await cache.get("q1")
+            first = cache.get_derived(quiz, "upper", build)
+            second = cache.get_derived(quiz, "upper", build)
+            self.store["q1"]["title"] = "updated"
+            cache.invalidate("q1")
+            quiz = await cache.get("q1")
+            return first, second, cache.get_derived(quiz, "upper", build)
+
+        assert asyncio.run(run()) == ("ONE", "ONE", "UPDATED")
+        assert builds == ["one", "updated"]
+
+    def test_async_derived_values_are_not_kept_if_invalidated_while_built(self):
+        cache = self._cache()
+
+        async def build(quiz):
+            await asyncio.sleep(0)
+            cache.invalidate("q1")  # e.g. the quiz was written while rendering it
+            return quiz["title"].upper()
+
+        async def run():
+            quiz = await cache.get("q1")
+            value = await cache.get_derived_async(quiz, "upper", build)
+            return value, cache.get_fresh_derived("q1", "upper")
+
+        assert asyncio.run(run()) == ("ONE", None)
+
+    def test_fresh_derived_values_expire_with_the_entry(self):
+        cache = self._cache()
+
+        async def build(quiz):
+            return quiz["title"].upper()
+
+        async def run():
+            quiz = await cache.get("q1")
+            await cache.get_derived_async(quiz, "upper", build)
+            fresh = cache.get_fresh_derived("q1", "upper")
+            self.clock.now = 11
+            return fresh, cache.get_fresh_derived("q1", "upper")
+
+        assert asyncio.run(run()) == ("ONE", None)
@@ -1,7 +1,13 @@
+import asyncio
 import json
+from unittest import mock
 from .base import BaseTestCase
 from ..routers import quizzes, questions
 from settings import Settings
+from services import omr_options
+from services.quiz_cache import quiz_cache
+from services.quiz_schema import QUIZ_SCHEMA_VERSION
+from services.question_hydration import load_questions_by_set
 from ..database import client as mongo_client
 
 settings = Settings()
@@ -135,6 +141,30 @@ class QuizTestCase(BaseTestCase):
                     else:
                         assert question[key] is None
 
+    def test_created_quiz_embeds_subsets_of_stored_questions(self):
+        stored_quiz = mongo_client.quiz.quizzes.find_one(
+            {"_id": self.multi_qset_quiz_id}
+        )
+        for question_set in stored_quiz["question_sets"]:
+            stored_questions = list(
+                mongo_client.quiz.questions.find(
+                    {"question_set_id": question_set["_id"]}, sort=[("_id", 1)]
+                )
+            )
+            embedded = question_set["questions"]
+            assert len(embedded) == len(stored_questions)
+            assert (
+                embedded[: settings.subset_size]
+                == stored_questions[: settings.subset_size]
+            )
+            assert embedded[settings.subset_size :] == [
+                {
+                    field: question[field]
+                    for field in quizzes.SUBSET_WITHOUT_DETAILS_FIELDS
+                }
+                for question in stored_questions[settings.subset_size :]
+            ]
+
     def test_created_omr_contains_subsets(self):
         # the created long multi qset omr should contain the same number of questions as the one in the provided input json
         # multi qset quiz and multi qset omr have same data/lengths
@@ -255,6 +285,8 @@ class QuizTestCase(BaseTestCase):
             {"_id": self.multi_qset_quiz_id},
             {"$set": {"display_solution": False}},
         )
+        # written behind the API's back, so drop the cached copy
+        quiz_cache.invalidate(self.multi_qset_quiz_id)
 
         response = self.client.get(
             f"{quizzes.router.prefix}/{self.multi_qset_quiz_id}",
@@ -346,6 +378,8 @@ class QuizTestCase(BaseTestCase):
             {"_id": self.multi_qset_quiz_id},
             {"$set": {"display_solution": False}},
         )
+        # written behind the API's back, so drop the cached copy
+        quiz_cache.invalidate(self.multi_qset_quiz_id)
 
         resp = self.client.get(
             f"{quizzes.router.prefix}/{self.multi_qset_quiz_id}",
@@ -365,3 +399,192 @@ class QuizTestCase(BaseTestCase):
                 break
         assert found is not None
         assert found.get("solution") == []
+
+    def _expected_options_counts(self, quiz_data):
+        return [
+            [
+                len(question.get("options") or [])
+                for question in question_set["questions"]
+            ]
+            for question_set in quiz_data["question_sets"]
+        ]
+
+    def test_created_quiz_stores_omr_options_counts(self):
+        stored = mongo_client.quiz.quizzes.find_one({"_id": self.multi_qset_omr_id})
+        assert [
+            question_set["options_count_per_question"]
+            for question_set in stored["question_sets"]
+        ] == self._expected_options_counts(self.multi_qset_omr_data)
+
+    def test_omr_mode_without_stored_options_counts(self):
+        # quizzes created before the counts were stored get them computed in memory
+        mongo_client.quiz.quizzes.update_one(
+            {"_id": self.multi_qset_omr_id},
+            {
+                "$unset": {
+                    f"question_sets.{index}.options_count_per_question": ""
+                    for index in range(2)
+                }
+            },
+        )
+        quiz_cache.invalidate(self.multi_qset_omr_id)
+
+        response = self.client.get(
+            f"{quizzes.router.prefix}/{self.multi_qset_omr_id}",
+            params={"omr_mode": True},
+        )
+        assert response.status_code == 200
+        expected = self._expected_options_counts(self.multi_qset_omr_data)
+        assert [
+            [len(question["options"] or []) for question in question_set["questions"]]
+            for question_set in response.json()["question_sets"]
+        ] == expected
+
+        # the read path does not write them back (the backfill script does)
+        stored = mongo_client.quiz.quizzes.find_one({"_id": self.multi_qset_omr_id})
+        assert all(
+            "options_count_per_question" not in question_set
+            for question_set in stored["question_sets"]
+        )
+
+        # another render variant reuses the counts memoized on the cached quiz
+        with mock.patch.object(
+            omr_options, "load_options_counts", side_effect=AssertionError
+        ):
+            response = self.client.get(
+                f"{quizzes.router.prefix}/{self.multi_qset_omr_id}",
+                params={"omr_mode": True, "include_answers": True},
+            )
+        assert response.status_code == 200
+        assert [
+            [len(question["options"] or []) for question in question_set["questions"]]
+            for question_set in response.json()["question_sets"]
+        ] == expected
+
+    def test_created_quiz_stores_schema_version(self):
+        stored = mongo_client.quiz.quizzes.find_one({"_id": self.homework_quiz_id})
+        assert stored["schema_version"] == QUIZ_SCHEMA_VERSION
+
+    def test_legacy_quiz_is_upgraded_in_memory_only(self):
+        legacy_fields = [
+            "schema_version",
+            "question_sets.0.max_questions_allowed_to_attempt",
+            "question_sets.0.marking_scheme",
+        ]
+        mongo_client.quiz.quizzes.update_one(
+            {"_id": self.homework_quiz_id},
+            {"$unset": {field: "" for field in legacy_fields}},
+        )
+        quiz_cache.invalidate(self.homework_quiz_id)
+
+        response = self.client.get(f"{quizzes.router.prefix}/{self.homework_quiz_id}")
+        assert response.status_code == 200
+        question_set = response.json()["question_sets"][0]
+        assert question_set["max_questions_allowed_to_attempt"] == self.length
+        assert question_set["title"] == "Section A"
+        assert question_set["marking_scheme"] is not None
+
+        # reads no longer write the upgrade back; the migration script does
+        stored = mongo_client.quiz.quizzes.find_one({"_id": self.homework_quiz_id})
+        assert "schema_version" not in stored
+        assert "max_questions_allowed_to_attempt" not in stored["question_sets"][0]
+
+    def test_rendered_payload_is_cached_per_variant_until_invalidated(self):
+        url = f"{quizzes.router.prefix}/{self.multi_qset_quiz_id}"
+        first = self.client.get(url)
+        assert first.status_code == 200
+        assert first.headers["content-type"] == "application/json"
+        assert self.client.get(url).content == first.content
+
+        with_answers = self.client.get(url, params={"include_answers": True}).json()
+        assert any(
+            question["correct_answer"] is not None
+            for question in with_answers["question_sets"][0]["questions"]
+        )
+        assert all(
+            question["correct_answer"] is None
+            for question in first.json()["question_sets"][0]["questions"]
+        )
+
+        mongo_client.quiz.quizzes.update_one(
+            {"_id": self.multi_qset_quiz_id}, {"$set": {"title": "renamed"}}
+        )
+        quiz_cache.invalidate(self.multi_qset_quiz_id)
+        assert self.client.get(url).json()["title"] == "renamed"
+
+    def test_conditional_get_of_quiz(self):
+        url = f"{quizzes.router.prefix}/{self.multi_qset_quiz_id}"
+        response = self.client.get(url)
+        etag = response.headers["etag"]
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        # the flags are part of the variant
+        response = self.client.get(
+            url, params={"omr_mode": True}, headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+        mongo_client.quiz.quizzes.update_one(
+            {"_id": self.multi_qset_quiz_id}, {"$set": {"title": "renamed"}}
+        )
+        quiz_cache.invalidate(self.multi_qset_quiz_id)
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.json()["title"] == "renamed"
+
+    def test_quiz_payload_is_served_precompressed(self):
+        url = f"{quizzes.router.prefix}/{self.multi_qset_quiz_id}"
+        plain = self.client.get(url, headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+
+        for accept_encoding, expected in [
+            ("gzip, deflate, br", "br"),
+            ("gzip, br;q=0.5", "gzip"),
+        ]:
+            response = self.client.get(
+                url, headers={"Accept-Encoding": accept_encoding}
+            )
+            assert response.headers["content-encoding"] == expected
+            # not compressed a second time by the middleware
+            assert response.content == plain.content
+            assert response.headers["etag"] != plain.headers["etag"]
+            response = self.client.get(
+                url,
+                headers={
+                    "Accept-Encoding": accept_encoding,
+                    "If-None-Match": plain.headers["etag"],
+                },
+            )
+            assert response.status_code == 304
+
+    def test_single_page_questions_are_loaded_in_one_query_and_cached(self):
+        question_set_ids = [
+            question_set["_id"]
+            for question_set in self.multi_qset_quiz["question_sets"]
+        ]
+        questions_by_set = asyncio.run(load_questions_by_set(question_set_ids))
+        for question_set_id in question_set_ids:
+            assert questions_by_set[question_set_id] == list(
+                mongo_client.quiz.questions.find(
+                    {"question_set_id": question_set_id}, sort=[("_id", 1)]
+                )
+            )
+
+        url = f"{quizzes.router.prefix}/{self.multi_qset_quiz_id}"
+        first = self.client.get(url, params={"single_page_mode": True}).json()
+        # other variants reuse the questions loaded for the first one
+        mongo_client.quiz.questions.delete_many(
+            {"question_set_id": {"$in": question_set_ids}}
+        )
+        second = self.client.get(
+            url, params={"single_page_mode": True, "include_answers": True}
+        ).json()
+        assert [
+            len(question_set["questions"]) for question_set in second["question_sets"]
+        ] == [len(question_set["questions"]) for question_set in first["question_sets"]]
+        assert [
+            len(question_set["questions"]) for question_set in first["question_sets"]
+        ] == self.multi_qset_quiz_lengths
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from database import db
+from main import app
+from routers import admin
+from services.regrade import QuizNotFoundError, regrade_quiz_sessions
+from services.scoring import compute_session_metrics
+
+QUIZ_ID = "regrade-quiz"
+
+
+class TestRegradeQuizSessions(unittest.TestCase):
+    def setUp(self):
+        self.quiz = json.load(
+            open("app/tests/dummy_data/scoring_small_assessment.json")
+        )
+        self.quiz["_id"] = QUIZ_ID
+        answers = [[0, 2], [0], None, [1]]
+        self.sessions = [
+            {
+                "_id": f"regrade-session-{index}",
+                "quiz_id": QUIZ_ID,
+                "has_quiz_ended": True,
+                "session_answers": [{"answer": answer}] * 4,
+                # scored against an older answer key
+                "metrics": {"total_marks": -100},
+            }
+            for index, answer in enumerate(answers)
+        ]
+        self.sessions.append(
+            {
+                "_id": "regrade-session-in-progress",
+                "quiz_id": QUIZ_ID,
+                "has_quiz_ended": False,
+                "session_answers": [{"answer": [0, 2]}] * 4,
+                "metrics": None,
+            }
+        )
+        self._cleanup()
+        asyncio.run(db.quizzes.insert_one(self.quiz))
+        asyncio.run(db.sessions.insert_many(self.sessions))
+
+    def tearDown(self):
+        self._cleanup()
+
+    def _cleanup(self):
+        async def run():
+            await db.quizzes.delete_many({"_id": QUIZ_ID})
+            await db.sessions.delete_many({"quiz_id": QUIZ_ID})
+            await db.regrade_checkpoints.delete_many({"_id": QUIZ_ID})
+
+        asyncio.run(run())
+
+    def _stored_metrics(self):
+        sessions = asyncio.run(
+            db.sessions.find({"quiz_id": QUIZ_ID}, sort=[("_id", 1)]).to_list()
+        )
+        return {session["_id"]: session.get("metrics") for session in sessions}
+
+    def test_regrade_writes_new_metrics_for_ended_sessions(self):
+        report = asyncio.run(regrade_quiz_sessions(QUIZ_ID, chunk_size=3))
+
+        self.assertTrue(report["completed"])
+        self.assertEqual(report["processed"], 4)
+        self.assertEqual(report["written"], 4)
+        stored = self._stored_metrics()
+        for session in self.sessions[:4]:
+            self.assertEqual(
+                stored[session["_id"]], compute_session_metrics(session, self.quiz)
+            )
+        self.assertIsNone(stored["regrade-session-in-progress"])
+
+        # a second run finds nothing to change
+        report = asyncio.run(regrade_quiz_sessions(QUIZ_ID))
+        self.assertEqual(report["resumed_from"], None)
+        self.assertEqual(report["processed"], 4)
+        self.assertEqual(report["changed"], 0)
+
+    def test_dry_run_reports_diffs_without_writing(self):
+        report = asyncio.run(regrade_quiz_sessions(QUIZ_ID, dry_run=True, max_diffs=2))
+
+        self.assertEqual(report["changed"], 4)
+        self.assertEqual(report["written"], 0)
+        self.assertEqual(len(report["diffs"]), 2)
+        expected_marks = compute_session_metrics(self.sessions[0], self.quiz)
+        self.assertEqual(
+            report["diffs"][0]["changes"]["total_marks"],
+            {"before": -100, "after": expected_marks["total_marks"]},
+        )
+        self.assertEqual(
+            self._stored_metrics()["regrade-session-0"]["total_marks"], -100
+        )
+        self.assertIsNone(
+            asyncio.run(db.regrade_checkpoints.find_one({"_id": QUIZ_ID}))
+        )
+
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        first = asyncio.run(
+            regrade_quiz_sessions(QUIZ_ID, chunk_size=2, time_budget_seconds=0.0)
+        )
+        self.assertFalse(first["completed"])
+        self.assertEqual(first["processed"], 2)
+        self.assertEqual(
+            self._stored_metrics()["regrade-session-2"]["total_marks"], -100
+        )
+
+        second = asyncio.run(regrade_quiz_sessions(QUIZ_ID, chunk_size=2))
+        self.assertTrue(second["completed"])
+        self.assertEqual(second["resumed_from"], "regrade-session-1")
+        self.assertEqual(second["processed"], 2)
+        self.assertNotEqual(
+            self._stored_metrics()["regrade-session-2"]["total_marks"], -100
+        )
+
+        checkpoint = asyncio.run(db.regrade_checkpoints.find_one({"_id": QUIZ_ID}))
+        self.assertTrue(checkpoint["completed"])
+        self.assertEqual(checkpoint["processed"], 4)
+
+    def test_unknown_quiz(self):
+        with self.assertRaises(QuizNotFoundError):
+            asyncio.run(regrade_quiz_sessions("no-such-quiz"))
+
+
+class TestRegradeEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+
+    def test_admin_routes_are_disabled_without_a_key(self):
+        with mock.patch.object(admin.settings, "admin_api_key", ""):
+            response = self.client.post("/admin/quiz/any/regrade")
+        self.assertEqual(response.status_code, 403)
+
+    def test_wrong_admin_key_is_rejected(self):
+        with mock.patch.object(admin.settings, "admin_api_key", "secret"):
+            response = self.client.post(
+                "/admin/quiz/any/regrade", headers={"X-Admin-Key": "guess"}
+            )
+        self.assertEqual(response.status_code, 401)
+
+    def test_regrade_unknown_quiz(self):
+        with mock.patch.object(admin.settings, "admin_api_key", "secret"):
+            response = self.client.post(
+                "/admin/quiz/no-such-quiz/regrade?dry_run=true",
+                headers={"X-Admin-Key": "secret"},
+            )
+        self.assertEqual(response.status_code, 404)
@@ -1,7 +1,17 @@
 import json
 import unittest
 
-from services.scoring import compute_session_metrics
+from services.scoring import (
+    CORRECT,
+    NOT_ANSWERED,
+    PARTIALLY_CORRECT,
+    WRONG,
+    _compile_question,
+    _evaluate_answer,
+    compile_scoring_plan,
+    compute_session_metrics,
+    score_session,
+)
 
 
 class TestScoring(unittest.TestCase):
@@ -63,3 +73,94 @@ class TestScoring(unittest.TestCase):
         self.assertEqual(metrics["total_answered"], 1)
         self.assertEqual(metrics["total_skipped"], 1)
         self.assertEqual(metrics["total_marks"], 0.0)
+
+
+class TestCompiledScoringPlan(unittest.TestCase):
+    QUESTION_TYPES = [
+        "single-choice",
+        "multi-choice",
+        "matrix-match",
+        "matrix-rating",
+        "matrix-numerical",
+        "matrix-subjective",
+        "subjective",
+        "numerical-integer",
+        "numerical-float",
+        "unknown-type",
+    ]
+    CORRECT_ANSWERS = [None, [0, 2], ["A", "B"], 4, 4.0, {"r1": "x"}]
+    USER_ANSWERS = [
+        None,
+        0,
+        4,
+        4.02,
+        True,
+        "",
+        "text",
+        [],
+        [0],
+        [2, 0],
+        [0, 1],
+        ["A"],
+        ["B", "A"],
+        {},
+        {"r1": " "},
+        {"r1": "x"},
+    ]
+
+    def test_compiled_graders_match_evaluate_answer(self):
+        expected_outcome = {
+            (False, None): NOT_ANSWERED,
+            (True, True): CORRECT,
+            (True, False): WRONG,
+        }
+        for question_type in self.QUESTION_TYPES:
+            for correct_answer in self.CORRECT_ANSWERS:
+                question = {"type": question_type, "correct_answer": correct_answer}
+                plan = _compile_question(question)
+                for user_answer in self.USER_ANSWERS:
+                    for partial in (False, True):
+                        legacy = _evaluate_answer(question, user_answer, partial)
+                        if legacy["is_partially_correct"]:
+                            expected = PARTIALLY_CORRECT
+                        else:
+                            expected = expected_outcome[
+                                (legacy["answered"], legacy["is_correct"])
+                            ]
+                        outcome = plan.grade(plan, user_answer, partial)
+                        self.assertEqual(
+                            outcome,
+                            expected,
+                            (question_type, correct_answer, user_answer, partial),
+                        )
+
+    def test_plan_is_reusable_across_sessions(self):
+        quiz = json.load(open("app/tests/dummy_data/scoring_small_assessment.json"))
+        plan = compile_scoring_plan(quiz)
+        sessions = [
+            {"session_answers": []},
+            {"session_answers": [{"answer": [0, 2]}]},
+            {
+                "session_answers": [
+                    {"answer": [2, 0], "marked_for_review": True},
+                    {"answer": [0]},
+                    {"answer": 5},
+                    {"answer": None},
+                ]
+            },
+        ]
+        for session in sessions:
+            self.assertEqual(
+                score_session(session, plan), compute_session_metrics(session, quiz)
+            )
+
+    def test_partial_marks_use_first_matching_rule(self):
+        quiz = json.load(open("app/tests/dummy_data/scoring_small_assessment.json"))
+        quiz["question_sets"][0]["marking_scheme"]["partial"].append(
+            {"conditions": [{"num_correct_selected": 1}], "marks": 3}
+        )
+        session = {"session_answers": [{"answer": [0]}]}
+
+        metrics = score_session(session, compile_scoring_plan(quiz))
+        # 2 (first rule for one correct option selected) + 0 for the skipped questions
+        self.assertEqual(metrics["qset_metrics"][0]["marks_scored"], 2.0)
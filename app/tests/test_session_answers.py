@@ -101,3 +101,35 @@ class SessionAnswerTestCase(SessionsBaseTestCase):
                 session_answer["visited"]
                 == self.session_answers[session_answer_position_index]["visited"]
             )
+
+    def test_update_session_answer_returns_error_if_session_id_invalid(self):
+        response = self.client.patch(
+            f"{session_answers.router.prefix}/00/0", json={"answer": [0]}
+        )
+        assert response.status_code == 404
+
+        response = self.client.patch(
+            f"{session_answers.router.prefix}/00/update-multiple-answers",
+            json=[[0, {"answer": [0]}]],
+        )
+        assert response.status_code == 404
+
+    def test_update_session_answer_returns_error_if_position_out_of_bounds(self):
+        for position_index in [len(self.session_answers), -1]:
+            response = self.client.patch(
+                f"{session_answers.router.prefix}/{self.session_id}/{position_index}",
+                json={"answer": [0]},
+            )
+            assert response.status_code == 400
+
+        response = self.client.patch(
+            f"{session_answers.router.prefix}/{self.session_id}/update-multiple-answers",
+            json=[[0, {"answer": [0]}], [len(self.session_answers), {"answer": [0]}]],
+        )
+        assert response.status_code == 400
+
+        # nothing was written
+        response = self.client.get(
+            f"{session_answers.router.prefix}/{self.session_id}/0"
+        )
+        assert json.loads(response.content)["answer"] == self.session_answer["answer"]
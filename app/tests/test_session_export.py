@@ -0,0 +1,129 @@
+import json
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from database import client as mongo_client
+from main import app
+from routers import admin
+from services.session_export import decode_cursor, encode_cursor
+
+ADMIN_HEADERS = {"X-Admin-Key": "secret"}
+
+
+class TestSessionExport(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        self.quiz_id = "export-quiz"
+        self.start = datetime(2030, 1, 1)
+        # two sessions share an updated_at, to exercise the _id tie-break
+        self.sessions = [
+            {
+                "_id": f"export-session-{index}",
+                "quiz_id": self.quiz_id,
+                "user_id": f"user-{index}",
+                "has_quiz_ended": True,
+                "updated_at": self.start + timedelta(seconds=min(index, 3)),
+            }
+            for index in range(6)
+        ]
+        mongo_client.quiz.sessions.insert_many(self.sessions)
+        self.patch = mock.patch.object(admin.settings, "admin_api_key", "secret")
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        mongo_client.quiz.sessions.delete_many({"quiz_id": self.quiz_id})
+
+    def _export(self, **params):
+        """(exported sessions, next cursor)"""
+        response = self.client.get(
+            "/export/sessions", params=params, headers=ADMIN_HEADERS
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        *sessions, trailer = [json.loads(line) for line in response.text.splitlines()]
+        return sessions, trailer["next_cursor"]
+
+    def test_export_requires_admin_key(self):
+        response = self.client.get("/export/sessions")
+        assert response.status_code == 401
+
+    def test_export_streams_sessions_updated_since_in_order(self):
+        lines, _ = self._export(updated_since=self.start.isoformat())
+        assert [line["_id"] for line in lines] == [
+            session["_id"] for session in self.sessions
+        ]
+        assert lines[0]["user_id"] == "user-0"
+
+        lines, _ = self._export(
+            updated_since=(self.start + timedelta(seconds=2)).isoformat()
+        )
+        assert [line["_id"] for line in lines] == [
+            session["_id"] for session in self.sessions[2:]
+        ]
+
+    def test_export_resumes_from_next_cursor(self):
+        exported = []
+        lines, cursor = self._export(updated_since=self.start.isoformat(), limit=2)
+        while lines:
+            exported.extend(lines)
+            lines, next_cursor = self._export(cursor=cursor, limit=2)
+            if not lines:
+                # nothing new: the cursor stays at the same session
+                assert decode_cursor(next_cursor)[:2] == decode_cursor(cursor)[:2]
+            cursor = next_cursor
+        assert [line["_id"] for line in exported] == [
+            session["_id"] for session in self.sessions
+        ]
+
+    def test_overlap_re_exports_sessions_updated_just_before_the_cursor(self):
+        _, cursor = self._export(updated_since=self.start.isoformat())
+        lines, _ = self._export(cursor=cursor)
+        assert lines == []
+
+        # sessions 1.. were updated within 2s of the last one
+        lines, next_cursor = self._export(cursor=cursor, overlap_seconds=2)
+        assert [line["_id"] for line in lines] == [
+            session["_id"] for session in self.sessions[1:]
+        ]
+        assert next_cursor == cursor
+
+    def test_overlap_only_applies_at_the_start_of_a_run(self):
+        _, cursor = self._export(updated_since=self.start.isoformat())
+
+        # the overlap window holds more sessions than a page
+        exported = []
+        for _ in range(3):
+            lines, cursor = self._export(cursor=cursor, overlap_seconds=2, limit=2)
+            exported.extend(lines)
+        assert [line["_id"] for line in exported] == [
+            session["_id"] for session in self.sessions[1:]
+        ]
+
+        # the next run starts with the window again
+        lines, _ = self._export(cursor=cursor, overlap_seconds=2, limit=2)
+        assert [line["_id"] for line in lines] == [
+            session["_id"] for session in self.sessions[1:3]
+        ]
+
+    def test_export_projects_requested_fields(self):
+        lines, _ = self._export(
+            updated_since=self.start.isoformat(), fields=["user_id"]
+        )
+        assert set(lines[0]) == {"_id", "updated_at", "user_id"}
+
+    def test_invalid_cursor_parameters(self):
+        for params in (
+            {"cursor": "not-a-cursor"},
+            {
+                "cursor": encode_cursor(self.start, "x", caught_up=True),
+                "updated_since": self.start.isoformat(),
+            },
+        ):
+            response = self.client.get(
+                "/export/sessions", params=params, headers=ADMIN_HEADERS
+            )
+            assert response.status_code == 400
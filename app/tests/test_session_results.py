@@ -0,0 +1,281 @@
+import threading
+import time
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from pymongo.errors import OperationFailure
+
+from database import client as mongo_client
+from services.session_results import (
+    RESULT_FIELDS,
+    SYNCED_AT_FIELD,
+    SessionResultsSync,
+    change_stream_pipeline,
+)
+
+database = mongo_client.quiz
+
+
+class FakeChangeStream:
+    """Yields `changes` (then nothing), the way `try_next` does."""
+
+    def __init__(self, changes, resume_token):
+        self.changes = list(changes)
+        self.resume_token = resume_token
+        self.alive = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.alive = False
+
+    def try_next(self):
+        return self.changes.pop(0) if self.changes else None
+
+
+class TestSessionResults(unittest.TestCase):
+    def setUp(self):
+        self.quiz_id = "results-quiz"
+        self.start = datetime(2030, 1, 1)
+        self.sessions = [
+            {
+                "_id": f"results-session-{index}",
+                "quiz_id": self.quiz_id,
+                "user_id": f"user-{index}",
+                "has_quiz_ended": index < 2,
+                "end_quiz_time": datetime(2030, 1, 1) if index < 2 else None,
+                "metrics": {"total_marks": index},
+                "events": [{"event_type": "start-quiz"}],
+                "question_order": [0, 1, 2],
+            }
+            for index in range(3)
+        ]
+        database.sessions.insert_many(self.sessions)
+        self.sync = SessionResultsSync(database, batch_size=1)
+
+    def tearDown(self):
+        database.sessions.delete_many({"quiz_id": self.quiz_id})
+        database.session_results.delete_many({})
+        database.change_stream_checkpoints.delete_many({})
+
+    def _results(self):
+        return list(
+            database.session_results.find({"quiz_id": self.quiz_id}, sort=[("_id", 1)])
+        )
+
+    def test_backfill_stores_compact_results_of_ended_sessions(self):
+        assert self.sync.backfill() == database.sessions.count_documents(
+            {"has_quiz_ended": True}
+        )
+        results = self._results()
+        assert [result["_id"] for result in results] == [
+            "results-session-0",
+            "results-session-1",
+        ]
+        assert set(results[1]) == {"_id", SYNCED_AT_FIELD, *RESULT_FIELDS}
+        assert results[1]["metrics"] == {"total_marks": 1}
+
+    def test_apply_upserts_and_deletes(self):
+        self.sync.backfill()
+        database.sessions.update_one(
+            {"_id": "results-session-2"},
+            {"$set": {"has_quiz_ended": True, "metrics": {"total": 9}}},
+        )
+        self.sync.apply(
+            [
+                {
+                    "operationType": "update",
+                    "documentKey": {"_id": "results-session-2"},
+                },
+                # deleted since
+                {
+                    "operationType": "update",
+                    "documentKey": {"_id": "results-session-gone"},
+                },
+                {
+                    "operationType": "delete",
+                    "documentKey": {"_id": "results-session-0"},
+                },
+                {
+                    "operationType": "insert",
+                    "documentKey": {"_id": "results-session-3"},
+                    "fullDocument": dict(self.sessions[0], _id="results-session-3"),
+                },
+            ]
+        )
+        results = self._results()
+        assert [result["_id"] for result in results] == [
+            "results-session-1",
+            "results-session-2",
+            "results-session-3",
+        ]
+        assert results[1]["metrics"] == {"total": 9}
+
+    def test_stream_drops_updates_that_cannot_change_a_result(self):
+        def update(**fields):
+            return {
+                "operationType": "update",
+                "documentKey": {"_id": "results-session-0"},
+                "updateDescription": {"updatedFields": fields, "removedFields": []},
+            }
+
+        changes = [
+            # a heartbeat
+            update(total_time_spent=12, time_remaining=48, updated_at=self.start),
+            update(has_quiz_ended=True, metrics={"total_marks": 1}),
+            update(metrics={"total_marks": 2}, updated_at=self.start),
+            {"operationType": "insert", "fullDocument": {"has_quiz_ended": False}},
+            {"operationType": "insert", "fullDocument": {"has_quiz_ended": True}},
+            {"operationType": "delete", "documentKey": {"_id": "results-session-0"}},
+        ]
+        events = database.change_stream_events_scratch
+        events.insert_many(
+            [dict(change, index=index) for index, change in enumerate(changes)]
+        )
+        try:
+            match = change_stream_pipeline()[0]
+            kept = [event["index"] for event in events.aggregate([match])]
+        finally:
+            events.drop()
+        assert sorted(kept) == [1, 2, 4, 5]
+
+    def test_quiet_stream_checkpoints_its_advancing_token(self):
+        stream = FakeChangeStream([], {"_data": "0"})
+        polls = []
+
+        def try_next():
+            polls.append(None)
+            stream.resume_token = {"_data": str(len(polls))}
+            return None
+
+        stream.try_next = try_next
+        self.sync.checkpoint_interval_seconds = 3600
+        self.sync._consume(stream, should_stop=lambda: len(polls) >= 3)
+        assert self.sync.load_resume_token() is None
+
+        self.sync.checkpoint_interval_seconds = 0
+        self.sync._consume(stream, should_stop=lambda: len(polls) >= 6)
+        assert self.sync.load_resume_token() == {"_data": "6"}
+
+    def test_first_run_backfills_then_follows_the_stream(self):
+        change = {
+            "operationType": "delete",
+            "documentKey": {"_id": "results-session-1"},
+        }
+        stream = FakeChangeStream([change], {"_data": "start"})
+        original_apply = self.sync.apply
+
+        def apply(changes):
+            # the token the stream started at is stored once the backfill is done
+            assert self.sync.load_resume_token() == {"_data": "start"}
+            assert len(self._results()) == 2
+            stream.resume_token = {"_data": "after-change"}
+            original_apply(changes)
+
+        with mock.patch.object(
+            self.sync, "_watch", return_value=stream
+        ) as watch, mock.patch.object(self.sync, "apply", apply):
+            self.sync.run(should_stop=lambda: not stream.changes)
+
+        watch.assert_called_once_with(None)
+        assert [result["_id"] for result in self._results()] == ["results-session-0"]
+        assert self.sync.load_resume_token() == {"_data": "after-change"}
+
+    def test_lost_history_backfills_again(self):
+        self.sync.save_resume_token({"_data": "expired"})
+        stream = FakeChangeStream([], {"_data": "restart"})
+        history_lost = OperationFailure("history lost", code=286)
+
+        with mock.patch.object(
+            self.sync, "_watch", side_effect=[history_lost, stream]
+        ) as watch:
+            self.sync.run(
+                should_stop=lambda: self.sync.load_resume_token()
+                == {"_data": "restart"}
+            )
+
+        assert watch.call_args_list == [
+            mock.call({"_data": "expired"}),
+            mock.call(None),
+        ]
+        assert len(self._results()) == 2
+        assert self.sync.load_resume_token() == {"_data": "restart"}
+
+    def test_backfill_after_lost_history_drops_results_of_deleted_sessions(self):
+        self.sync.backfill()
+        # (written well before the next backfill)
+        database.session_results.update_many(
+            {}, {"$set": {SYNCED_AT_FIELD: datetime(2020, 1, 1)}}
+        )
+        self.sync.save_resume_token({"_data": "expired"})
+        # deleted while the consumer was behind: its delete event is gone with the oplog
+        database.sessions.delete_one({"_id": "results-session-0"})
+        stream = FakeChangeStream([], {"_data": "restart"})
+        history_lost = OperationFailure("history lost", code=286)
+
+        with mock.patch.object(self.sync, "_watch", side_effect=[history_lost, stream]):
+            self.sync.run(
+                should_stop=lambda: self.sync.load_resume_token()
+                == {"_data": "restart"}
+            )
+
+        assert [result["_id"] for result in self._results()] == ["results-session-1"]
+
+
+class TestSessionResultsChangeStream(unittest.TestCase):
+    """Needs a real replica set (a local single-node one is enough)."""
+
+    def setUp(self):
+        try:
+            with database.sessions.watch(max_await_time_ms=1):
+                pass
+        except (AttributeError, NotImplementedError, TypeError, OperationFailure):
+            self.skipTest("change streams need a MongoDB replica set")
+
+    def tearDown(self):
+        database.sessions.delete_many({"quiz_id": "change-stream-quiz"})
+        database.session_results.delete_many({})
+        database.change_stream_checkpoints.delete_many({})
+
+    def test_results_follow_session_changes_and_resume(self):
+        stopping = threading.Event()
+
+        def start():
+            sync = SessionResultsSync(database, max_await_time_ms=100)
+            thread = threading.Thread(target=sync.run, args=(stopping.is_set,))
+            thread.start()
+            return thread
+
+        def wait_for(condition):
+            deadline = time.monotonic() + 10
+            while not condition():
+                assert time.monotonic() < deadline
+                time.sleep(0.05)
+
+        thread = start()
+        wait_for(lambda: database.change_stream_checkpoints.find_one() is not None)
+        database.sessions.insert_one(
+            {
+                "_id": "change-stream-session",
+                "quiz_id": "change-stream-quiz",
+                "has_quiz_ended": False,
+                "events": [],
+            }
+        )
+        database.sessions.update_one(
+            {"_id": "change-stream-session"},
+            {"$set": {"has_quiz_ended": True, "metrics": {"total_marks": 4}}},
+        )
+        wait_for(lambda: database.session_results.find_one() is not None)
+        stopping.set()
+        thread.join()
+
+        # changes made while stopped are picked up from the stored token
+        database.sessions.delete_one({"_id": "change-stream-session"})
+        stopping.clear()
+        thread = start()
+        wait_for(lambda: database.session_results.find_one() is None)
+        stopping.set()
+        thread.join()
@@ -6,6 +6,7 @@ from ..schemas import EventType
 from datetime import datetime, timedelta
 import time
 from settings import Settings
+from services.quiz_cache import quiz_cache
 from ..database import client as mongo_client
 
 
@@ -111,6 +112,7 @@ class SessionsTestCase(SessionsBaseTestCase):
                 }
             },
         )
+        quiz_cache.invalidate(quiz_id)
 
         # End the timed session
         self.client.patch(
@@ -138,6 +140,7 @@ class SessionsTestCase(SessionsBaseTestCase):
             {"_id": quiz_id},
             {"$set": {"metadata.session_end_time": past_end}},
         )
+        quiz_cache.invalidate(quiz_id)
         response = self.client.get(
             f"{sessions.router.prefix}/preflight",
             params={"quiz_id": quiz_id, "user_id": user_id},
@@ -713,3 +716,145 @@ class SessionsTestCase(SessionsBaseTestCase):
         assert r.status_code == 200
         s = self.client.get(f"{sessions.router.prefix}/{sid}").json()
         assert float(s.get("total_time_spent")) == pytest.approx(20.0, abs=0.01)
+
+    def test_update_session_returns_error_if_id_invalid(self):
+        response = self.client.patch(
+            f"{sessions.router.prefix}/00",
+            json={"event": EventType.start_quiz.value},
+        )
+        assert response.status_code == 404
+        assert response.json()["detail"] == "session 00 not found"
+
+    def test_end_quiz_stores_metrics_and_returns_them(self):
+        sid = self.timed_quiz_session_id
+        self.client.patch(
+            f"{sessions.router.prefix}/{sid}",
+            json={"event": EventType.start_quiz.value},
+        )
+        r = self.client.patch(
+            f"{sessions.router.prefix}/{sid}",
+            json={"event": EventType.end_quiz.value},
+        )
+        assert r.status_code == 200
+        body = r.json()
+        assert body["metrics"] is not None
+        assert body["time_remaining"] is not None
+
+        s = self.client.get(f"{sessions.router.prefix}/{sid}").json()
+        assert s["has_quiz_ended"] is True
+        assert s["metrics"] == body["metrics"]
+        assert s["end_quiz_time"] == s["events"][-1]["created_at"]
+        assert s["time_remaining"] == body["time_remaining"]
+
+    def test_events_after_end_do_not_add_time(self):
+        sid = self.timed_quiz_session_id
+        for event in [EventType.start_quiz, EventType.end_quiz]:
+            self.client.patch(
+                f"{sessions.router.prefix}/{sid}", json={"event": event.value}
+            )
+        t1 = self.client.get(f"{sessions.router.prefix}/{sid}").json()[
+            "total_time_spent"
+        ]
+
+        past = datetime.utcnow() - timedelta(seconds=100)
+        mongo_client.quiz.sessions.update_one(
+            {"_id": sid},
+            {"$set": {"events.1.created_at": past, "events.1.updated_at": past}},
+        )
+        r = self.client.patch(
+            f"{sessions.router.prefix}/{sid}",
+            json={"event": EventType.dummy_event.value},
+        )
+        assert r.status_code == 200
+        s = self.client.get(f"{sessions.router.prefix}/{sid}").json()
+        assert s["total_time_spent"] == t1
+        assert s["events"][-1]["event_type"] == EventType.dummy_event.value
+
+    def test_sync_applies_answers_and_event_together(self):
+        sid = self.timed_quiz_session_id
+        r = self.client.post(
+            f"{sessions.router.prefix}/{sid}/sync",
+            json={
+                "answers": [[0, {"answer": [1]}], [1, {"visited": True}]],
+                "event": EventType.start_quiz.value,
+            },
+        )
+        assert r.status_code == 200
+        assert r.json()["time_remaining"] is not None
+
+        s = self.client.get(f"{sessions.router.prefix}/{sid}").json()
+        assert [e["event_type"] for e in s["events"]] == [EventType.start_quiz.value]
+        assert s["start_quiz_time"] is not None
+        assert s["session_answers"][0]["answer"] == [1]
+        assert s["session_answers"][1]["visited"] is True
+        # other fields of updated answers are kept
+        assert (
+            s["session_answers"][0]["question_id"]
+            == self.timed_quiz_session["session_answers"][0]["question_id"]
+        )
+
+    def test_sync_answers_without_event(self):
+        sid = self.timed_quiz_session_id
+        r = self.client.post(
+            f"{sessions.router.prefix}/{sid}/sync",
+            json={"answers": [[1, {"answer": [0]}]]},
+        )
+        assert r.status_code == 200
+        assert r.json()["time_remaining"] == self.timed_quiz_session["time_remaining"]
+
+        s = self.client.get(f"{sessions.router.prefix}/{sid}").json()
+        assert s["session_answers"][1]["answer"] == [0]
+        assert s["events"] == []
+
+    def test_sync_with_heartbeats_and_end_quiz(self):
+        sid = self.timed_quiz_session_id
+        for answer, event in [
+            ([0], EventType.start_quiz),
+            ([1], EventType.dummy_event),
+            # buffered heartbeat
+            ([0], EventType.dummy_event),
+        ]:
+            r = self.client.post(
+                f"{sessions.router.prefix}/{sid}/sync",
+                json={"answers": [[0, {"answer": answer}]], "event": event.value},
+            )
+            assert r.status_code == 200
+
+        r = self.client.post(
+            f"{sessions.router.prefix}/{sid}/sync",
+            json={"answers": [[1, {"answer": [0]}]], "event": EventType.end_quiz.value},
+        )
+        assert r.status_code == 200
+        # scored with the answer sent along with end-quiz (the first question has no
+        # correct answer and is not graded)
+        assert r.json()["metrics"]["total_answered"] == 1
+
+        s = self.client.get(f"{sessions.router.prefix}/{sid}").json()
+        assert s["has_quiz_ended"] is True
+        assert [answer["answer"] for answer in s["session_answers"]] == [[0], [0]]
+        assert s["metrics"] == r.json()["metrics"]
+        assert [e["event_type"] for e in s["events"]] == [
+            EventType.start_quiz.value,
+            EventType.dummy_event.value,
+            EventType.end_quiz.value,
+        ]
+
+    def test_sync_returns_errors_without_writing(self):
+        r = self.client.post(
+            f"{sessions.router.prefix}/00/sync",
+            json={"event": EventType.start_quiz.value},
+        )
+        assert r.status_code == 404
+
+        sid = self.timed_quiz_session_id
+        out_of_bounds = len(self.timed_quiz_session["session_answers"])
+        for event in [EventType.start_quiz.value, EventType.end_quiz.value, None]:
+            r = self.client.post(
+                f"{sessions.router.prefix}/{sid}/sync",
+                json={"answers": [[out_of_bounds, {"answer": [0]}]], "event": event},
+            )
+            assert r.status_code == 400
+
+        s = self.client.get(f"{sessions.router.prefix}/{sid}").json()
+        assert s["events"] == []
+        assert s["has_quiz_ended"] is False